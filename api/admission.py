@@ -0,0 +1,133 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from api.configurator import Conf
+from api.metrics import Family
+from api.metrics import metrics
+
+# keys of the shared token buckets
+RATE_PREFIX = 'rate:'
+
+
+class TokenBuckets:
+    """
+    Token bucket per key: a bucket holds up to `burst` tokens and gains `rate`
+    tokens a second, a request takes `cost` of them.
+
+    Rate and burst are given on every call, so a changed config applies to the
+    existing buckets. The least recently used buckets are dropped beyond
+    `max_entries`, a dropped bucket starts full again. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries: int = 100000) -> None:
+        self.max_entries = max_entries
+
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1, now: Union[float, None] = None) -> float:
+        """
+        Takes `cost` tokens, returns 0 or the seconds until the bucket holds enough
+        of them, nothing is taken then.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + max(now - updated, 0) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class Admission:
+    """
+    Limits of the work a server process takes, read from the config on every
+    check so that a reload applies at once.
+
+    `enter` and `leave` count the requests in flight, a request over
+    `admission_max_in_flight` is refused. `rate_wait` takes a token of the bucket
+    of a login, the buckets of `admission_rate_shared` are taken through the
+    store by the views and fall back to the local ones. Shared by the handler
+    threads or tasks of the process.
+    """
+
+    def __init__(self, conf: Conf) -> None:
+        self.conf = conf
+        self.buckets = TokenBuckets()
+        self.in_flight = 0
+
+        self._lock = threading.Lock()
+
+    def enter(self) -> bool:
+        """
+        Counts a request in, False when the process is at its limit and the request must be refused.
+        """
+        limit = self.conf.admission_max_in_flight
+        with self._lock:
+            if limit and self.in_flight >= limit:
+                self.reject('in_flight')
+                return False
+            self.in_flight += 1
+        return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def rate(self) -> Tuple[float, float]:
+        """
+        Rate and burst of the login buckets, a rate of 0 means no limit.
+        """
+        rate = self.conf.admission_rate_limit
+        return rate, self.conf.admission_rate_burst or max(rate, 1)
+
+    def rate_wait(self, login: str) -> float:
+        """
+        0 when the login may send a request now, else the seconds until it may.
+        """
+        rate, burst = self.rate()
+        if not rate:
+            return 0.0
+        return self.buckets.take(login, rate, burst)
+
+    def too_large(self, length: int) -> bool:
+        limit = self.conf.admission_max_body_size
+        if limit and length > limit:
+            self.reject('body_size')
+            return True
+        return False
+
+    @staticmethod
+    def reject(reason: str) -> None:
+        metrics.inc('scoring_api_rejected_total', reason=reason)
+
+    def retry_after(self, wait: Union[float, None] = None) -> int:
+        """
+        Seconds for the Retry-After header, `wait` of a rate limit or `admission_retry_after`.
+        """
+        return max(math.ceil(wait), 1) if wait is not None else self.conf.admission_retry_after
+
+    def collect_metrics(self) -> List[Family]:
+        """
+        Collector for `api.metrics`, reports the requests in flight and the local buckets.
+        """
+        return [
+            ('scoring_api_in_flight', 'gauge', 'Requests handled by the process at the moment',
+             [({}, self.in_flight)]),
+            ('scoring_api_rate_buckets', 'gauge', 'Token buckets of logins kept by the process',
+             [({}, len(self.buckets))]),
+        ]
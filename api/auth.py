@@ -0,0 +1,98 @@
+import hashlib
+import hmac
+import logging
+import threading
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Tuple
+
+from api.cache import LocalCache
+from api.cache import MISSING
+from api.configurator import Conf
+from api.configurator import Snapshot
+from api.metrics import Family
+
+AUTH_KEYS = ('salt', 'admin_salt', 'admin_login', 'auth_cache_max_entries', 'auth_cache_ttl')
+
+
+class Authenticator:
+    """
+    Checks request tokens, shared by all requests of the server process.
+
+    The admin digest is computed once, verified (account, login, token) tuples are
+    remembered for `auth_cache_ttl` seconds so that a caller reusing its token does
+    not pay for SHA-512 on every request. Both are dropped when the config swaps
+    in other salts.
+    """
+
+    def __init__(self, conf: Conf) -> None:
+        self.conf = conf
+        self.cache = LocalCache(max_entries=conf.auth_cache_max_entries, ttl=conf.auth_cache_ttl)
+        self.logger = logging.getLogger('scoring_api.Auth')
+
+        self._lock = threading.Lock()
+        # (admin login, admin digest, salt), replaced as a whole
+        self._secrets: Tuple = ()
+        self.invalidate()
+        conf.subscribe(self.reconfigure, AUTH_KEYS)
+
+    def invalidate(self) -> None:
+        """
+        Reloads the secrets from the config and forgets all verified tokens.
+        """
+        with self._lock:
+            conf = self.conf.snapshot
+            self._secrets = (conf.admin_login, self.digest(conf.admin_login + str(conf.admin_salt)), conf.salt)
+            self.cache.clear()
+
+    def reconfigure(self, snapshot: Snapshot, changed: FrozenSet[str]) -> None:
+        """
+        Config listener, a new salt invalidates the verified tokens.
+        """
+        if {'auth_cache_max_entries', 'auth_cache_ttl'} & changed:
+            self.cache = LocalCache(max_entries=snapshot.auth_cache_max_entries, ttl=snapshot.auth_cache_ttl)
+        self.logger.info('auth settings changed, dropping %s cached tokens', len(self.cache))
+        self.invalidate()
+
+    def check(self, account: str, login: str, token: str) -> bool:
+        key = (account, login, token)
+        if self.cache.get(key) is not MISSING:
+            return True
+
+        secrets = self._secrets
+        admin_login, admin_digest, salt = secrets
+        if login == admin_login:
+            digest = admin_digest
+        else:
+            digest = self.digest(account + login + salt)
+
+        if not hmac.compare_digest(digest.encode('utf-8'), str(token).encode('utf-8')):
+            return False
+
+        with self._lock:
+            # a token verified with secrets replaced meanwhile must not outlive them in the cache
+            if self._secrets is secrets:
+                self.cache.set(key, True)
+        return True
+
+    @staticmethod
+    def digest(line: str) -> str:
+        return hashlib.sha512(line.encode('utf-8')).hexdigest()
+
+    def stats(self) -> Dict[str, int]:
+        return self.cache.stats()
+
+    def collect_metrics(self) -> List[Family]:
+        """
+        Collector for `api.metrics`, reports the verified tokens cache.
+        """
+        stats = self.stats()
+        return [
+            ('scoring_api_auth_cache_hits_total', 'counter', 'Requests authenticated from the cache',
+             [({}, stats['hits'])]),
+            ('scoring_api_auth_cache_misses_total', 'counter', 'Requests that needed a token digest',
+             [({}, stats['misses'])]),
+            ('scoring_api_auth_cache_entries', 'gauge', 'Verified tokens in the cache',
+             [({}, stats['entries'])]),
+        ]
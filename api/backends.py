@@ -0,0 +1,644 @@
+import asyncio
+import bisect
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+import redis
+import redis.asyncio
+
+from api.admission import TokenBuckets
+
+# deletes the locks still holding the token of their owner, an expired lock may be another owner's by now
+UNLOCK_SCRIPT = """
+local deleted = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then
+        deleted = deleted + redis.call('del', key)
+    end
+end
+return deleted
+"""
+# `TokenBuckets.take` on a hash of the tokens and the time they were counted at, returns the wait in milliseconds
+TAKE_TOKENS_SCRIPT = """
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('pexpire', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return wait
+"""
+
+
+class RedisBackend:
+    """
+    One Redis server behind a blocking connection pool shared by all threads.
+    """
+    name = 'redis'
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0, **pool_kwargs) -> None:
+        self.address = f'{host}:{port}/{db}'
+        # a thread waits up to the pool timeout for a free connection instead of opening a new one
+        self.pool = redis.BlockingConnectionPool(host=host, port=port, db=db, **pool_kwargs)
+        self.client = redis.Redis(connection_pool=self.pool)
+
+    def ping(self) -> None:
+        self.client.ping()
+
+    def connect(self, count: int) -> None:
+        """
+        Opens up to `count` connections of the pool ahead of the first commands.
+        """
+        connections = []
+        try:
+            for _ in range(min(count, self.pool.max_connections)):
+                connections.append(self.pool.get_connection())
+        finally:
+            for connection in connections:
+                self.pool.release(connection)
+
+    def get(self, key: str) -> Union[str, None]:
+        return self.client.get(name=key)
+
+    def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        return self.client.mget(keys)
+
+    def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        self.client.set(name=key, value=val, ex=ex)
+
+    def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        with self.client.pipeline(transaction=False) as pipe:
+            for key, val in mapping.items():
+                pipe.set(name=key, value=val, ex=ex)
+            pipe.execute()
+
+    def ttl(self, key: str) -> int:
+        return self.client.ttl(key)
+
+    def delete(self, *keys: str) -> None:
+        self.client.delete(*keys)
+
+    def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        """
+        Sets every absent key to `token` for `ttl` seconds, returns which ones were set.
+        """
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(name=key, value=token, nx=True, px=max(int(ttl * 1000), 1))
+            return [bool(locked) for locked in pipe.execute()]
+
+    def unlock(self, keys: Sequence[str], token: str) -> None:
+        """
+        Deletes the keys still set to `token`.
+        """
+        self.client.eval(UNLOCK_SCRIPT, len(keys), *keys, token)
+
+    def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """
+        `TokenBuckets.take` on a bucket kept in Redis, the same for every client of the server.
+        """
+        return self.client.eval(TAKE_TOKENS_SCRIPT, 1, key, rate, burst, cost, time.time()) / 1000
+
+    def disconnect(self) -> None:
+        self.pool.disconnect()
+
+
+class AsyncRedisBackend:
+    """
+    `RedisBackend` on `redis.asyncio`.
+    """
+    name = 'redis'
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, db: int = 0, **pool_kwargs) -> None:
+        self.address = f'{host}:{port}/{db}'
+        self.pool = redis.asyncio.BlockingConnectionPool(host=host, port=port, db=db, **pool_kwargs)
+        self.client = redis.asyncio.Redis(connection_pool=self.pool)
+
+    async def ping(self) -> None:
+        await self.client.ping()
+
+    async def connect(self, count: int) -> None:
+        connections = []
+        try:
+            for _ in range(min(count, self.pool.max_connections)):
+                connections.append(await self.pool.get_connection())
+        finally:
+            for connection in connections:
+                await self.pool.release(connection)
+
+    async def get(self, key: str) -> Union[str, None]:
+        return await self.client.get(name=key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        return await self.client.mget(keys)
+
+    async def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        await self.client.set(name=key, value=val, ex=ex)
+
+    async def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, val in mapping.items():
+                pipe.set(name=key, value=val, ex=ex)
+            await pipe.execute()
+
+    async def ttl(self, key: str) -> int:
+        return await self.client.ttl(key)
+
+    async def delete(self, *keys: str) -> None:
+        await self.client.delete(*keys)
+
+    async def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(name=key, value=token, nx=True, px=max(int(ttl * 1000), 1))
+            return [bool(locked) for locked in await pipe.execute()]
+
+    async def unlock(self, keys: Sequence[str], token: str) -> None:
+        await self.client.eval(UNLOCK_SCRIPT, len(keys), *keys, token)
+
+    async def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return await self.client.eval(TAKE_TOKENS_SCRIPT, 1, key, rate, burst, cost, time.time()) / 1000
+
+    async def disconnect(self) -> None:
+        await self.pool.disconnect()
+
+
+class ReplicatedRedisBackend:
+    """
+    Redis primary with read replicas: GET and MGET go to the replicas in turn,
+    writes go to the primary.
+
+    A replica failing a read is skipped for `retry_timeout` seconds and the read
+    is repeated on the primary, so only failures of the primary reach the
+    circuit breaker. Replicas lag behind the primary, a read may miss a key
+    written a moment ago.
+    """
+    name = 'redis'
+
+    def __init__(self, primary: RedisBackend, replicas: Sequence[RedisBackend], retry_timeout: float = 10) -> None:
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.retry_timeout = retry_timeout
+        self.address = primary.address
+        self.fallbacks = 0
+        self.logger = logging.getLogger('scoring_api.Store')
+
+        self._turn = itertools.count()
+        self._down_until = [0.0] * len(self.replicas)
+
+    def replica(self) -> Union[int, None]:
+        """
+        Index of the replica to read from, None when all of them are skipped.
+        """
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            i = next(self._turn) % len(self.replicas)
+            if self._down_until[i] <= now:
+                return i
+        return None
+
+    def _replica_failed(self, i: int, e: Exception) -> None:
+        self.fallbacks += 1
+        self._down_until[i] = time.monotonic() + self.retry_timeout
+        self.logger.warning('replica %s skipped for %s seconds - %s %s',
+                            self.replicas[i].address, self.retry_timeout, type(e).__name__, e)
+
+    def ping(self) -> None:
+        self.primary.ping()
+
+    def connect(self, count: int) -> None:
+        for backend in (self.primary, *self.replicas):
+            backend.connect(count)
+
+    def get(self, key: str) -> Union[str, None]:
+        i = self.replica()
+        if i is not None:
+            try:
+                return self.replicas[i].get(key)
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                self.replicas[i].disconnect()
+                self._replica_failed(i, e)
+        return self.primary.get(key)
+
+    def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        i = self.replica()
+        if i is not None:
+            try:
+                return self.replicas[i].mget(keys)
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                self.replicas[i].disconnect()
+                self._replica_failed(i, e)
+        return self.primary.mget(keys)
+
+    def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        self.primary.set(key, val, ex)
+
+    def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        self.primary.set_many(mapping, ex)
+
+    def ttl(self, key: str) -> int:
+        return self.primary.ttl(key)
+
+    def delete(self, *keys: str) -> None:
+        self.primary.delete(*keys)
+
+    def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        return self.primary.lock(keys, token, ttl)
+
+    def unlock(self, keys: Sequence[str], token: str) -> None:
+        self.primary.unlock(keys, token)
+
+    def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return self.primary.take_tokens(key, rate, burst, cost)
+
+    def disconnect(self) -> None:
+        self.primary.disconnect()
+        for replica in self.replicas:
+            replica.disconnect()
+
+
+class AsyncReplicatedRedisBackend(ReplicatedRedisBackend):
+    """
+    `ReplicatedRedisBackend` on `AsyncRedisBackend` servers.
+    """
+
+    async def ping(self) -> None:
+        await self.primary.ping()
+
+    async def connect(self, count: int) -> None:
+        for backend in (self.primary, *self.replicas):
+            await backend.connect(count)
+
+    async def get(self, key: str) -> Union[str, None]:
+        i = self.replica()
+        if i is not None:
+            try:
+                return await self.replicas[i].get(key)
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                await self.replicas[i].disconnect()
+                self._replica_failed(i, e)
+        return await self.primary.get(key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        i = self.replica()
+        if i is not None:
+            try:
+                return await self.replicas[i].mget(keys)
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                await self.replicas[i].disconnect()
+                self._replica_failed(i, e)
+        return await self.primary.mget(keys)
+
+    async def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        await self.primary.set(key, val, ex)
+
+    async def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        await self.primary.set_many(mapping, ex)
+
+    async def ttl(self, key: str) -> int:
+        return await self.primary.ttl(key)
+
+    async def delete(self, *keys: str) -> None:
+        await self.primary.delete(*keys)
+
+    async def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        return await self.primary.lock(keys, token, ttl)
+
+    async def unlock(self, keys: Sequence[str], token: str) -> None:
+        await self.primary.unlock(keys, token)
+
+    async def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return await self.primary.take_tokens(key, rate, burst, cost)
+
+    async def disconnect(self) -> None:
+        await self.primary.disconnect()
+        for replica in self.replicas:
+            await replica.disconnect()
+
+
+class HashRing:
+    """
+    Consistent hashing of keys onto nodes: every node owns `replicas` points of
+    the ring, adding or removing a node moves only the keys of its points.
+    """
+
+    def __init__(self, nodes: Sequence[str], replicas: int = 160) -> None:
+        points = sorted(
+            (self.hash(f'{node}#{replica}'), index)
+            for index, node in enumerate(nodes)
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [index for _, index in points]
+
+    @staticmethod
+    def hash(line: str) -> int:
+        return int.from_bytes(hashlib.md5(line.encode('utf-8')).digest()[:8], 'big')
+
+    def node(self, key: str) -> int:
+        """
+        Index of the node owning `key`.
+        """
+        return self._nodes[bisect.bisect(self._hashes, self.hash(key)) % len(self._hashes)]
+
+    def group(self, keys: Sequence[str]) -> Dict[int, List[int]]:
+        """
+        Indexes of `keys` grouped by the node owning them.
+        """
+        groups: Dict[int, List[int]] = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self.node(key), []).append(i)
+        return groups
+
+
+class ShardedRedisBackend:
+    """
+    Spreads keys over several Redis servers with a `HashRing`; multi-key
+    commands are split into one command per shard.
+    """
+    name = 'sharded'
+
+    def __init__(self, shards: Sequence[RedisBackend], replicas: int = 160) -> None:
+        self.shards = list(shards)
+        self.ring = HashRing([shard.address for shard in self.shards], replicas)
+
+    def shard(self, key: str) -> RedisBackend:
+        return self.shards[self.ring.node(key)]
+
+    def ping(self) -> None:
+        for shard in self.shards:
+            shard.ping()
+
+    def connect(self, count: int) -> None:
+        for shard in self.shards:
+            shard.connect(count)
+
+    def get(self, key: str) -> Union[str, None]:
+        return self.shard(key).get(key)
+
+    def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        values = [None] * len(keys)
+        for node, indexes in self.ring.group(keys).items():
+            for i, val in zip(indexes, self.shards[node].mget([keys[i] for i in indexes])):
+                values[i] = val
+        return values
+
+    def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        self.shard(key).set(key, val, ex)
+
+    def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        keys = list(mapping)
+        for node, indexes in self.ring.group(keys).items():
+            self.shards[node].set_many({keys[i]: mapping[keys[i]] for i in indexes}, ex)
+
+    def ttl(self, key: str) -> int:
+        return self.shard(key).ttl(key)
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.shard(key).delete(key)
+
+    def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        locked = [False] * len(keys)
+        for node, indexes in self.ring.group(keys).items():
+            for i, ok in zip(indexes, self.shards[node].lock([keys[i] for i in indexes], token, ttl)):
+                locked[i] = ok
+        return locked
+
+    def unlock(self, keys: Sequence[str], token: str) -> None:
+        for node, indexes in self.ring.group(keys).items():
+            self.shards[node].unlock([keys[i] for i in indexes], token)
+
+    def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return self.shard(key).take_tokens(key, rate, burst, cost)
+
+    def disconnect(self) -> None:
+        for shard in self.shards:
+            shard.disconnect()
+
+
+class AsyncShardedRedisBackend(ShardedRedisBackend):
+    """
+    `ShardedRedisBackend` on `AsyncRedisBackend` shards, the shards of a
+    multi-key command are called concurrently.
+    """
+
+    async def ping(self) -> None:
+        await asyncio.gather(*(shard.ping() for shard in self.shards))
+
+    async def connect(self, count: int) -> None:
+        await asyncio.gather(*(shard.connect(count) for shard in self.shards))
+
+    async def get(self, key: str) -> Union[str, None]:
+        return await self.shard(key).get(key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        groups = list(self.ring.group(keys).items())
+        found = await asyncio.gather(*(self.shards[node].mget([keys[i] for i in indexes]) for node, indexes in groups))
+
+        values = [None] * len(keys)
+        for (_, indexes), shard_values in zip(groups, found):
+            for i, val in zip(indexes, shard_values):
+                values[i] = val
+        return values
+
+    async def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        await self.shard(key).set(key, val, ex)
+
+    async def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        keys = list(mapping)
+        await asyncio.gather(*(
+            self.shards[node].set_many({keys[i]: mapping[keys[i]] for i in indexes}, ex)
+            for node, indexes in self.ring.group(keys).items()
+        ))
+
+    async def ttl(self, key: str) -> int:
+        return await self.shard(key).ttl(key)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            await self.shard(key).delete(key)
+
+    async def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        groups = list(self.ring.group(keys).items())
+        found = await asyncio.gather(*(
+            self.shards[node].lock([keys[i] for i in indexes], token, ttl) for node, indexes in groups
+        ))
+
+        locked = [False] * len(keys)
+        for (_, indexes), shard_locked in zip(groups, found):
+            for i, ok in zip(indexes, shard_locked):
+                locked[i] = ok
+        return locked
+
+    async def unlock(self, keys: Sequence[str], token: str) -> None:
+        await asyncio.gather(*(
+            self.shards[node].unlock([keys[i] for i in indexes], token)
+            for node, indexes in self.ring.group(keys).items()
+        ))
+
+    async def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return await self.shard(key).take_tokens(key, rate, burst, cost)
+
+    async def disconnect(self) -> None:
+        for shard in self.shards:
+            await shard.disconnect()
+
+
+class MemoryBackend:
+    """
+    In-process dict with per-key expiration, for tests and single-node setups.
+
+    Values are kept as strings like Redis returns them. The data lives as long as
+    the backend, pre-forked workers do not share it. When `max_entries` is
+    exceeded the expired keys are dropped, then the oldest written ones.
+    """
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 1000000) -> None:
+        self.max_entries = max_entries
+        self._data: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._buckets = TokenBuckets()
+
+    def ping(self) -> None:
+        ...
+
+    def connect(self, count: int) -> None:
+        ...
+
+    def get(self, key: str) -> Union[str, None]:
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        now = time.monotonic()
+        with self._lock:
+            return [self._get(key, now) for key in keys]
+
+    def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        self.set_many({key: val}, ex)
+
+    def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        if ex is not None and ex <= 0:
+            # same contract as the Redis backends
+            raise redis.exceptions.ResponseError("invalid expire time in 'set' command")
+
+        now = time.monotonic()
+        expires_at = now + ex if ex is not None else float('inf')
+        with self._lock:
+            for key, val in mapping.items():
+                self._data.pop(key, None)
+                self._data[key] = (val if isinstance(val, str) else str(val), expires_at)
+            if len(self._data) > self.max_entries:
+                self._evict(now)
+
+    def ttl(self, key: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            if self._get(key, now) is None:
+                return -2
+            expires_at = self._data[key][1]
+            return -1 if expires_at == float('inf') else int(expires_at - now)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        now = time.monotonic()
+        locked = []
+        with self._lock:
+            for key in keys:
+                absent = self._get(key, now) is None
+                if absent:
+                    self._data[key] = (token, now + ttl)
+                locked.append(absent)
+        return locked
+
+    def unlock(self, keys: Sequence[str], token: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                if self._get(key, now) == token:
+                    del self._data[key]
+
+    def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return self._buckets.take(key, rate, burst, cost)
+
+    def disconnect(self) -> None:
+        ...
+
+    def _get(self, key: str, now: float) -> Union[str, None]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] <= now:
+            del self._data[key]
+            return None
+        return item[0]
+
+    def _evict(self, now: float) -> None:
+        for key in [key for key, (_, expires_at) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+        while len(self._data) > self.max_entries:
+            del self._data[next(iter(self._data))]
+
+
+class AsyncMemoryBackend(MemoryBackend):
+    """
+    `MemoryBackend` with the coroutine interface, nothing is awaited inside.
+    """
+
+    async def ping(self) -> None:
+        ...
+
+    async def connect(self, count: int) -> None:
+        ...
+
+    async def get(self, key: str) -> Union[str, None]:
+        return MemoryBackend.get(self, key)
+
+    async def mget(self, keys: Sequence[str]) -> List[Union[str, None]]:
+        return MemoryBackend.mget(self, keys)
+
+    async def set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        MemoryBackend.set_many(self, {key: val}, ex)
+
+    async def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> None:
+        MemoryBackend.set_many(self, mapping, ex)
+
+    async def ttl(self, key: str) -> int:
+        return MemoryBackend.ttl(self, key)
+
+    async def delete(self, *keys: str) -> None:
+        MemoryBackend.delete(self, *keys)
+
+    async def lock(self, keys: Sequence[str], token: str, ttl: float) -> List[bool]:
+        return MemoryBackend.lock(self, keys, token, ttl)
+
+    async def unlock(self, keys: Sequence[str], token: str) -> None:
+        MemoryBackend.unlock(self, keys, token)
+
+    async def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return MemoryBackend.take_tokens(self, key, rate, burst, cost)
+
+    async def disconnect(self) -> None:
+        ...
@@ -0,0 +1,133 @@
+import functools
+import re
+import time
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Pattern
+from typing import Tuple
+from typing import Union
+
+# the patterns `datetime.strptime` uses, so that both accept the same strings
+DIRECTIVES = {
+    'd': r'(?P<d>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])',
+    'm': r'(?P<m>1[0-2]|0[1-9]|[1-9])',
+    'Y': r'(?P<Y>\d\d\d\d)',
+}
+
+# the longest string matched by each directive
+DIRECTIVE_LENGTHS = {'d': 2, 'm': 2, 'Y': 4}
+
+PARSED_DATES_CACHE_SIZE = 4096
+# longer strings are parsed without the cache when the format has no pattern
+MAX_CACHED_DATE_LENGTH = 64
+
+
+@functools.lru_cache(maxsize=None)
+def compile_date_format(date_format: str) -> Union[Pattern, None]:
+    """
+    Regex matching `date_format` made of %d, %m, %Y and literal characters,
+    None for any other format.
+    """
+    parts = []
+    chars = iter(date_format)
+    for char in chars:
+        if char == '%':
+            directive = next(chars, None)
+            if directive not in DIRECTIVES or DIRECTIVES[directive] in parts:
+                return None
+            parts.append(DIRECTIVES[directive])
+        elif char.isspace():
+            # strptime matches any run of whitespace there
+            return None
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts) + r'\Z', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=None)
+def max_date_length(date_format: str) -> int:
+    """
+    Length of the longest string `date_format` can match, `MAX_CACHED_DATE_LENGTH`
+    for a format without a pattern.
+    """
+    if compile_date_format(date_format) is None:
+        return MAX_CACHED_DATE_LENGTH
+    length = 0
+    chars = iter(date_format)
+    for char in chars:
+        length += DIRECTIVE_LENGTHS[next(chars)] if char == '%' else 1
+    return length
+
+
+def _parse_date(data: str, date_format: str) -> Union[datetime, None]:
+    pattern = compile_date_format(date_format)
+    if pattern is None:
+        try:
+            return datetime.strptime(data, date_format)
+        except ValueError:
+            return None
+
+    found = pattern.match(data)
+    if found is None:
+        return None
+    parsed = found.groupdict()
+    try:
+        return datetime(int(parsed.get('Y', 1900)), int(parsed.get('m', 1)), int(parsed.get('d', 1)))
+    except ValueError:
+        return None
+
+
+_parse_date_cached = functools.lru_cache(maxsize=PARSED_DATES_CACHE_SIZE)(_parse_date)
+
+
+def parse_date(data: Any, date_format: str) -> datetime:
+    """
+    `datetime.strptime` for fixed day, month and year formats like %d.%m.%Y.
+
+    Takes no lock and remembers the recently parsed strings, failures included,
+    so the validators of one field parse a value once. Strings longer than the
+    format can match are not remembered, a client can not fill the cache with
+    large values. Raises ValueError and TypeError like `strptime`.
+    """
+    if not isinstance(data, str):
+        return datetime.strptime(data, date_format)
+
+    if len(data) <= max_date_length(date_format):
+        parsed = _parse_date_cached(data, date_format)
+    else:
+        parsed = _parse_date(data, date_format)
+    if parsed is None:
+        raise ValueError(f'time data {data!r} does not match format {date_format!r}')
+    return parsed
+
+
+class DaysAgo:
+    """
+    `date.today() - timedelta(days)` computed once per day and number of days.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time) -> None:
+        self.clock = clock
+        # (timestamp of the next midnight, today, {days: date}), replaced as a whole
+        self._state: Tuple[float, Union[date, None], Dict[int, date]] = (0.0, None, {})
+
+    def __call__(self, days: int) -> date:
+        now = self.clock()
+        until, today, dates = self._state
+        if now >= until:
+            today = date.fromtimestamp(now)
+            until = datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+            dates = {}
+            self._state = (until, today, dates)
+
+        cutoff = dates.get(days)
+        if cutoff is None:
+            cutoff = dates[days] = today - timedelta(days=days)
+        return cutoff
+
+
+days_ago = DaysAgo()
@@ -1,67 +1,89 @@
-import inspect
 import logging
 import re
-from collections import OrderedDict
-from datetime import datetime
 from typing import Any
-from typing import List
+from typing import Callable
+from typing import NamedTuple
 from typing import Tuple
 
+from api.base.dates import days_ago
+from api.base.dates import parse_date
+
+
+class ValidationResult(NamedTuple):
+    """
+    Immutable outcome of a field or validator check, unpacks as `is_valid, errors`.
+    """
+    is_valid: bool
+    errors: Tuple[str, ...]
+
 
 class BaseField(object):
-    logger = logging.getLogger(f'scoring_api.Field')
+    """
+    Field declared on a validator class.
+
+    Fields are shared by all validator instances and threads, so they hold only
+    their configuration; everything produced while validating lives in the call.
+    """
+    __slots__ = ('required', 'null')
+
+    logger = logging.getLogger('scoring_api.Field')
+
+    # (name, function) pairs of the `_validate_*` methods in the order they are run,
+    # collected once per class by `__init_subclass__`
+    _validate_handlers: Tuple[Tuple[str, Callable], ...] = ()
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._validate_handlers = tuple(
+            (name, getattr(cls, name)) for name in sorted(dir(cls))
+            if name.startswith('_validate_') and callable(getattr(cls, name))
+        )
 
     def __init__(self, required=False, null=True) -> None:
         self.required = required
         self.null = null
 
-        self._validate_handlers = dict()
-        self._is_valid = False
-        self._errors = []
-
-    def validate(self, name: str, data: dict) -> Tuple[bool, List[str]]:
-        self._is_valid = False
-        self._errors.clear()
-        self.logger.info(f'validate field "{name}": started')
+    def validate(self, name: str, data: dict) -> ValidationResult:
+        errors = []
+        self.logger.debug('validate field "%s": started', name)
 
         if data.get(name, None) is None:
             if self.required:
-                self._errors.append(f'The "{name}" field is required')
+                errors.append(f'The "{name}" field is required')
             else:
-                self.logger.info(f'optional field "{name}" is missing, processing is not performed')
+                self.logger.debug('optional field "%s" is missing, processing is not performed', name)
 
         elif not (self.null or data[name]):
-            self._errors.append(f'The "{name}" field cannot be empty')
+            errors.append(f'The "{name}" field cannot be empty')
 
         else:
-            self._get_validate_handlers()
-
-            for func_name, func in OrderedDict(sorted(self._validate_handlers.items())).items():
-                self.logger.info(f'validate field "{name}": started method {func_name}')
+            for func_name, func in self._validate_handlers:
+                self.logger.debug('validate field "%s": started method %s', name, func_name)
 
                 try:
-                    func(name, data[name])
+                    func(self, name, data[name])
                 except self.ValidateError as e:
-                    self._errors.append(e)
-
-        if not self._errors:
-            self._is_valid = True
-            self.logger.info(f'validate field "{name}": completed successful')
-        else:
-            self.logger.info(f'validate field "{name}": completed unsuccessful')
+                    errors.append(str(e))
 
-        return self._is_valid, self._errors
+        if not errors:
+            self.logger.debug('validate field "%s": completed successful', name)
+            return VALID
 
-    def _get_validate_handlers(self) -> None:
-        for name, func in inspect.getmembers(self, predicate=inspect.ismethod):
-            if name.startswith('_validate_'):
-                self._validate_handlers[name] = func
+        self.logger.debug('validate field "%s": completed unsuccessful', name)
+        return ValidationResult(False, tuple(errors))
 
     class ValidateError(Exception):
         ...
 
 
+VALID = ValidationResult(True, ())
+
+
 class ValidateMixinsMaxLen:
+    # the slot itself is declared by the concrete field, two bases with
+    # non-empty slots can not be combined
+    __slots__ = ()
+
     def __init__(self, max_len: int = 256, *args, **kwargs) -> None:
         self._max_len = max_len
         super().__init__(*args, **kwargs)
@@ -74,18 +96,23 @@ class ValidateMixinsMaxLen:
 
 
 class CharField(ValidateMixinsMaxLen, BaseField):
+    __slots__ = ('_max_len',)
+
     def _validate_type(self, name: str, data: Any) -> None:
         if not isinstance(data, str):
             raise BaseField.ValidateError(f'The "{name}" field is not instance of str')
 
 
 class ArgumentsField(BaseField):
+    __slots__ = ()
+
     def _validate_type(self, name: str, data: Any) -> None:
         if not isinstance(data, dict):
             raise BaseField.ValidateError(f'The "{name}" field is not instance of dict')
 
 
 class EmailField(CharField):
+    __slots__ = ()
     EMAIL_REGEX = re.compile(r"^[A-Za-z0-9.+_-]+@[A-Za-z0-9._-]+\.[a-zA-Z]*$")
 
     def _validate_mask(self, name: str, data: Any) -> None:
@@ -94,6 +121,7 @@ class EmailField(CharField):
 
 
 class PhoneField(ValidateMixinsMaxLen, BaseField):
+    __slots__ = ('_max_len',)
     PHONE_REGEX = re.compile(r"^7[0-9- ()]*$")
 
     def _validate_type(self, name: str, data: Any) -> None:
@@ -106,32 +134,38 @@ class PhoneField(ValidateMixinsMaxLen, BaseField):
 
 
 class DateField(BaseField):
+    __slots__ = ('_format',)
+
     def __init__(self, date_format: str = '%Y-%m-%d', *args, **kwargs) -> None:
         self._format = date_format
         super().__init__(*args, **kwargs)
 
     def _validate_type(self, name: str, data: Any) -> None:
         try:
-            datetime.strptime(data, self._format)
+            parse_date(data, self._format)
         except ValueError:
             raise BaseField.ValidateError(f'The "{name}" field has incorrect data format, should be {self._format}')
 
 
 class BirthDayField(DateField):
+    __slots__ = ('_not_older_year',)
+
     def __init__(self, not_older_year: int = 18, *args, **kwargs) -> None:
         self._not_older_year = not_older_year
         super().__init__(*args, **kwargs)
 
     def _validate_not_older_year(self, name: str, data: Any) -> None:
         try:
-            time_between_insertion = datetime.now() - datetime.strptime(data, self._format)
-            if time_between_insertion.days > self._not_older_year * 365:
+            # `_validate_type` parses the same value, one of the two calls is a cache hit
+            if parse_date(data, self._format).date() < days_ago(self._not_older_year * 365):
                 raise ValueError()
         except ValueError:
             raise BaseField.ValidateError(f'The "{name}" date is older than {self._not_older_year} years"')
 
 
 class ChoiceField(BaseField):
+    __slots__ = ('_choices',)
+
     def __init__(self, choice_items: dict, *args, **kwargs) -> None:
         self._choices = choice_items
         super().__init__(*args, **kwargs)
@@ -144,8 +178,20 @@ class ChoiceField(BaseField):
 
 
 class ClientIDsField(BaseField):
+    __slots__ = ()
+
     def _validate_type(self, name: str, data: Any) -> None:
         if not isinstance(data, list):
             raise BaseField.ValidateError(f'The "{name}" field is not instance of list')
         if not all([isinstance(item, int) for item in data]):
             raise BaseField.ValidateError(f'The "{name}" field does not contain only int')
+
+
+class BatchCallsField(BaseField):
+    __slots__ = ()
+
+    def _validate_type(self, name: str, data: Any) -> None:
+        if not isinstance(data, list):
+            raise BaseField.ValidateError(f'The "{name}" field is not instance of list')
+        if not all([isinstance(item, dict) for item in data]):
+            raise BaseField.ValidateError(f'The "{name}" field does not contain only objects')
@@ -1,63 +1,66 @@
-import inspect
 import logging
 from typing import Any
 from typing import List
 from typing import Tuple
 
 from api.base.fields import BaseField
+from api.base.fields import VALID
+from api.base.fields import ValidationResult
 from api.configurator import Conf
 
 
 class BaseValidators:
-    _declared_fields = {}
+    """
+    Validators keep no state between calls, one instance can check any number of
+    requests from any number of threads.
+    """
+    logger = logging.getLogger('scoring_api.Validators')
 
-    def __new__(cls, conf: Conf):
-        setattr(cls, '_declared_fields', cls._get_declared_fields())
-        return super().__new__(cls)
+    # (name, field) pairs sorted by name, compiled once per class by `__init_subclass__`
+    _declared_fields: Tuple[Tuple[str, BaseField], ...] = ()
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._declared_fields = tuple(cls._get_declared_fields().items())
 
     def __init__(self, conf: Conf) -> None:
         self.conf = conf
-        self.is_valid = False
-        self._errors = []
-        self.logger = logging.getLogger(f'scoring_api.Validators')
 
     @classmethod
     def _get_declared_fields(cls) -> dict:
-        logger = logging.getLogger(f'scoring_api.Validators')
+        logger = logging.getLogger('scoring_api.Validators')
         declared_fields = {}
-        base_members = [name for name, _ in inspect.getmembers(BaseValidators)]
+        base_members = set(dir(BaseValidators))
 
-        for name, obj in inspect.getmembers(cls):
-            if all([
-                name not in base_members,
-                isinstance(obj, BaseField)
-            ]):
+        for name in sorted(dir(cls)):
+            obj = getattr(cls, name)
+            if name not in base_members and isinstance(obj, BaseField):
                 declared_fields[name] = obj
-                # delattr(cls, name)
 
-        logger.info(f'collected {len(declared_fields)} fields in the class {cls.__name__}')
+        logger.debug('collected %s fields in the class %s', len(declared_fields), cls.__name__)
 
         return declared_fields
 
-    def validate(self, data: Any) -> Tuple[bool, List[str]]:
-        self.is_valid = False
-        self._errors.clear()
-        self.logger.info(f'start validate in class {self.__class__.__name__}')
+    def validate(self, data: Any) -> ValidationResult:
+        errors = []
+        self.logger.debug('start validate in class %s', self.__class__.__name__)
+
+        for field_name, field_class in self._declared_fields:
+            errors.extend(field_class.validate(field_name, data).errors)
 
-        for field_name, field_class in self._declared_fields.items():
-            status, errors = field_class.validate(field_name, data)
-            self._errors.extend(errors)
+        self.class_validate(data, errors)
 
-        self.class_validate(data)
+        if not errors:
+            return VALID
 
-        if not self._errors:
-            self.is_valid = True
-        else:
-            self.logger.info(f'found {len(self._errors)} errors:')
-            for error in self._errors:
-                self.logger.info(error)
+        self.logger.info('found %s errors:', len(errors))
+        for error in errors:
+            self.logger.info(error)
 
-        return self.is_valid, self._errors
+        return ValidationResult(False, tuple(errors))
 
-    def class_validate(self, data: Any) -> None:
+    def class_validate(self, data: Any, errors: List[str]) -> None:
+        """
+        Cross-field checks, problems are appended to `errors` of the current call.
+        """
         ...
@@ -3,16 +3,19 @@ from typing import Any
 from typing import Dict
 from typing import List
 from typing import Tuple
+from typing import Union
 
 from api.configurator import Conf
+from api.store import BaseKVStore
 
 
 class BaseView:
-    def __init__(self, conf: Conf) -> None:
+    def __init__(self, conf: Conf, store: Union[BaseKVStore, None] = None) -> None:
         self.conf = conf
+        self.store = store
         self.validator = None
         self.request = None
-        self.logger = logging.getLogger(f'scoring_api.View')
+        self.logger = logging.getLogger('scoring_api.View')
 
     def get(self) -> Tuple[int, Any, List[str]]:
         raise NotImplemented
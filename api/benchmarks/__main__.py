@@ -0,0 +1,125 @@
+import argparse
+import logging
+import os
+import sys
+from typing import List
+from typing import Union
+
+import api
+from api.benchmarks.report import compare_reports
+from api.benchmarks.report import format_results
+from api.benchmarks.report import load_report
+from api.benchmarks.report import make_report
+from api.benchmarks.report import save_report
+from api.configurator import Conf
+
+
+class Arguments:
+    def __init__(self) -> None:
+        self.parser = argparse.ArgumentParser(
+            prog='python -m api.benchmarks', description='Scoring API benchmarks')
+        self.parser.add_argument(
+            '--config',
+            required=False,
+            type=argparse.FileType(),
+            help='Point to overriding config file'
+        )
+        commands = self.parser.add_subparsers(dest='command', required=True)
+
+        micro = commands.add_parser('micro', help='Time validation, authentication, key hashing and JSON coding')
+        micro.add_argument('-k', '--filter', default=None, help='Run the benchmarks whose name contains this')
+        micro.add_argument('-n', '--number', type=int, default=None, help='Calls per round, picked automatically')
+        micro.add_argument('-r', '--repeat', type=int, default=5, help='Rounds, the median is reported')
+        micro.add_argument('-o', '--output', default=None, help='Write the JSON report to this file')
+
+        load = commands.add_parser('load', help='Load a server with a mix of online_score/clients_interests')
+        load.add_argument('--url', default=None, help='Load a running server instead of starting one')
+        load.add_argument('-e', '--engine', choices=['threaded', 'asyncio'], default='threaded')
+        load.add_argument('-t', '--threads', type=int, default=8, help='Request handling threads of the server')
+        load.add_argument('--store', choices=['redis', 'sharded', 'memory'], default=None,
+                          help='Store backend of the started server, store_backend of the config by default')
+        load.add_argument('-c', '--concurrency', type=int, default=8, help='Clients sending requests at once')
+        load.add_argument('-d', '--duration', type=float, default=10, help='Seconds to run')
+        load.add_argument('-n', '--requests', type=int, default=None,
+                          help='Requests per client, overrides --duration')
+        load.add_argument('--warmup', type=int, default=100, help='Requests sent before measuring')
+        load.add_argument('--mix', default='online_score=0.7,clients_interests=0.3',
+                          help='Shares of the methods, e.g. online_score=0.7,clients_interests=0.3')
+        load.add_argument('--users', type=int, default=10000, help='Distinct scored users')
+        load.add_argument('--clients', type=int, default=100000, help='Distinct client ids')
+        load.add_argument('--client-ids', type=int, default=10, help='Client ids per clients_interests request')
+        load.add_argument('--seed', type=int, default=0, help='Seed of the request streams')
+        load.add_argument('-o', '--output', default=None, help='Write the JSON report to this file')
+
+        startup = commands.add_parser('startup', help='Time starting the server until /ready answers')
+        startup.add_argument('-e', '--engine', choices=['threaded', 'asyncio'], action='append', default=None,
+                             help='Engine to start, both by default')
+        startup.add_argument('-r', '--repeat', type=int, default=3, help='Starts per engine, the median is reported')
+        startup.add_argument('-o', '--output', default=None, help='Write the JSON report to this file')
+
+        compare = commands.add_parser('compare', help='Compare two JSON reports, fails on a regression')
+        compare.add_argument('baseline')
+        compare.add_argument('current')
+        compare.add_argument('--threshold', type=float, default=0.1,
+                             help='Allowed relative degradation of a metric, 0.1 is 10%%')
+
+        self.args = None
+
+    def parse(self, argv: Union[List[str], None] = None) -> argparse.Namespace:
+        self.args = self.parser.parse_args(argv)
+        return self.args
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir))
+    args = Arguments().parse(argv)
+    # request logging would dominate the measurements
+    logging.getLogger('scoring_api').setLevel(logging.WARNING)
+
+    if args.command == 'compare':
+        lines, regressed = compare_reports(load_report(args.baseline), load_report(args.current), args.threshold)
+        print('\n'.join(lines))
+        return 1 if regressed else 0
+
+    if args.command == 'startup':
+        from api.benchmarks.startup import run_startup
+
+        engines = tuple(args.engine or ('threaded', 'asyncio'))
+        config = args.config.name if args.config is not None else None
+        results = run_startup(engines, config=config, repeat=args.repeat)
+        report = make_report('startup', results, engines=engines, repeat=args.repeat)
+        print('\n'.join(format_results(report['results'])))
+        if args.output:
+            save_report(report, args.output)
+        return 0
+
+    conf = Conf(args.config)
+
+    if args.command == 'micro':
+        from api.benchmarks.micro import run_micro
+
+        results = run_micro(conf, number=args.number, repeat=args.repeat, selected=args.filter)
+        report = make_report('micro', results, number=args.number, repeat=args.repeat)
+    else:
+        from api.benchmarks.load import run_load
+        from api.benchmarks.workload import Workload
+        from api.benchmarks.workload import parse_mix
+
+        workload = Workload(conf, parse_mix(args.mix), users=args.users, clients=args.clients,
+                            client_ids=args.client_ids, seed=args.seed)
+        results, url = run_load(conf, workload, url=args.url, engine=args.engine, threads=args.threads,
+                                store=args.store, concurrency=args.concurrency, duration=args.duration,
+                                requests=args.requests, warmup=args.warmup)
+        report = make_report('load', results, url=url, engine=args.engine, threads=args.threads,
+                             store=args.store, concurrency=args.concurrency, duration=args.duration,
+                             requests=args.requests, mix=args.mix, users=args.users, clients=args.clients,
+                             client_ids=args.client_ids, seed=args.seed)
+
+    print('\n'.join(format_results(report['results'])))
+    if args.output:
+        save_report(report, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import http.client
+import logging
+import threading
+import time
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+from urllib.parse import urlsplit
+
+from api.benchmarks.report import latency_summary
+from api.benchmarks.workload import Workload
+from api.configurator import Conf
+from api.handler import AsyncMainHandler
+from api.handler import MainHandler
+from api.server import create_server
+
+
+class LocalServer:
+    """
+    Runs the scoring server in a background thread of the benchmark process,
+    `store` names the store backend when it is not the configured one. The server
+    opens its store like in production and installs no signal handlers.
+    """
+
+    def __init__(self, conf: Conf, engine: str = 'threaded', threads: int = 8, store: Union[str, None] = None) -> None:
+        handler_class = AsyncMainHandler if engine == 'asyncio' else MainHandler
+        self.server = create_server(('127.0.0.1', 0), handler_class, conf=conf, threads=threads, engine=engine,
+                                    store_backend=store)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='scoring_api-benchmark', daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self) -> 'LocalServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+
+class LoadGenerator:
+    """
+    Drives a server with `concurrency` clients, each sending the requests of its
+    own workload stream one after another over a persistent connection.
+
+    Runs for `duration` seconds or until every client has sent `requests` requests.
+    """
+
+    def __init__(self,
+                 url: str,
+                 workload: Workload,
+                 concurrency: int = 8,
+                 duration: float = 10,
+                 requests: Union[int, None] = None,
+                 warmup: int = 100
+                 ) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.workload = workload
+        self.concurrency = concurrency
+        self.duration = duration
+        self.requests = requests
+        self.warmup = warmup
+        self.logger = logging.getLogger('scoring_api.Benchmark')
+
+        self._latencies: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def run(self) -> Dict[str, Dict[str, float]]:
+        if self.warmup:
+            self._client(-1, self.warmup, None)
+            self._latencies.clear()
+            self._errors.clear()
+
+        size = self.requests if self.requests is not None else 1000
+        deadline = None if self.requests is not None else time.monotonic() + self.duration
+
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._client, args=(number, size, deadline), daemon=True)
+            for number in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        results = {'all': latency_summary(
+            [value for values in self._latencies.values() for value in values], elapsed, sum(self._errors.values())
+        )}
+        for method, latencies in sorted(self._latencies.items()):
+            results[method] = latency_summary(latencies, elapsed, self._errors.get(method, 0))
+        return results
+
+    def _client(self, number: int, size: int, deadline: Union[float, None]) -> None:
+        latencies: Dict[str, List[float]] = {}
+        errors: Dict[str, int] = {}
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=10)
+        # a timed run cycles over its stream until the deadline
+        bodies = self.workload.stream(number, size)
+        sent = 0
+
+        try:
+            while (sent < size) if deadline is None else (time.monotonic() < deadline):
+                method, body = bodies[sent % len(bodies)]
+                sent += 1
+
+                started = time.perf_counter()
+                status = self._send(connection, body)
+                latency = time.perf_counter() - started
+
+                if status != 200:
+                    errors[method] = errors.get(method, 0) + 1
+                else:
+                    latencies.setdefault(method, []).append(latency)
+        finally:
+            connection.close()
+
+        with self._lock:
+            for method, values in latencies.items():
+                self._latencies.setdefault(method, []).extend(values)
+            for method, count in errors.items():
+                self._errors[method] = self._errors.get(method, 0) + count
+
+    def _send(self, connection: http.client.HTTPConnection, body: bytes) -> Union[int, None]:
+        try:
+            connection.request('POST', '/method/', body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.will_close:
+                connection.close()
+            return response.status
+        except (OSError, http.client.HTTPException) as e:
+            self.logger.debug('request failed: %s', e)
+            # the next request opens a new connection
+            connection.close()
+            return None
+
+
+def run_load(conf: Conf,
+             workload: Workload,
+             url: Union[str, None] = None,
+             engine: str = 'threaded',
+             threads: int = 8,
+             store: Union[str, None] = None,
+             **params
+             ) -> Tuple[Dict[str, Dict[str, float]], str]:
+    """
+    Loads `url`, or a server started in this process when it is None.
+    Returns the results and the loaded url.
+    """
+    if url is not None:
+        return LoadGenerator(url, workload, **params).run(), url
+
+    with LocalServer(conf, engine=engine, threads=threads, store=store) as server:
+        return LoadGenerator(server.url, workload, **params).run(), server.url
@@ -0,0 +1,109 @@
+import json
+import statistics
+import timeit
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from api.auth import Authenticator
+from api.base.fields import BirthDayField
+from api.base.fields import CharField
+from api.base.fields import ClientIDsField
+from api.base.fields import DateField
+from api.base.fields import EmailField
+from api.base.fields import PhoneField
+from api.benchmarks.workload import score_arguments
+from api.benchmarks.workload import signed
+from api.configurator import Conf
+from api.encoder import ENCODERS
+from api.method.validators import ClientsInterestsValidator
+from api.method.validators import MethodValidator
+from api.method.validators import OnlineScoreValidator
+from api.method.views import INTERESTS
+from api.method.views import MethodView
+from api.store import KVStore
+
+
+def benchmarks(conf: Conf) -> List[Tuple[str, Callable[[], object]]]:
+    """
+    (name, callable) pairs, every callable runs the measured operation once.
+    """
+    arguments = score_arguments(1)
+    score_request = signed(conf, 'online_score', arguments)
+    interests_request = signed(conf, 'clients_interests', {'client_ids': list(range(10))})
+    interests_response = {'code': 200, 'response': {cid: INTERESTS[:2] for cid in range(10)}}
+    request_body = json.dumps(score_request).encode('utf8')
+
+    char_field = CharField(required=False, null=True)
+    email_field = EmailField(required=False, null=True)
+    phone_field = PhoneField(required=False, null=True, max_len=11)
+    date_field = DateField(required=False, null=True, date_format='%d.%m.%Y')
+    birthday_field = BirthDayField(required=False, null=True, date_format='%d.%m.%Y', not_older_year=70)
+    client_ids_field = ClientIDsField(required=True, null=False)
+
+    method_validator = MethodValidator(conf=conf)
+    score_validator = OnlineScoreValidator(conf=conf)
+    interests_validator = ClientsInterestsValidator(conf=conf)
+
+    view = MethodView(conf, store=KVStore(conf, backend='memory'), authenticator=Authenticator(conf))
+    model = view.models.get()
+    auth_line = score_request['account'] + score_request['login'] + conf.salt
+
+    items = [
+        ('field.CharField', lambda: char_field.validate('first_name', arguments)),
+        ('field.EmailField', lambda: email_field.validate('email', arguments)),
+        ('field.PhoneField', lambda: phone_field.validate('phone', arguments)),
+        ('field.DateField', lambda: date_field.validate('birthday', arguments)),
+        ('field.BirthDayField', lambda: birthday_field.validate('birthday', arguments)),
+        ('field.ClientIDsField', lambda: client_ids_field.validate('client_ids', interests_request['arguments'])),
+        ('validators.MethodValidator', lambda: method_validator.validate(score_request)),
+        ('validators.OnlineScoreValidator', lambda: score_validator.validate(arguments)),
+        ('validators.ClientsInterestsValidator', lambda: interests_validator.validate(interests_request['arguments'])),
+        ('auth.check_auth', lambda: view.check_auth(score_request)),
+        ('auth.digest', lambda: Authenticator.digest(auth_line)),
+        ('score.score_key', lambda: model.key(arguments)),
+        ('score.compute_score', lambda: model.score(arguments)),
+        ('json.decode_request', lambda: json.loads(request_body)),
+    ]
+    for name, encoder in ENCODERS.items():
+        if name != 'auto':
+            items.append((f'json.encode_{name}', lambda encoder=encoder: encoder(interests_response)))
+
+    return items
+
+
+def measure(func: Callable[[], object], number: Union[int, None] = None, repeat: int = 5) -> Dict[str, float]:
+    """
+    Runs `func` `repeat` times `number` times, `number` is picked so that one
+    round takes at least 0.2 seconds when not given.
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+
+    per_call = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    median = statistics.median(per_call)
+    return {
+        'ops_per_sec': round(1 / median, 1),
+        'median_us': round(median * 1e6, 3),
+        'min_us': round(min(per_call) * 1e6, 3),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run_micro(conf: Conf,
+              number: Union[int, None] = None,
+              repeat: int = 5,
+              selected: Union[str, None] = None
+              ) -> Dict[str, Dict[str, float]]:
+    """
+    Measures the benchmarks whose name contains `selected`, all when it is None.
+    """
+    return {
+        name: measure(func, number, repeat)
+        for name, func in benchmarks(conf)
+        if selected is None or selected in name
+    }
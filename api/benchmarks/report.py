@@ -0,0 +1,99 @@
+import json
+import platform
+import sys
+import time
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+
+# compared metrics and whether a larger value is an improvement
+COMPARED = {
+    'ops_per_sec': True,
+    'median_us': False,
+    'rps': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'listening_ms': False,
+    'ready_ms': False,
+}
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted `values`, `q` in 0..100.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, min(len(values), int(-(-q * len(values) // 100))))
+    return values[rank - 1]
+
+
+def latency_summary(latencies: List[float], elapsed: float, errors: int) -> Dict[str, float]:
+    """
+    Throughput and latency percentiles of `latencies` (seconds) collected in `elapsed` seconds.
+    """
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'rps': round(len(values) / elapsed, 1) if elapsed > 0 else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def make_report(kind: str, results: Dict[str, Dict[str, float]], **params) -> Dict:
+    return {
+        'kind': kind,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+
+
+def save_report(report: Dict, path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_report(path: str) -> Dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare_reports(baseline: Dict, current: Dict, threshold: float = 0.1) -> Tuple[List[str], bool]:
+    """
+    Compares the results present in both reports, returns the report lines and
+    whether any metric got worse by more than `threshold` (a fraction).
+    """
+    lines = []
+    regressed = False
+
+    for name in sorted(set(baseline['results']) & set(current['results'])):
+        old, new = baseline['results'][name], current['results'][name]
+        for metric, higher_is_better in COMPARED.items():
+            if metric not in old or metric not in new or not old[metric]:
+                continue
+
+            change = (new[metric] - old[metric]) / old[metric]
+            worse = -change if higher_is_better else change
+            mark = ''
+            if worse > threshold:
+                mark = '  REGRESSION'
+                regressed = True
+            lines.append(f'{name:<40} {metric:<12} {old[metric]:>14.3f} {new[metric]:>14.3f} {change:>+8.1%}{mark}')
+
+    return lines, regressed
+
+
+def format_results(results: Dict[str, Dict[str, float]]) -> List[str]:
+    lines = []
+    for name, values in results.items():
+        lines.append(f'{name:<40} ' + '  '.join(f'{key}={value}' for key, value in values.items()))
+    return lines
@@ -0,0 +1,94 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+import api
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(api.__file__), os.path.pardir))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def poll_ready(port: int) -> Union[int, None]:
+    """
+    Status of `GET /ready`, None while nothing answers.
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+    try:
+        connection.request('GET', '/ready')
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def measure_startup(engine: str = 'threaded', config: Union[str, None] = None, timeout: float = 30) -> Tuple[float, float]:
+    """
+    Starts the server in a fresh interpreter, returns the seconds until it first
+    answered and until `/ready` answered 200.
+    """
+    port = free_port()
+    command = [sys.executable, '-m', 'api.entrypoint', '-l', '127.0.0.1', '-p', str(port), '-e', engine, '-w', '1']
+    if config is not None:
+        command += ['--config', os.path.abspath(config)]
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    answered = None
+    try:
+        while True:
+            elapsed = time.perf_counter() - started
+            if elapsed > timeout:
+                raise TimeoutError(f'the server was not ready in {timeout} seconds')
+            if process.poll() is not None:
+                raise RuntimeError(f'the server exited with status {process.returncode}')
+
+            status = poll_ready(port)
+            if status is not None and answered is None:
+                answered = elapsed
+            if status == http.client.OK:
+                return answered, elapsed
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_startup(engines: Tuple[str, ...] = ('threaded', 'asyncio'),
+                config: Union[str, None] = None,
+                repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """
+    Median time to the first answer and to readiness of `repeat` starts per engine.
+    """
+    results = {}
+    for engine in engines:
+        answered: List[float] = []
+        ready: List[float] = []
+        for _ in range(repeat):
+            first, last = measure_startup(engine, config)
+            answered.append(first)
+            ready.append(last)
+        results[f'startup.{engine}'] = {
+            'listening_ms': round(statistics.median(answered) * 1000, 1),
+            'ready_ms': round(statistics.median(ready) * 1000, 1),
+        }
+    return results
@@ -0,0 +1,87 @@
+import json
+import random
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from api.auth import Authenticator
+from api.configurator import Conf
+
+ACCOUNT = 'horns&hoofs'
+LOGIN = 'h&f'
+FIRST_NAMES = ('Stanislav', 'Anna', 'Ivan', 'Maria', 'Petr', 'Olga')
+LAST_NAMES = ('Stupnikov', 'Ivanova', 'Petrov', 'Sidorova', 'Smirnov', 'Kuznetsova')
+
+
+def signed(conf: Conf, method: str, arguments: Dict) -> Dict:
+    return {
+        'account': ACCOUNT,
+        'login': LOGIN,
+        'method': method,
+        'token': Authenticator.digest(ACCOUNT + LOGIN + conf.salt),
+        'arguments': arguments,
+    }
+
+
+def score_arguments(number: int) -> Dict:
+    return {
+        'phone': f'7{9000000000 + number}',
+        'email': f'user{number}@otus.ru',
+        'first_name': FIRST_NAMES[number % len(FIRST_NAMES)],
+        'last_name': LAST_NAMES[number % len(LAST_NAMES)],
+        'birthday': f'{number % 28 + 1:02}.{number % 12 + 1:02}.{1960 + number % 50}',
+        'gender': number % 3 + 1,
+    }
+
+
+class Workload:
+    """
+    Reproducible stream of request bodies.
+
+    `mix` maps method names to their shares; scored users and client ids are drawn
+    from pools of `users` and `clients` items, so that repeated keys hit the cache
+    about as often as in production traffic with the same pool sizes.
+    """
+
+    def __init__(self,
+                 conf: Conf,
+                 mix: Dict[str, float],
+                 users: int = 10000,
+                 clients: int = 100000,
+                 client_ids: int = 10,
+                 seed: int = 0
+                 ) -> None:
+        self.conf = conf
+        self.methods = list(mix)
+        self.weights = [mix[name] for name in self.methods]
+        self.users = users
+        self.clients = clients
+        self.client_ids = client_ids
+        self.seed = seed
+
+    def stream(self, number: int, size: int) -> List[Tuple[str, bytes]]:
+        """
+        `size` (method, body) pairs of the client number `number`.
+        """
+        rng = random.Random(f'{self.seed}:{number}')
+        bodies = []
+        for method in rng.choices(self.methods, self.weights, k=size):
+            if method == 'online_score':
+                arguments = score_arguments(rng.randrange(self.users))
+            else:
+                arguments = {'client_ids': rng.sample(range(self.clients), self.client_ids)}
+            bodies.append((method, json.dumps(signed(self.conf, method, arguments)).encode('utf8')))
+        return bodies
+
+
+def parse_mix(line: str) -> Dict[str, float]:
+    """
+    'online_score=0.7,clients_interests=0.3' -> {'online_score': 0.7, 'clients_interests': 0.3}
+    """
+    mix = {}
+    for item in line.split(','):
+        name, _, share = item.partition('=')
+        if name.strip() not in ('online_score', 'clients_interests'):
+            raise ValueError(f'Unknown method in the mix: "{name}"')
+        mix[name.strip()] = float(share or 1)
+    return mix
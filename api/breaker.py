@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing dependency.
+
+    closed: calls go through, `failure_threshold` failures in a row open the circuit.
+    open: calls are rejected at once; after `reset_timeout` seconds, or when a
+    background probe calls `half_open`, a trial call is let through.
+    half_open: one call at a time goes through, its success closes the circuit,
+    its failure opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    STATES = (CLOSED, OPEN, HALF_OPEN)
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, name: str = 'redis') -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.logger = logging.getLogger('scoring_api.Breaker')
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        # the closed state is checked without the lock, it is the hot path
+        if self.state is self.CLOSED:
+            return True
+
+        with self._lock:
+            if self.state is self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+
+            if self.state is self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+
+            if self.state is self.CLOSED:
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        if self.state is self.CLOSED and not self.failures:
+            return
+
+        with self._lock:
+            self.failures = 0
+            self._trial = False
+            if self.state is not self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state is self.HALF_OPEN or (self.state is self.CLOSED and self.failures >= self.failure_threshold):
+                self._open()
+
+    def release(self) -> None:
+        """
+        Ends a call that neither succeeded nor failed, e.g. one interrupted by an
+        error of the caller; in the half open state the next call becomes the trial.
+        """
+        with self._lock:
+            self._trial = False
+
+    def open(self) -> None:
+        with self._lock:
+            if self.state is not self.OPEN:
+                self._open()
+
+    def half_open(self) -> None:
+        """
+        Lets the next call through, used when a background probe reached the dependency.
+        """
+        with self._lock:
+            if self.state is self.OPEN:
+                self._trial = False
+                self._set_state(self.HALF_OPEN)
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.logger.warning('%s circuit %s -> %s', self.name, self.state, state)
+        self.state = state
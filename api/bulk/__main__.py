@@ -0,0 +1,74 @@
+import argparse
+import logging
+import sys
+import time
+from typing import List
+from typing import Union
+
+from api.bulk.files import FORMATS
+from api.bulk.files import ResultWriter
+from api.bulk.files import detect_format
+from api.bulk.files import read_chunks
+from api.bulk.scoring import BulkScorer
+from api.bulk.scoring import numpy
+from api.configurator import Conf
+
+
+class Arguments:
+    def __init__(self) -> None:
+        self.parser = argparse.ArgumentParser(
+            prog='python -m api.bulk', description='Score online_score arguments from a CSV or NDJSON file')
+        self.parser.add_argument('input', help='CSV file with a header or NDJSON file, - reads NDJSON from stdin')
+        self.parser.add_argument('-o', '--output', default='-', help='Results file, - writes to stdout')
+        self.parser.add_argument('--input-format', choices=FORMATS, default=None,
+                                 help='Picked by the file extension by default')
+        self.parser.add_argument('--output-format', choices=FORMATS, default=None,
+                                 help='Picked by the file extension by default')
+        self.parser.add_argument('-c', '--chunk-size', type=int, default=10000,
+                                 help='Rows scored, read from and written to the store at once')
+        self.parser.add_argument('-m', '--model', default=None,
+                                 help='Version of the scoring model, scoring_default_model by default')
+        self.parser.add_argument(
+            '--config',
+            required=False,
+            type=argparse.FileType(),
+            help='Point to overriding config file'
+        )
+        self.args = None
+
+    def parse(self, argv: Union[List[str], None] = None) -> argparse.Namespace:
+        self.args = self.parser.parse_args(argv)
+        return self.args
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    args = Arguments().parse(argv)
+    conf = Conf(args.config)
+    logging.getLogger('scoring_api').setLevel(logging.WARNING)
+
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or detect_format(args.output)
+    source = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    target = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+
+    started = time.perf_counter()
+    scorer = BulkScorer(conf, model=args.model)
+    try:
+        writer = ResultWriter(target, output_format)
+        for chunk in read_chunks(source, input_format, args.chunk_size):
+            writer.write(scorer.score(chunk))
+    finally:
+        scorer.store.close()
+        for file in (source, target):
+            if file not in (sys.stdin, sys.stdout):
+                file.close()
+
+    seconds = time.perf_counter() - started
+    print(f'{scorer.rows} rows, {scorer.invalid} invalid, {scorer.cached} cached, {scorer.degraded} not cached '
+          f'in {seconds:.1f} seconds ({scorer.rows / seconds if seconds else 0:.0f} rows/s, '
+          f'numpy {"on" if numpy is not None else "off"})', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
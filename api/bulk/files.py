@@ -0,0 +1,83 @@
+import csv
+import json
+import os
+from itertools import islice
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import TextIO
+
+FORMATS = ('csv', 'ndjson')
+
+
+def detect_format(path: str) -> str:
+    """
+    'csv' for *.csv files, 'ndjson' for anything else (*.ndjson, *.jsonl, stdin).
+    """
+    return 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'ndjson'
+
+
+def csv_rows(file: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    Rows of a CSV file with a header, as the arguments of an online_score call:
+    empty cells are missing values and the gender is a number.
+    """
+    for row in csv.DictReader(file):
+        row = {name: val for name, val in row.items() if val != ''}
+        gender = row.get('gender')
+        if gender is not None and gender.isdigit():
+            row['gender'] = int(gender)
+        yield row
+
+
+def ndjson_rows(file: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    One JSON object per line, blank lines are skipped.
+    """
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_chunks(file: TextIO, fmt: str = 'ndjson', chunk_size: int = 10000) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Streams the rows of `file` in lists of up to `chunk_size` rows.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown input format "{fmt}", available: {", ".join(FORMATS)}')
+
+    rows: Iterable[Dict[str, Any]] = csv_rows(file) if fmt == 'csv' else ndjson_rows(file)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ResultWriter:
+    """
+    Writes `{'id': ..., 'score': ...}` or `{'id': ..., 'errors': [...]}` results
+    as NDJSON lines or as CSV rows with the id, score and errors columns.
+    """
+
+    def __init__(self, file: TextIO, fmt: str = 'ndjson') -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown output format "{fmt}", available: {", ".join(FORMATS)}')
+
+        self.file = file
+        self.fmt = fmt
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.writer(file)
+            self._csv.writerow(('id', 'score', 'errors'))
+
+    def write(self, results: Iterable[Dict[str, Any]]) -> None:
+        if self._csv is not None:
+            self._csv.writerows(
+                (result['id'], result.get('score', ''), '; '.join(result.get('errors', ())))
+                for result in results
+            )
+        else:
+            self.file.writelines(json.dumps(result) + '\n' for result in results)
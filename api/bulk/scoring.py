@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from api.configurator import Conf
+from api.method.scoring import SCORE_ARGUMENTS
+from api.method.scoring import ScoringModel
+from api.method.scoring import ScoringModels
+from api.method.validators import OnlineScoreValidator
+from api.store import KVStore
+from api.store import StoreUnavailable
+
+try:
+    import numpy
+except ImportError:  # optional speedup
+    numpy = None
+
+Columns = Dict[str, List[Any]]
+SCORE_TTL = 60 * 60
+
+
+def score_keys(columns: Columns, model: ScoringModel) -> List[str]:
+    """
+    `ScoringModel.key` of every row.
+    """
+    md5 = hashlib.md5
+    prefix = f'uid:{model.version}:'
+    return [
+        prefix + md5(f'{first_name or ""}{last_name or ""}{phone or ""}{"" if birthday is None else birthday}'
+                     .encode('utf-8')).hexdigest()
+        for first_name, last_name, phone, birthday
+        in zip(columns['first_name'], columns['last_name'], columns['phone'], columns['birthday'])
+    ]
+
+
+def compute_scores(columns: Columns, model: ScoringModel, use_numpy: bool = True) -> List[float]:
+    """
+    `ScoringModel.score` of every row as a float like `MethodView.get_score`
+    returns it: the presence mask of every argument is computed once per column,
+    the masks are combined into the bitmask indexing the compiled table of the model.
+    """
+    size = len(columns['phone'])
+    if use_numpy and numpy is not None:
+        bitmasks = numpy.zeros(size, dtype=numpy.int64)
+        for name, bit in model.bits:
+            bitmasks |= numpy.array(columns[name], dtype=object).astype(bool) * bit
+        return numpy.array(model.table, dtype=float)[bitmasks].tolist()
+
+    bitmasks = [0] * size
+    for name, bit in model.bits:
+        for i, val in enumerate(columns[name]):
+            if val:
+                bitmasks[i] |= bit
+    table = [float(score) for score in model.table]
+    return [table[bitmask] for bitmask in bitmasks]
+
+
+class BulkScorer:
+    """
+    Scores chunks of online_score arguments with the results `MethodView.get_score`
+    would return: every chunk is validated row by row, the stored scores are read
+    with one MGET, the missing ones are computed column-wise and written back with
+    one pipeline. Scores are computed by the `model` version, the default one without it.
+    """
+
+    def __init__(self, conf: Conf, store: Union[KVStore, None] = None, model: Union[str, None] = None) -> None:
+        self.conf = conf
+        self.model = ScoringModels(conf).get(model)
+        if self.model is None:
+            raise ValueError(f'unknown scoring model "{model}"')
+        self.store = store if store is not None else KVStore(conf)
+        self.validator = OnlineScoreValidator(conf=conf)
+        self.logger = logging.getLogger('scoring_api.Bulk')
+
+        self.rows = 0
+        self.invalid = 0
+        self.cached = 0
+        self.degraded = 0
+
+    def score(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Results of the rows in their order, every result has the `id` of its row
+        or its position in the whole input.
+        """
+        started = time.perf_counter()
+        start, self.rows = self.rows, self.rows + len(rows)
+        results: List[Dict[str, Any]] = [
+            {'id': row.get('id', start + i) if isinstance(row, dict) else start + i} for i, row in enumerate(rows)
+        ]
+
+        valid = []
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                results[i]['errors'] = ['the row is not an object']
+                continue
+            status, errors = self.validator.validate(row)
+            if status:
+                valid.append(i)
+            else:
+                results[i]['errors'] = list(errors)
+        self.invalid += len(rows) - len(valid)
+
+        columns = {name: [rows[i].get(name) for i in valid] for name in SCORE_ARGUMENTS}
+        keys = score_keys(columns, self.model)
+        scores = compute_scores(columns, self.model)
+
+        stored, available = self._read(keys)
+        missing = {}
+        for i, key, score, val in zip(valid, keys, scores, stored):
+            if val:
+                score = float(val)
+            elif key in missing:
+                # the key leaves out email and gender, get_score would read back the first fill
+                score = float(missing[key])
+            elif available:
+                missing[key] = score
+            results[i]['score'] = score
+
+        cached = sum(1 for val in stored if val)
+        self.cached += cached
+        if available:
+            self.store.set_many(missing, SCORE_TTL)
+        self.logger.info('scored %d rows, %d invalid, %d cached in %.3f seconds',
+                         len(rows), len(rows) - len(valid), cached, time.perf_counter() - started)
+        return results
+
+    def _read(self, keys: List[str]) -> Tuple[List[Any], bool]:
+        """
+        The stored values of `keys` and whether the store could be read.
+        """
+        if not keys:
+            return [None] * len(keys), True
+        try:
+            return self.store.get_many(keys), True
+        except StoreUnavailable:
+            # degraded like get_score: computed and not cached
+            self.degraded += len(keys)
+            return [None] * len(keys), False
@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import Union
+
+MISSING = object()
+
+
+class LocalCache:
+    """
+    Bounded in-process cache with per-entry expiration and LRU eviction.
+
+    Safe to share between threads. `get` returns `MISSING` for absent and
+    expired keys, so that any value including None can be cached.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, val = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return val
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key: Hashable, val: Any, ex: Union[float, None] = None) -> None:
+        """
+        Stores the value for `ttl` seconds, or for `ex` seconds if it is shorter.
+        """
+        ttl = self.ttl if ex is None else min(self.ttl, ex)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, val)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
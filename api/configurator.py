@@ -1,52 +1,426 @@
 import logging.config
+import operator
 import os
+import threading
+import weakref
 from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import TextIO
+from typing import Tuple
+from typing import Union
 
 import yaml
 
+Check = Callable[[Any], Any]
+
+
+def of_type(*types: type) -> Check:
+    name = ' or '.join(t.__name__ for t in types)
+
+    def check(value: Any) -> Any:
+        # a bool is an int to isinstance but never a number of the config
+        if isinstance(value, bool) is not (bool in types) or not isinstance(value, types):
+            raise ValueError(f'must be of type {name}')
+        return value
+    return check
+
+
+number, string, boolean = of_type(int, float), of_type(str), of_type(bool)
+sequence, mapping = of_type(list), of_type(dict)
+
+
+def count(value: Any) -> int:
+    """
+    A whole number, written as an int or as a float like 8.0.
+    """
+    value = number(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('must be a whole number')
+        value = int(value)
+    return value
+
+
+def port(value: Any) -> int:
+    # redis-py took the port as a string as well
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    return count(value)
+
+
+def anything(value: Any) -> Any:
+    return value
+
+
+def one_of(*choices: str) -> Check:
+    def check(value: Any) -> Any:
+        if value not in choices:
+            raise ValueError(f'must be one of {", ".join(choices)}')
+        return value
+    return check
+
+
+def optional(check: Check) -> Check:
+    """
+    `check` of a setting disabled by null.
+    """
+    def optional_check(value: Any) -> Any:
+        return None if value is None else check(value)
+    return optional_check
+
+
+# check of every setting of the default config, returning the value to keep;
+# durations and rates take any number, sizes and counts a whole one
+SETTINGS: Dict[str, Check] = {
+    'log_file_path': optional(string),
+    'salt': string,
+    'admin_login': string,
+    # only ever formatted into the admin digest
+    'admin_salt': anything,
+    'batch_max_calls': count,
+    'auth_cache_max_entries': count,
+    'auth_cache_ttl': number,
+    'interests_fallback': sequence,
+    'config_watch_interval': number,
+
+    'scoring_default_model': string,
+    'scoring_models_file': optional(string),
+    'scoring_models': mapping,
+
+    'log_level': string,
+    'log_levels': mapping,
+    'log_format': one_of('text', 'json'),
+    'log_queue_size': count,
+    'log_rate_limits': mapping,
+
+    'stream_batch_size': count,
+    'stream_max_line_size': count,
+
+    'response_encoder': one_of('auto', 'json', 'orjson'),
+    'response_gzip_min_size': count,
+    'response_gzip_level': count,
+
+    'store_backend': one_of('redis', 'sharded', 'memory'),
+    'redis_shards': sequence,
+    'redis_shard_replicas': count,
+    'memory_max_entries': count,
+
+    'redis_host': string,
+    'redis_port': port,
+    'redis_db': count,
+    'redis_reconnect_try': boolean,
+    'redis_reconnect_timeout': number,
+    'redis_reconnect_max_timeout': number,
+    'redis_reconnect_smart_delay': boolean,
+    'redis_max_connections': count,
+    'redis_pool_timeout': number,
+    'redis_health_check_interval': number,
+    'redis_breaker_failure_threshold': count,
+    'redis_breaker_reset_timeout': number,
+    'redis_replicas': sequence,
+    'redis_replica_retry_timeout': number,
+
+    'write_behind_enabled': boolean,
+    'write_behind_queue_size': count,
+    'write_behind_batch_size': count,
+    'write_behind_flush_interval': number,
+    'write_behind_drop_policy': one_of('new', 'oldest'),
+
+    'single_flight_enabled': boolean,
+    'single_flight_lock_timeout': number,
+
+    'local_cache_enabled': boolean,
+    'local_cache': mapping,
+
+    'server_engine': one_of('threaded', 'asyncio'),
+    'server_workers': count,
+    'server_threads': count,
+    'server_queue_size': count,
+    'server_shutdown_timeout': number,
+    'server_keepalive_timeout': number,
+    'server_keepalive_max_requests': count,
+
+    'admission_max_body_size': count,
+    'admission_max_client_ids': count,
+    'admission_max_in_flight': count,
+    # sent as the Retry-After header, which takes whole seconds
+    'admission_retry_after': count,
+    'admission_rate_limit': number,
+    'admission_rate_burst': number,
+    'admission_rate_shared': boolean,
+}
+
+
+class Snapshot:
+    """
+    Settings of one config load, read-only once built.
+
+    Every setting is a slot of a class made for the loaded keys, reading one is
+    a plain attribute access. The values themselves are not copied, lists and
+    mappings of a snapshot must not be modified.
+    """
+    __slots__ = ()
+
+    def __init__(self, values: Dict[str, Any]) -> None:
+        for key in self.__slots__:
+            object.__setattr__(self, key, values[key])
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f'the config snapshot is read-only, "{name}" can not be set')
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f'the config snapshot is read-only, "{name}" can not be deleted')
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({len(self.__slots__)} settings)'
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+_snapshot_classes: Dict[Tuple[str, ...], type] = {}
+_exposed_classes = set()
+
+
+def snapshot_class(keys: Iterable[str]) -> type:
+    keys = tuple(sorted(keys))
+    cls = _snapshot_classes.get(keys)
+    if cls is None:
+        cls = _snapshot_classes[keys] = type('ConfSnapshot', (Snapshot,), {'__slots__': keys})
+    return cls
+
+
+def validate(values: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Checks `values` against `SETTINGS`, returns the values to keep and the errors
+    of the invalid ones. A setting without a check is kept as it is.
+    """
+    checked, errors = {}, []
+    for key, value in values.items():
+        try:
+            checked[key] = SETTINGS.get(key, anything)(value)
+        except ValueError as e:
+            errors.append(f'{key} {e}, got {value!r}')
+    return checked, errors
+
 
 class Conf:
-    config = {}
+    """
+    Current settings of the process: the default config, the file of the
+    `SCORING_API_CONFIG` variable and the overriding `stream`, in that order.
+
+    Settings are read from an immutable `snapshot`; `reload` and `update` build and
+    validate a new one and swap it in as a whole, so readers take no lock and never
+    see a half-applied config. Listeners subscribed to some settings are called with
+    the new snapshot when any of them changed.
+    """
     default_config_path = 'configs/default_config.yaml'
+    # attributes of the Conf itself, settings of these names are only read from the snapshot
+    own_attributes = ('logger', 'load_def_conf', 'path', 'snapshot')
+    # file overriding the defaults for every Conf of the process, e.g. to run the tests without redis
+    override_config_env = 'SCORING_API_CONFIG'
 
     def __init__(self, stream: Optional[TextIO] = None, load_def_conf: bool = True, ) -> None:
 
-        self.logger = logging.getLogger(f'scoring_api.Conf')
+        self.logger = logging.getLogger('scoring_api.Conf')
         self.load_def_conf = load_def_conf
+        # the overriding file is read again on reload, a stream without a file is kept as parsed
+        self.path = os.path.abspath(stream.name) if isinstance(getattr(stream, 'name', None), str) else None
+        self._stream_data: Dict[str, Any] = {}
 
-        if load_def_conf:
-            self._load_default_config()
+        # a listener may subscribe or read the config while it is notified
+        self._lock = threading.RLock()
+        self._listeners: List[Tuple[Callable[[], Any], Union[FrozenSet[str], None]]] = []
+        self._watch_stop = threading.Event()
+        self._watch_thread: Union[threading.Thread, None] = None
 
-        if stream:
-            self._load_config(stream, force=False if load_def_conf else True)
+        self.snapshot: Snapshot = self._build(self._read(stream))
 
-    def _load_default_config(self) -> None:
-        path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            os.path.pardir,
-            Conf.default_config_path
-        )
-        with open(path, 'r') as f:
-            self._load_config(f, force=True)
+    @classmethod
+    def _expose(cls, keys: Iterable[str]) -> None:
+        """
+        Adds a property reading the current snapshot for every setting, a lookup
+        falling through to `__getattr__` costs an exception raised inside Python.
+        """
+        for key in keys:
+            if key not in cls.own_attributes and not hasattr(cls, key):
+                setattr(cls, key, property(operator.attrgetter(f'snapshot.{key}')))
+
+    def __getattr__(self, name: str) -> Any:
+        # settings of other snapshots than the exposed ones and missing settings
+        try:
+            return getattr(self.__dict__['snapshot'], name)
+        except (KeyError, AttributeError):
+            raise AttributeError(f'Attribute "{name}" was not defined.') from None
+
+    @classmethod
+    def default_path(cls) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir, cls.default_config_path)
+
+    def files(self) -> List[str]:
+        """
+        Config files of the current settings, in the order they are applied.
+        """
+        files = []
+        if self.load_def_conf:
+            files.append(self.default_path())
+            if os.environ.get(Conf.override_config_env):
+                files.append(os.environ[Conf.override_config_env])
+        if self.path:
+            files.append(self.path)
+        return files
+
+    def _read(self, stream: Optional[TextIO] = None) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        if self.load_def_conf:
+            with open(self.default_path(), 'r') as f:
+                values.update(yaml.safe_load(f) or {})
+            override_path = os.environ.get(Conf.override_config_env)
+            if override_path:
+                with open(override_path, 'r') as f:
+                    self._apply(values, yaml.safe_load(f))
 
-    def _load_config(self, stream: TextIO, force: bool = False) -> None:
-        data = yaml.safe_load(stream)
-        for key, value in data.items():
+        if stream is not None:
+            data = yaml.safe_load(stream) or {}
+            if self.path is None:
+                self._stream_data = data
+        elif self.path:
+            with open(self.path, 'r') as f:
+                data = yaml.safe_load(f) or {}
+        else:
+            data = self._stream_data
+        self._apply(values, data, force=not self.load_def_conf)
+        return values
+
+    def _apply(self, values: Dict[str, Any], data: Union[Dict[str, Any], None], force: bool = False) -> None:
+        for key, value in (data or {}).items():
             if force:
-                self.config[key] = value
+                values[key] = value
             else:
-                if key not in self.config:
-                    self.logger.error(f'Unknown parameter received: {key}')
+                if key not in values:
+                    self.logger.error('Unknown parameter received: %s', key)
                     continue
-                if self.config.get(key) == value:
+                if values.get(key) == value:
                     continue
-                self.logger.info(f'Applying a configuration parameter: {key}: {value}')
-                self.config[key] = value
+                self.logger.info('Applying a configuration parameter: %s: %s', key, value)
+                values[key] = value
 
-    def __getattr__(self, name: str) -> Any:
-        if name in Conf.config.keys():
-            return self.config[name]
-        else:
-            raise AttributeError(f'Attribute "{name}" was not defined.')
+    def _build(self, values: Dict[str, Any]) -> Snapshot:
+        """
+        Raises ValueError listing every invalid setting.
+        """
+        values, errors = validate(values)
+        if errors:
+            raise ValueError('invalid config: ' + '; '.join(errors))
+        cls = snapshot_class(values)
+        if cls not in _exposed_classes:
+            self._expose(cls.__slots__)
+            _exposed_classes.add(cls)
+        return cls(values)
+
+    def reload(self) -> bool:
+        """
+        Reads the config files again and swaps in the new settings,
+        an unreadable or invalid config keeps the current ones.
+        """
+        with self._lock:
+            try:
+                snapshot = self._build(self._read())
+            except (OSError, yaml.YAMLError, ValueError) as e:
+                self.logger.error('config not reloaded, keeping the current one - %s', e)
+                return False
+            changed = self._swap(snapshot)
+        self.logger.info('config reloaded, changed: %s', ', '.join(sorted(changed)) or 'nothing')
+        return True
+
+    def update(self, **values: Any) -> FrozenSet[str]:
+        """
+        Swaps in the current settings with `values` replaced, returns the changed
+        settings. Raises ValueError for an unknown or an invalid setting.
+        """
+        with self._lock:
+            current = self.snapshot.as_dict()
+            unknown = [key for key in values if key not in current]
+            if unknown:
+                raise ValueError(f'Unknown parameters: {", ".join(unknown)}')
+            return self._swap(self._build({**current, **values}))
+
+    def _swap(self, snapshot: Snapshot) -> FrozenSet[str]:
+        with self._lock:
+            previous = self.snapshot
+            missing = object()
+            changed = frozenset(
+                key for key in snapshot.__slots__ if getattr(previous, key, missing) != getattr(snapshot, key)
+            )
+            if changed or type(previous) is not type(snapshot):
+                self.snapshot = snapshot
+                self._notify(snapshot, changed)
+        return changed
+
+    def subscribe(self, listener: Callable[[Snapshot, FrozenSet[str]], None],
+                  keys: Union[Iterable[str], None] = None) -> None:
+        """
+        Calls `listener(snapshot, changed)` after a swap changing any of `keys`, any
+        setting without them. A bound method is held weakly, it does not keep its
+        object alive.
+        """
+        ref = weakref.WeakMethod(listener) if hasattr(listener, '__self__') else lambda: listener
+        with self._lock:
+            self._listeners.append((ref, frozenset(keys) if keys is not None else None))
+
+    def unsubscribe(self, listener: Callable[[Snapshot, FrozenSet[str]], None]) -> None:
+        with self._lock:
+            self._listeners = [(ref, keys) for ref, keys in self._listeners if ref() not in (None, listener)]
+
+    def _notify(self, snapshot: Snapshot, changed: FrozenSet[str]) -> None:
+        for ref, keys in list(self._listeners):
+            listener = ref()
+            if listener is not None and (keys is None or keys & changed):
+                try:
+                    listener(snapshot, changed)
+                except Exception as e:
+                    # the snapshot is in place, the other listeners still get it
+                    self.logger.exception('config listener %s failed: %s', listener, e)
+        self._listeners = [(ref, keys) for ref, keys in self._listeners if ref() is not None]
+
+    def watch(self, interval: float) -> None:
+        """
+        Reloads the config from a background thread when one of its files changes,
+        checking every `interval` seconds.
+        """
+        if self._watch_thread is not None or interval <= 0:
+            return
+
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(
+            target=self._watch, args=(interval, self._mtimes()), name='scoring_api-config-watch', daemon=True
+        )
+        self._watch_thread.start()
+
+    def _mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self.files():
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                mtimes[path] = 0.0
+        return mtimes
+
+    def _watch(self, interval: float, mtimes: Dict[str, float]) -> None:
+        while not self._watch_stop.wait(interval):
+            current = self._mtimes()
+            if current != mtimes:
+                mtimes = current
+                self.logger.info('config files changed, reloading')
+                self.reload()
+
+    def stop_watch(self) -> None:
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join()
+            self._watch_thread = None
@@ -0,0 +1,84 @@
+import gzip
+import json
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Tuple
+from typing import Union
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj).encode('utf8')
+
+
+def orjson_dumps(obj: Any) -> bytes:
+    # client ids are int keys of the clients_interests response
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # ints beyond 64 bits, valid client ids the stdlib encodes
+        return json_dumps(obj)
+
+
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {
+    'json': json_dumps,
+}
+if orjson is not None:
+    ENCODERS['orjson'] = orjson_dumps
+ENCODERS['auto'] = ENCODERS.get('orjson', json_dumps)
+
+
+def get_encoder(name: str) -> Callable[[Any], bytes]:
+    """
+    Returns the function serializing a response body straight to bytes,
+    'auto' picks orjson when it is installed and falls back to the stdlib.
+    """
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ValueError(f'Unknown response encoder "{name}", available: {", ".join(ENCODERS)}')
+
+
+def compress(payload: bytes,
+             accept_encoding: Union[str, None],
+             min_size: int,
+             level: int = 5
+             ) -> Tuple[bytes, Union[str, None]]:
+    """
+    Gzips payloads of at least `min_size` bytes for clients accepting it,
+    returns the payload and its Content-Encoding.
+    """
+    if min_size < 0 or len(payload) < min_size or not accepts_gzip(accept_encoding):
+        return payload, None
+
+    return gzip.compress(payload, compresslevel=level), 'gzip'
+
+
+def accepts_gzip(accept_encoding: Union[str, None]) -> bool:
+    """
+    Whether an Accept-Encoding header allows gzip: listed, or covered by `*`,
+    with a q-value above 0. `gzip;q=0` is a refusal.
+    """
+    if not accept_encoding:
+        return False
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if coding:
+            weights[coding.lower()] = weight
+
+    return weights.get('gzip', weights.get('x-gzip', weights.get('*', 0.0))) > 0
@@ -1,17 +1,14 @@
 import argparse
-import logging
 import os
-from http.server import HTTPServer
 from typing import Any
-from typing import Tuple
-
-import argcomplete
 
 import api
 from api.configurator import Conf
+from api.handler import AsyncMainHandler
 from api.handler import MainHandler
-from api.logger import log_format
+from api.logger import LoggingPipeline
 from api.logger import logger
+from api.server import make_server
 
 
 class Arguments:
@@ -37,37 +34,56 @@ class Arguments:
             type=argparse.FileType(),
             help='Point to overriding config file'
         )
+        self.parser.add_argument(
+            "-e",
+            "--engine",
+            choices=['threaded', 'asyncio'],
+            default=None,
+            help="Serve requests from a thread pool or from an asyncio event loop",
+        )
+        self.parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of pre-forked worker processes sharing the listening socket",
+        )
+        self.parser.add_argument(
+            "-t",
+            "--threads",
+            type=int,
+            default=None,
+            help="Number of request handling threads in every worker process, 0 handles requests in the accept loop",
+        )
 
-        argcomplete.autocomplete(self.parser)
+        if '_ARGCOMPLETE' in os.environ:
+            # the shell asks for completions, argcomplete answers and exits
+            import argcomplete
+            argcomplete.autocomplete(self.parser)
         self.args = None
-        self.parser.parse_args()
 
     def parse(self) -> Any:
         self.args = self.parser.parse_args()
         return self.args
 
 
-class ConfHTTPServer(HTTPServer):
-    def __init__(self, *args, conf: Conf, **kwargs) -> None:
-        self.conf = conf
-        super().__init__(*args, **kwargs)
-
-    def finish_request(self, request: bytes, client_address: Tuple[str, int]) -> None:
-        self.RequestHandlerClass(request, client_address, self, conf=self.conf)
-
-
 def run_() -> None:
     os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir))
     args = Arguments().parse()
     conf = Conf(args.config)
 
-    if conf.log_file_path:
-        fh = logging.FileHandler(conf.log_file_path)
-        fh.setFormatter(log_format)
-        logger.addHandler(fh)
+    logging_pipeline = LoggingPipeline(conf)
+    logging_pipeline.start()
+
+    workers = args.workers if args.workers is not None else conf.server_workers
+    threads = args.threads if args.threads is not None else conf.server_threads
+    engine = args.engine if args.engine is not None else conf.server_engine
+    handler_class = AsyncMainHandler if engine == 'asyncio' else MainHandler
 
-    server = ConfHTTPServer((args.listen, args.port), MainHandler, conf=conf)
-    logger.info(f'Starting server at {args.listen}:{args.port}')
+    server = make_server((args.listen, args.port), handler_class, conf=conf,
+                         workers=workers, threads=threads, engine=engine)
+    logger.info('Starting %s server at %s:%s with %s workers and %s threads',
+                engine, args.listen, args.port, workers, threads)
 
     try:
         server.serve_forever()
@@ -75,14 +91,16 @@ def run_() -> None:
         pass
 
     server.server_close()
-    logger.info(f'Closing server.')
+    conf.stop_watch()
+    logger.info('Closing server.')
+    logging_pipeline.stop()
 
 
 def run() -> None:
     try:
         run_()
     except BaseException as e:
-        logger.error(f'Raised base exception {e}')
+        logger.error('Raised base exception %s', e)
         raise e
 
 
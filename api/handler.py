@@ -1,52 +1,779 @@
+import asyncio
+import http.client
+import io
 import json
 import logging
+import time
 from http.server import BaseHTTPRequestHandler
 from http import HTTPStatus
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from api.admission import Admission
+from api.auth import Authenticator
 from api.configurator import Conf
+from api.encoder import compress
+from api.encoder import get_encoder
+from api.method.scoring import ScoringModels
+from api.method.views import API_METHODS
+from api.method.views import AsyncMethodView
 from api.method.views import MethodView
+from api.metrics import metrics
+from api.store import AsyncKVStore
+from api.store import KVStore
+from api.warmup import WarmUp
+
+JSON_CONTENT_TYPE = 'application/json'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# most bytes of a streamed body read at once, a chunk is read in pieces of it as well
+READ_SIZE = 65536
+
+
+class BadBody(Exception):
+    """
+    The body of a streamed request is not framed correctly.
+    """
+
+
+class LineSplitter:
+    """
+    Splits a body received in pieces into its non-blank lines,
+    a line longer than `max_size` bytes is a `BadBody`.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._buffer = b''
+
+    def feed(self, data: bytes) -> List[bytes]:
+        *lines, self._buffer = (self._buffer + data).split(b'\n')
+        if len(self._buffer) > self.max_size or any(len(line) > self.max_size for line in lines):
+            raise BadBody(f'a line is longer than {self.max_size} bytes')
+        return [line for line in lines if line.strip()]
+
+    def close(self) -> List[bytes]:
+        line, self._buffer = self._buffer, b''
+        return [line] if line.strip() else []
+
+
+def parse_chunk_size(line: bytes) -> int:
+    try:
+        return int(line.split(b';', 1)[0], 16)
+    except ValueError:
+        raise BadBody('invalid chunk size')
+
+
+class RoutingMixin:
+    """
+    Engine independent part of the request handling: routing, decoding the request
+    body, rendering and encoding the response body.
+    """
+    # POST paths and their views
+    router = {}
+    # GET paths and the names of the methods rendering them
+    get_router = {
+        'metrics': 'render_metrics',
+        'ready': 'render_ready',
+    }
+
+    logger = logging.getLogger('scoring_api.MainHandler')
+
+    conf: Conf
+    warmup: Union[WarmUp, None]
+    admission: Admission
+    headers: http.client.HTTPMessage
+
+    def decode_request(self, data_string: bytes) -> Tuple[Any, Union[Tuple[int, Dict], None]]:
+        try:
+            return json.loads(data_string), None
+        except json.decoder.JSONDecodeError as e:
+            self.logger.exception('Unexpected error: %s \nreceived data: %s', e, data_string)
+            return None, (HTTPStatus.BAD_REQUEST, {'code': HTTPStatus.BAD_REQUEST, 'error': 'JSON Decode Error'})
+
+    @staticmethod
+    def render_result(code: int, response: Any, errors: Union[List[str], None]) -> Tuple[int, Dict]:
+        if errors:
+            return code, {'code': code, 'errors': errors}
+        return code, {'code': code, 'response': response}
+
+    @staticmethod
+    def render_internal_error() -> Tuple[int, Dict]:
+        code = HTTPStatus.INTERNAL_SERVER_ERROR
+        return code, {'code': code, 'error': 'Internal Server Error'}
+
+    @staticmethod
+    def render_not_found(path: str) -> Tuple[int, Dict]:
+        code = HTTPStatus.NOT_FOUND
+        return code, {'code': code, 'error': f'Path {path} Not Found'}
+
+    @staticmethod
+    def render_overloaded() -> Tuple[int, Dict]:
+        code = HTTPStatus.SERVICE_UNAVAILABLE
+        return code, {'code': code, 'error': 'Server Overloaded'}
+
+    def render_too_large(self) -> Tuple[int, Dict]:
+        code = HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        return code, {'code': code, 'error': f'Request body is larger than {self.conf.admission_max_body_size} bytes'}
+
+    def render_get(self, path: str) -> Tuple[int, bytes, Union[str, None], str]:
+        """
+        Answers GET requests with the method of `get_router` or 404.
+        Returns the code, the payload, its Content-Encoding and Content-Type.
+        """
+        render = self.get_router.get(path)
+        if render is not None:
+            return getattr(self, render)()
+
+        code, response = self.render_not_found(path)
+        return code, *self.encode_response(response), JSON_CONTENT_TYPE
+
+    @staticmethod
+    def render_metrics() -> Tuple[int, bytes, Union[str, None], str]:
+        return HTTPStatus.OK, metrics.render().encode('utf-8'), None, METRICS_CONTENT_TYPE
+
+    def render_ready(self) -> Tuple[int, bytes, Union[str, None], str]:
+        if self.warmup is None or self.warmup.is_ready:
+            code, response = HTTPStatus.OK, {'code': HTTPStatus.OK, 'response': {'ready': True}}
+        else:
+            code = HTTPStatus.SERVICE_UNAVAILABLE
+            response = {'code': code, 'error': 'warming up'}
+        return code, *self.encode_response(response), JSON_CONTENT_TYPE
+
+    def is_stream(self, path: str) -> bool:
+        """
+        Whether the request body is NDJSON to be answered with a chunked stream.
+        """
+        return path in self.router and self.headers.get_content_type() == NDJSON_CONTENT_TYPE
+
+    def body_length(self) -> Union[int, None]:
+        """
+        Content-Length of the request, -1 for a chunked body, None when neither is given.
+        """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            return -1
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            return None
+        # -1 is taken for chunked, a negative length is no length
+        return length if length >= 0 else None
+
+    def has_body(self) -> bool:
+        """
+        Whether the request declares a body, a malformed Content-Length counts as one.
+        """
+        if 'Content-Length' not in self.headers and 'Transfer-Encoding' not in self.headers:
+            return False
+        return self.body_length() != 0
 
+    def render_stream_error(self, e: Exception) -> Dict:
+        if isinstance(e, BadBody):
+            return {'code': HTTPStatus.BAD_REQUEST, 'error': str(e)}
+        if isinstance(e, ValueError):
+            return {'code': HTTPStatus.UNPROCESSABLE_ENTITY, 'errors': [str(e)]}
+        self.logger.exception('Unexpected error: %s', e)
+        return {'code': HTTPStatus.INTERNAL_SERVER_ERROR, 'error': 'Internal Server Error'}
+
+    def record_request(self, path: str, request: Any, code: int, started: float) -> None:
+        # label values come from fixed sets, whatever a client sends must not create new series
+        path = path if path in self.router or path in self.get_router else 'unknown'
+        method = request.get('method') if isinstance(request, dict) else None
+        metrics.inc(
+            'scoring_api_requests_total',
+            path=path, method=method if method in API_METHODS else '', code=str(int(code))
+        )
+        metrics.observe('scoring_api_request_seconds', time.perf_counter() - started, path=path)
+
+    def encode_response(self, response: Dict) -> Tuple[bytes, Union[str, None]]:
+        """
+        Serializes the response body once, straight to bytes, and gzips it when
+        it is large enough and the client accepts it. Returns the payload and
+        its Content-Encoding.
+        """
+        payload = get_encoder(self.conf.response_encoder)(response)
+        return compress(
+            payload,
+            self.headers.get('Accept-Encoding') if self.headers is not None else None,
+            self.conf.response_gzip_min_size,
+            self.conf.response_gzip_level,
+        )
+
+
+class MainHandler(RoutingMixin, BaseHTTPRequestHandler):
+    """
+    Serves persistent HTTP/1.1 connections: every response carries Content-Length,
+    the connection is closed after `server_keepalive_timeout` seconds without a
+    request or after `server_keepalive_max_requests` requests. It is also closed
+    after a response while the server has no worker left for other connections.
+    """
+    protocol_version = 'HTTP/1.1'
 
-class MainHandler(BaseHTTPRequestHandler):
     router = {
         'method': MethodView
     }
 
-    logger = logging.getLogger(f'scoring_api.MainHandler')
-
-    def __init__(self, *args, conf: Conf, **kwargs) -> None:
+    def __init__(self,
+                 *args,
+                 conf: Conf,
+                 store: Union[KVStore, None] = None,
+                 authenticator: Union[Authenticator, None] = None,
+                 models: Union[ScoringModels, None] = None,
+                 warmup: Union[WarmUp, None] = None,
+                 admission: Union[Admission, None] = None,
+                 **kwargs
+                 ) -> None:
         self.conf = conf
+        self.store = store
+        self.authenticator = authenticator
+        self.models = models
+        self.warmup = warmup
+        self.admission = admission if admission is not None else Admission(conf)
+        self.timeout = conf.server_keepalive_timeout
+        self.requests_handled = 0
         super().__init__(*args, **kwargs)
 
+    def do_GET(self) -> None:
+        started = time.perf_counter()
+        path = self.path.strip('/')
+
+        if self.has_body():
+            # the body is not read, its bytes must not be taken for the next request
+            self.close_connection = True
+        code, payload, content_encoding, content_type = self.render_get(path)
+        self.send_payload(code, payload, content_encoding, content_type)
+        self.record_request(path, None, code, started)
+
     def do_POST(self) -> None:
+        started = time.perf_counter()
         path = self.path.strip('/')
-        self.logger.info(f'POST {path}')
+        self.logger.info('POST %s', path)
+
+        if not self.admission.enter():
+            # refused before the body is read, the connection can not be reused
+            self.close_connection = True
+            code, response = self.render_overloaded()
+            self.send_payload(code, *self.encode_response(response), retry_after=self.admission.retry_after())
+            self.record_request(path, None, code, started)
+            return
+
+        try:
+            if self.is_stream(path):
+                self.handle_stream(path, started)
+            else:
+                self.handle_post(path, started)
+        finally:
+            self.admission.leave()
+
+    def handle_post(self, path: str, started: float) -> None:
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            # without it the end of the body and the start of the next request are unknown
+            self.close_connection = True
+            self.send_error(HTTPStatus.LENGTH_REQUIRED)
+            self.record_request(path, None, HTTPStatus.LENGTH_REQUIRED, started)
+            return
+
+        if length < 0:
+            # a negative length would read the body up to the end of the connection
+            self.close_connection = True
+            self.send_error(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+            self.record_request(path, None, HTTPStatus.BAD_REQUEST, started)
+            return
+
+        if self.admission.too_large(length):
+            self.close_connection = True
+            code, response = self.render_too_large()
+            self.send_payload(code, *self.encode_response(response))
+            self.record_request(path, None, code, started)
+            return
+
+        request = None
+        retry_after = None
+        data_string = self.rfile.read(length)
+
         if path in self.router:
             try:
-                data_string = self.rfile.read(int(self.headers['Content-Length']))
+                request, rejection = self.decode_request(data_string)
+                if rejection is not None:
+                    code, response = rejection
+                else:
+                    view = self.router[path](
+                        conf=self.conf, store=self.store, authenticator=self.authenticator,
+                        models=self.models, admission=self.admission
+                    )
+                    code, response = self.render_result(*view.post(request))
+                    retry_after = view.retry_after
+                # an encoder failure is an internal error as well
+                payload, content_encoding = self.encode_response(response)
+
+            except Exception as e:
+                self.logger.exception('Unexpected error: %s', e)
+                code, response = self.render_internal_error()
+                retry_after = None
+                payload, content_encoding = self.encode_response(response)
+        else:
+            code, response = self.render_not_found(path)
+            payload, content_encoding = self.encode_response(response)
+
+        self.send_payload(code, payload, content_encoding, retry_after=retry_after)
+        self.record_request(path, request, code, started)
+
+    def handle_stream(self, path: str, started: float) -> None:
+        """
+        Answers a streamed clients_interests request: the first line of the body is
+        the signed request, the following ones carry client ids. Every batch of ids
+        is answered with one NDJSON line of a chunked response as soon as it is
+        resolved, neither the ids nor the response are held in memory as a whole.
+        """
+        length = self.body_length()
+        if length is None or self.request_version != 'HTTP/1.1':
+            self.close_connection = True
+            code = HTTPStatus.LENGTH_REQUIRED if length is None else HTTPStatus.HTTP_VERSION_NOT_SUPPORTED
+            self.send_error(code)
+            self.record_request(path, None, code, started)
+            return
+
+        request = None
+        view = None
+        lines = self.read_lines(length)
+        try:
+            request, rejection = self.decode_request(next(lines, b''))
+            if rejection is None:
+                view = self.router[path](
+                    conf=self.conf, store=self.store, authenticator=self.authenticator, models=self.models,
+                    admission=self.admission
+                )
+                checked = view.check_stream(request)
+                if checked is not None:
+                    rejection = self.render_result(*checked)
+        except Exception as e:
+            response = self.render_stream_error(e)
+            rejection = response['code'], response
+
+        if rejection is not None:
+            # the rest of the body is not read
+            self.close_connection = True
+            code, response = rejection
+            self.send_payload(code, *self.encode_response(response),
+                              retry_after=view.retry_after if view is not None else None)
+            self.record_request(path, request, code, started)
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', NDJSON_CONTENT_TYPE)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_connection_header()
+        self.end_headers()
+
+        encode = get_encoder(self.conf.response_encoder)
+        try:
+            for result in view.stream_interests(request, lines):
+                self.write_chunk(encode(self.render_result(HTTPStatus.OK, result, None)[1]) + b'\n')
+        except Exception as e:
+            self.close_connection = True
+            self.write_chunk(encode(self.render_stream_error(e)) + b'\n')
+        self.wfile.write(b'0\r\n\r\n')
+        self.record_request(path, request, HTTPStatus.OK, started)
+
+    def read_lines(self, length: int) -> Iterator[bytes]:
+        """
+        Lines of a body of `length` bytes, or of a chunked body for -1, read as they arrive.
+        """
+        splitter = LineSplitter(self.conf.stream_max_line_size)
+        for data in self.read_body(length):
+            yield from splitter.feed(data)
+        yield from splitter.close()
+
+    def read_body(self, length: int) -> Iterator[bytes]:
+        if length >= 0:
+            while length > 0:
+                data = self.rfile.read(min(length, READ_SIZE))
+                if not data:
+                    raise BadBody('the body is shorter than its Content-Length')
+                length -= len(data)
+                yield data
+            return
+
+        while True:
+            size = parse_chunk_size(self.rfile.readline(1024))
+            if size == 0:
+                # trailer fields up to the blank line
+                while self.rfile.readline(1024).strip():
+                    pass
+                return
+            # a huge chunk reaches the line limit before it is held in memory
+            while size > 0:
+                data = self.rfile.read(min(size, READ_SIZE))
+                if not data:
+                    raise BadBody('a chunk is cut short')
+                size -= len(data)
+                yield data
+            if self.rfile.read(2) != b'\r\n':
+                raise BadBody('a chunk is cut short')
 
+    def write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+
+    def send_payload(self,
+                     code: int,
+                     payload: bytes,
+                     content_encoding: Union[str, None] = None,
+                     content_type: str = JSON_CONTENT_TYPE,
+                     retry_after: Union[int, None] = None
+                     ) -> None:
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        if content_encoding is not None:
+            self.send_header('Content-Encoding', content_encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.send_connection_header()
+
+        # headers and body leave in a single write
+        self._headers_buffer.append(b'\r\n')
+        self._headers_buffer.append(payload)
+        self.flush_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # the access log goes through the logging queue instead of a blocking write to stderr
+        self.logger.info('%s - ' + format, self.address_string(), *args)
+
+    def send_connection_header(self) -> None:
+        self.requests_handled += 1
+        if self.requests_handled >= self.conf.server_keepalive_max_requests or not self.server.keep_alive_allowed():
+            self.close_connection = True
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        else:
+            self.send_header('Connection', 'keep-alive')
+            self.send_header('Keep-Alive', f'timeout={self.conf.server_keepalive_timeout}, '
+                                           f'max={self.conf.server_keepalive_max_requests - self.requests_handled}')
+
+
+class AsyncMainHandler(RoutingMixin):
+    """
+    `MainHandler` for the asyncio engine, handles one connection accepted by
+    `asyncio.start_server` with the same keep-alive rules.
+    """
+    router = {
+        'method': AsyncMethodView
+    }
+
+    server_version = BaseHTTPRequestHandler.server_version
+    sys_version = BaseHTTPRequestHandler.sys_version
+
+    def __init__(self,
+                 reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter,
+                 conf: Conf,
+                 store: Union[AsyncKVStore, None] = None,
+                 authenticator: Union[Authenticator, None] = None,
+                 models: Union[ScoringModels, None] = None,
+                 warmup: Union[WarmUp, None] = None,
+                 admission: Union[Admission, None] = None
+                 ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.conf = conf
+        self.store = store
+        self.authenticator = authenticator
+        self.models = models
+        self.warmup = warmup
+        self.admission = admission if admission is not None else Admission(conf)
+        self.command = None
+        self.path = None
+        self.request_version = None
+        self.headers = None
+        self.close_connection = True
+        self.requests_handled = 0
+
+    async def handle(self) -> None:
+        try:
+            while True:
                 try:
-                    request = json.loads(data_string)
-                except json.decoder.JSONDecodeError as e:
-                    self.logger.exception(f'Unexpected error: {e} \nreceived data: {data_string}')
-                    response = json.dumps({'code': HTTPStatus.BAD_REQUEST, 'error': 'JSON Decode Error'})
-                    code = HTTPStatus.BAD_REQUEST
-                else:
-                    code, response, errors = self.router[path](conf=self.conf).post(request)
+                    ready = await asyncio.wait_for(self.read_request(), self.conf.server_keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+
+                if not ready:
+                    break
+
+                await getattr(self, f'do_{self.command}', self.do_unsupported)()
+
+                if self.close_connection:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def read_request(self) -> bool:
+        """
+        Reads the request line and the headers, returns False when the connection must be closed.
+        """
+        try:
+            head = await self.reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                await self.send(HTTPStatus.BAD_REQUEST)
+            return False
+        except asyncio.LimitOverrunError:
+            self.close_connection = True
+            await self.send(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+            return False
+
+        request_line, _, header_lines = head.partition(b'\r\n')
+        words = request_line.decode('iso-8859-1').split()
+        if len(words) != 3:
+            self.close_connection = True
+            await self.send(HTTPStatus.BAD_REQUEST)
+            return False
+
+        self.command, self.path, version = words
+        self.request_version = version
+        self.headers = http.client.parse_headers(io.BytesIO(header_lines))
+
+        connection = self.headers.get('Connection', '').lower()
+        if version == 'HTTP/1.1':
+            self.close_connection = connection == 'close'
+        else:
+            self.close_connection = connection != 'keep-alive'
+
+        return True
+
+    async def do_GET(self) -> None:
+        started = time.perf_counter()
+        path = self.path.strip('/')
+
+        if self.has_body():
+            # the body is not read, its bytes must not be taken for the next request
+            self.close_connection = True
+        code, payload, content_encoding, content_type = self.render_get(path)
+        await self.send(code, payload, content_encoding, content_type)
+        self.record_request(path, None, code, started)
+
+    async def do_POST(self) -> None:
+        started = time.perf_counter()
+        path = self.path.strip('/')
+        self.logger.info('POST %s', path)
 
-                    if errors:
-                        response = json.dumps({'code': code, 'errors': errors})
-                    else:
-                        response = json.dumps({'code': code, 'response': response})
+        if not self.admission.enter():
+            self.close_connection = True
+            code, response = self.render_overloaded()
+            await self.send(code, *self.encode_response(response), retry_after=self.admission.retry_after())
+            self.record_request(path, None, code, started)
+            return
+
+        try:
+            if self.is_stream(path):
+                await self.handle_stream(path, started)
+            else:
+                await self.handle_post(path, started)
+        finally:
+            self.admission.leave()
+
+    async def handle_post(self, path: str, started: float) -> None:
+        try:
+            length = int(self.headers['Content-Length'])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            await self.send(HTTPStatus.LENGTH_REQUIRED)
+            self.record_request(path, None, HTTPStatus.LENGTH_REQUIRED, started)
+            return
+
+        if length < 0:
+            self.close_connection = True
+            await self.send(HTTPStatus.BAD_REQUEST)
+            self.record_request(path, None, HTTPStatus.BAD_REQUEST, started)
+            return
+
+        if self.admission.too_large(length):
+            self.close_connection = True
+            code, response = self.render_too_large()
+            await self.send(code, *self.encode_response(response))
+            self.record_request(path, None, code, started)
+            return
+
+        request = None
+        retry_after = None
+        data_string = await self.reader.readexactly(length)
+
+        if path in self.router:
+            try:
+                request, rejection = self.decode_request(data_string)
+                if rejection is not None:
+                    code, response = rejection
+                else:
+                    view = self.router[path](
+                        conf=self.conf, store=self.store, authenticator=self.authenticator,
+                        models=self.models, admission=self.admission
+                    )
+                    code, response = self.render_result(*await view.post(request))
+                    retry_after = view.retry_after
+                # an encoder failure is an internal error as well
+                payload, content_encoding = self.encode_response(response)
 
             except Exception as e:
-                self.logger.exception(f'Unexpected error: {e}')
-                response = json.dumps({'code': HTTPStatus.INTERNAL_SERVER_ERROR, 'error': 'Internal Server Error'})
-                code = HTTPStatus.INTERNAL_SERVER_ERROR
+                self.logger.exception('Unexpected error: %s', e)
+                code, response = self.render_internal_error()
+                retry_after = None
+                payload, content_encoding = self.encode_response(response)
         else:
-            response = json.dumps({'code': HTTPStatus.NOT_FOUND, 'error': f'Path {path} Not Found'})
-            code = HTTPStatus.NOT_FOUND
+            code, response = self.render_not_found(path)
+            payload, content_encoding = self.encode_response(response)
 
-        self.send_response(code)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf8'))
+        await self.send(code, payload, content_encoding, retry_after=retry_after)
+        self.record_request(path, request, code, started)
+
+    async def handle_stream(self, path: str, started: float) -> None:
+        """
+        `MainHandler.handle_stream` on the asyncio streams, every batch is drained
+        before the next one is read.
+        """
+        length = self.body_length()
+        if length is None or self.request_version != 'HTTP/1.1':
+            self.close_connection = True
+            code = HTTPStatus.LENGTH_REQUIRED if length is None else HTTPStatus.HTTP_VERSION_NOT_SUPPORTED
+            await self.send(code)
+            self.record_request(path, None, code, started)
+            return
+
+        request = None
+        view = None
+        lines = self.read_lines(length)
+        try:
+            try:
+                first_line = await lines.__anext__()
+            except StopAsyncIteration:
+                first_line = b''
+            request, rejection = self.decode_request(first_line)
+            if rejection is None:
+                view = self.router[path](
+                    conf=self.conf, store=self.store, authenticator=self.authenticator, models=self.models,
+                    admission=self.admission
+                )
+                checked = await view.check_stream(request)
+                if checked is not None:
+                    rejection = self.render_result(*checked)
+        except Exception as e:
+            response = self.render_stream_error(e)
+            rejection = response['code'], response
+
+        if rejection is not None:
+            self.close_connection = True
+            code, response = rejection
+            await self.send(code, *self.encode_response(response),
+                            retry_after=view.retry_after if view is not None else None)
+            self.record_request(path, request, code, started)
+            return
+
+        await self.send_head(HTTPStatus.OK, 'Transfer-Encoding: chunked\r\n', NDJSON_CONTENT_TYPE)
+
+        encode = get_encoder(self.conf.response_encoder)
+        try:
+            async for result in view.stream_interests(request, lines):
+                await self.write_chunk(encode(self.render_result(HTTPStatus.OK, result, None)[1]) + b'\n')
+        except Exception as e:
+            self.close_connection = True
+            await self.write_chunk(encode(self.render_stream_error(e)) + b'\n')
+        self.writer.write(b'0\r\n\r\n')
+        await self.writer.drain()
+        self.record_request(path, request, HTTPStatus.OK, started)
+
+    async def read_lines(self, length: int) -> AsyncIterator[bytes]:
+        splitter = LineSplitter(self.conf.stream_max_line_size)
+        async for data in self.read_body(length):
+            for line in splitter.feed(data):
+                yield line
+        for line in splitter.close():
+            yield line
+
+    async def read_body(self, length: int) -> AsyncIterator[bytes]:
+        try:
+            if length >= 0:
+                while length > 0:
+                    data = await self.reader.read(min(length, READ_SIZE))
+                    if not data:
+                        raise BadBody('the body is shorter than its Content-Length')
+                    length -= len(data)
+                    yield data
+                return
+
+            while True:
+                size = parse_chunk_size(await self.reader.readline())
+                if size == 0:
+                    while (await self.reader.readline()).strip():
+                        pass
+                    return
+                while size > 0:
+                    data = await self.reader.readexactly(min(size, READ_SIZE))
+                    size -= len(data)
+                    yield data
+                if await self.reader.readexactly(2) != b'\r\n':
+                    raise BadBody('a chunk is cut short')
+        except asyncio.IncompleteReadError:
+            raise BadBody('the body is cut short')
+
+    async def write_chunk(self, data: bytes) -> None:
+        self.writer.write(b'%X\r\n%s\r\n' % (len(data), data))
+        await self.writer.drain()
+
+    async def do_unsupported(self) -> None:
+        # the body of an unknown request can not be skipped reliably
+        self.close_connection = True
+        await self.send(HTTPStatus.NOT_IMPLEMENTED)
+
+    async def send(self,
+                   code: int,
+                   payload: bytes = b'',
+                   content_encoding: Union[str, None] = None,
+                   content_type: str = JSON_CONTENT_TYPE,
+                   retry_after: Union[int, None] = None
+                   ) -> None:
+        head = f'Content-Length: {len(payload)}\r\n'
+        if content_encoding is not None:
+            head += f'Content-Encoding: {content_encoding}\r\nVary: Accept-Encoding\r\n'
+        if retry_after is not None:
+            head += f'Retry-After: {retry_after}\r\n'
+        await self.send_head(code, head, content_type, payload)
+
+    async def send_head(self, code: int, fields: str, content_type: str, payload: bytes = b'') -> None:
+        """
+        Writes the status line and the headers followed by `fields` and the first `payload` bytes.
+        """
+        status = HTTPStatus(code)
+
+        self.requests_handled += 1
+        if self.requests_handled >= self.conf.server_keepalive_max_requests:
+            self.close_connection = True
+
+        if self.close_connection:
+            connection = 'Connection: close\r\n'
+        else:
+            connection = (
+                f'Connection: keep-alive\r\n'
+                f'Keep-Alive: timeout={self.conf.server_keepalive_timeout}, '
+                f'max={self.conf.server_keepalive_max_requests - self.requests_handled}\r\n'
+            )
+
+        head = (
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Server: {self.server_version} {self.sys_version}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'{fields}'
+            f'{connection}'
+            f'\r\n'
+        )
+
+        self.writer.write(head.encode('latin-1') + payload)
+        await self.writer.drain()
+        self.logger.info('"%s %s" %s', self.command, self.path, status.value)
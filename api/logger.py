@@ -1,4 +1,15 @@
+import json
 import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
 
 logger = logging.getLogger('scoring_api')
 logger.setLevel(logging.INFO)
@@ -11,3 +22,146 @@ log_format = logging.Formatter(
 handler = logging.StreamHandler()
 handler.setFormatter(log_format)
 logger.addHandler(handler)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log shippers.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `rate` records per second for every message template
+    of the loggers listed in `limits`, the rest is dropped and counted.
+
+    Messages are logged with %-style arguments, so `record.msg` is the template
+    and a repetitive message is recognised without formatting it.
+    """
+
+    def __init__(self, limits: Dict[str, float]) -> None:
+        super().__init__()
+        self.limits = limits
+        self.dropped = 0
+
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.limits.get(record.name)
+        if rate is None:
+            return True
+
+        now = time.monotonic()
+        key = (record.name, str(record.msg))
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (rate, now))
+            tokens = min(rate, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.dropped += 1
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Never blocks the calling thread: when the queue is full the record is dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting is left to the listener thread, only tracebacks have to be
+        # rendered while the frames still exist
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    """
+    Moves formatting and I/O of the `scoring_api` logs to a background thread.
+
+    Request threads only put records into a bounded queue, a QueueListener writes
+    them to stderr and to `log_file_path`. Pre-forked workers restart the listener
+    with a fresh queue right after the fork.
+    """
+
+    def __init__(self, conf) -> None:
+        self.conf = conf
+        self.queue_handler: Union[DroppingQueueHandler, None] = None
+        self.listener: Union[QueueListener, None] = None
+        self.rate_limit = RateLimitFilter(conf.log_rate_limits or {})
+
+        formatter = JsonFormatter() if conf.log_format == 'json' else log_format
+        self.handlers: List[logging.Handler] = [logging.StreamHandler()]
+        if conf.log_file_path:
+            self.handlers.append(logging.FileHandler(conf.log_file_path))
+        for item in self.handlers:
+            item.setFormatter(formatter)
+
+    def start(self) -> None:
+        logger.setLevel(self.conf.log_level)
+        for name, level in (self.conf.log_levels or {}).items():
+            logging.getLogger(name).setLevel(level)
+
+        for item in list(logger.handlers):
+            logger.removeHandler(item)
+
+        self._start_listener()
+        logger.addHandler(self.queue_handler)
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _start_listener(self) -> None:
+        log_queue = queue.Queue(self.conf.log_queue_size)
+        if self.queue_handler is None:
+            self.queue_handler = DroppingQueueHandler(log_queue)
+            self.queue_handler.addFilter(self.rate_limit)
+        else:
+            self.queue_handler.queue = log_queue
+
+        self.listener = QueueListener(log_queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def _after_fork_in_child(self) -> None:
+        # the listener thread of the parent does not exist in the child
+        if self.listener is not None:
+            self._start_listener()
+
+    def stop(self) -> None:
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        for item in self.handlers:
+            item.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'dropped_queue_full': self.queue_handler.dropped if self.queue_handler is not None else 0,
+            'dropped_rate_limit': self.rate_limit.dropped,
+        }
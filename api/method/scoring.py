@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import threading
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+import yaml
+
+from api.configurator import Conf
+from api.configurator import Snapshot
+
+SCORE_ARGUMENTS = ('phone', 'email', 'birthday', 'gender', 'first_name', 'last_name')
+# a model of n arguments is compiled into a table of 2 ** n scores
+MAX_MODEL_ARGUMENTS = 16
+SCORING_KEYS = ('scoring_models', 'scoring_models_file', 'scoring_default_model')
+
+
+class ScoringModel:
+    """
+    Score as the sum of the weights of the features whose arguments are all present.
+
+    The features are compiled into a table indexed by the bitmask of the present
+    arguments, scoring is one table lookup. Weights are added in the order of
+    the features, so a table entry equals the sum computed feature by feature.
+    """
+
+    def __init__(self, version: str, features: Sequence[Dict[str, Any]]) -> None:
+        self.version = str(version)
+        self.features: List[Tuple[Tuple[str, ...], float]] = []
+
+        for feature in features:
+            arguments = tuple(feature.get('arguments') or ())
+            weight = feature.get('weight')
+            if not arguments or not all(name in SCORE_ARGUMENTS for name in arguments):
+                raise ValueError(f'model "{self.version}": feature arguments must be some of {SCORE_ARGUMENTS}, '
+                                 f'got {feature.get("arguments")}')
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+                raise ValueError(f'model "{self.version}": feature {list(arguments)} weight must be a number')
+            self.features.append((arguments, weight))
+
+        self.arguments = tuple(dict.fromkeys(name for arguments, _ in self.features for name in arguments))
+        if len(self.arguments) > MAX_MODEL_ARGUMENTS:
+            raise ValueError(f'model "{self.version}": more than {MAX_MODEL_ARGUMENTS} arguments')
+
+        self.bits = tuple((name, 1 << i) for i, name in enumerate(self.arguments))
+        self.table = self.compile()
+
+    def compile(self) -> List[Union[float, int]]:
+        bits = dict(self.bits)
+        feature_masks = [(sum(bits[name] for name in arguments), weight) for arguments, weight in self.features]
+
+        table = []
+        for mask in range(1 << len(self.arguments)):
+            score = 0
+            for feature_mask, weight in feature_masks:
+                if mask & feature_mask == feature_mask:
+                    score += weight
+            table.append(score)
+        return table
+
+    def mask(self, arguments: Dict[str, Any]) -> int:
+        mask = 0
+        for name, bit in self.bits:
+            if arguments.get(name):
+                mask |= bit
+        return mask
+
+    def score(self, arguments: Dict[str, Any]) -> Union[float, int]:
+        return self.table[self.mask(arguments)]
+
+    def key(self, arguments: Dict[str, Any]) -> str:
+        """
+        Store key of the score, scores of different models never share a key.
+        """
+        first_name, last_name, phone, birthday = (
+            arguments.get('first_name'), arguments.get('last_name'), arguments.get('phone'), arguments.get('birthday')
+        )
+        line = f'{first_name or ""}{last_name or ""}{phone or ""}{"" if birthday is None else birthday}'
+        return f'uid:{self.version}:{hashlib.md5(line.encode("utf-8")).hexdigest()}'
+
+
+class ScoringModels:
+    """
+    Versioned scoring models of `scoring_models`, or of the `scoring_models_file`
+    YAML file when it is set, shared by all requests of the server process.
+
+    The models are compiled again when the config swaps in other models; a config
+    with an invalid model keeps the previous models in use.
+    """
+
+    def __init__(self, conf: Conf) -> None:
+        self.conf = conf
+        self.logger = logging.getLogger('scoring_api.Scoring')
+
+        self.models: Dict[str, ScoringModel] = {}
+        self.default: Union[ScoringModel, None] = None
+
+        self._lock = threading.Lock()
+        self.load()
+        conf.subscribe(self.reconfigure, SCORING_KEYS)
+
+    def load(self, snapshot: Union[Snapshot, None] = None) -> None:
+        """
+        Compiles the models of the config, raises ValueError on an invalid definition.
+        """
+        conf = snapshot if snapshot is not None else self.conf.snapshot
+        definitions, path, default = conf.scoring_models, conf.scoring_models_file, conf.scoring_default_model
+        if path:
+            with open(path, 'r') as f:
+                definitions = yaml.safe_load(f)
+
+        if not isinstance(definitions, dict) or not definitions:
+            raise ValueError('scoring models must be a mapping of versions to models')
+        models = {
+            str(version): ScoringModel(version, (definition or {}).get('features') or ())
+            for version, definition in definitions.items()
+        }
+        if str(default) not in models:
+            raise ValueError(f'default scoring model "{default}" is not defined')
+
+        with self._lock:
+            self.models = models
+            self.default = models[str(default)]
+        self.logger.info('loaded scoring models %s, default %s', ', '.join(models), default)
+
+    def get(self, version: Union[str, None] = None) -> Union[ScoringModel, None]:
+        """
+        The model of `version`, the default one for None, None for an unknown version.
+        """
+        if version is None:
+            return self.default
+        return self.models.get(version)
+
+    def reconfigure(self, snapshot: Snapshot, changed: FrozenSet[str]) -> None:
+        """
+        Config listener, compiles the new models.
+        """
+        try:
+            self.load(snapshot)
+        except (ValueError, OSError, yaml.YAMLError) as e:
+            self.logger.error('invalid scoring models, keeping %s - %s', ', '.join(self.models), e)
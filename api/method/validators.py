@@ -1,6 +1,8 @@
 from typing import Any
+from typing import List
 
 from api.base.fields import ArgumentsField
+from api.base.fields import BatchCallsField
 from api.base.fields import BirthDayField
 from api.base.fields import CharField
 from api.base.fields import ChoiceField
@@ -17,12 +19,26 @@ class MethodValidator(BaseValidators):
     token = CharField(required=True, null=True)
     method = CharField(required=True, null=False)
     arguments = ArgumentsField(required=True, null=True)
+    # version of the scoring model, the default one when missing
+    model = CharField(required=False, null=True)
 
 
 class ClientsInterestsValidator(BaseValidators):
     client_ids = ClientIDsField(required=True, null=False)
     date = DateField(required=False, null=True, date_format='%d.%m.%Y')
 
+    def class_validate(self, data: Any, errors: List[str]) -> None:
+        client_ids = data.get('client_ids')
+        max_ids = self.conf.admission_max_client_ids
+        if max_ids and isinstance(client_ids, list) and len(client_ids) > max_ids:
+            errors.append(f'The "client_ids" field is too long, the maximum number of ids is {max_ids}')
+
+
+class StreamInterestsValidator(BaseValidators):
+    # arguments of a streamed request, the client ids mostly come in the following lines
+    client_ids = ClientIDsField(required=False, null=True)
+    date = DateField(required=False, null=True, date_format='%d.%m.%Y')
+
 
 class OnlineScoreValidator(BaseValidators):
     UNKNOWN = 1
@@ -41,7 +57,7 @@ class OnlineScoreValidator(BaseValidators):
     birthday = BirthDayField(required=False, null=True, date_format='%d.%m.%Y', not_older_year=70)
     gender = ChoiceField(required=False, null=True, choice_items=GENDERS)
 
-    def class_validate(self, data: Any) -> None:
+    def class_validate(self, data: Any, errors: List[str]) -> None:
         couples = [
             (data.get('phone', '') and data.get('email', '')),
             (data.get('last_name', '') and data.get('first_name', '')),
@@ -49,7 +65,21 @@ class OnlineScoreValidator(BaseValidators):
         ]
 
         if not any(couples):
-            self._errors.append(
+            errors.append(
                 'at least one pair of phone-email, first name-last name, '
                 'gender-birthday with non-empty values is required '
             )
+
+
+class BatchValidator(BaseValidators):
+    calls = BatchCallsField(required=True, null=False)
+
+    def class_validate(self, data: Any, errors: List[str]) -> None:
+        calls = data.get('calls')
+        if isinstance(calls, list) and len(calls) > self.conf.batch_max_calls:
+            errors.append(f'The "calls" field is too long, the maximum number of calls is {self.conf.batch_max_calls}')
+
+
+class BatchCallValidator(BaseValidators):
+    method = CharField(required=True, null=False)
+    arguments = ArgumentsField(required=True, null=True)
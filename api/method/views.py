@@ -1,37 +1,74 @@
-import hashlib
 import json
 import random
 from http import HTTPStatus
 from typing import Any
+from typing import AsyncIterator
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import NamedTuple
 from typing import Tuple
 from typing import Union
 
+from api.admission import RATE_PREFIX
+from api.admission import Admission
+from api.auth import Authenticator
 from api.base.views import BaseView
 from api.configurator import Conf
+from api.metrics import metrics
+from api.method.scoring import ScoringModel
+from api.method.scoring import ScoringModels
+from api.method.validators import BatchCallValidator
+from api.method.validators import BatchValidator
 from api.method.validators import ClientsInterestsValidator
 from api.method.validators import MethodValidator
 from api.method.validators import OnlineScoreValidator
+from api.method.validators import StreamInterestsValidator
+from api.store import AsyncKVStore
 from api.store import KVStore
+from api.store import StoreUnavailable
+
+INTERESTS = ['cars', 'pets', 'travel', 'hi-tech', 'sport', 'music', 'books', 'tv', 'cinema', 'geek', 'otus']
+API_METHODS = ('online_score', 'clients_interests', 'batch')
+
+
+class BatchCall(NamedTuple):
+    method: str
+    arguments: Dict
+    rejection: Union[Tuple[int, Any, List[str]], None]
 
 
 class MethodView(BaseView):
-    def __init__(self, conf: Conf) -> None:
+    def __init__(self,
+                 conf: Conf,
+                 store: Union[KVStore, None] = None,
+                 authenticator: Union[Authenticator, None] = None,
+                 models: Union[ScoringModels, None] = None,
+                 admission: Union[Admission, None] = None
+                 ) -> None:
         self.methods_handlers = {
             'online_score': self.method_online_score,
-            'clients_interests': self.method_clients_interests
+            'clients_interests': self.method_clients_interests,
+            'batch': self.method_batch,
+        }
+        self.batch_validators = {
+            'online_score': OnlineScoreValidator,
+            'clients_interests': ClientsInterestsValidator,
         }
-        self.store = KVStore(conf)
-        super().__init__(conf)
+        self.authenticator = authenticator if authenticator is not None else Authenticator(conf)
+        self.models = models if models is not None else ScoringModels(conf)
+        self.admission = admission if admission is not None else Admission(conf)
+        # seconds a rate limited client is asked to wait, for the Retry-After header
+        self.retry_after: Union[int, None] = None
+        super().__init__(conf, store if store is not None else KVStore(conf))
 
     def post(self, request: Dict) -> Tuple[int, Any, List[str]]:
-        status, errors = MethodValidator(conf=self.conf).validate(request)
-        if not status:
-            return HTTPStatus.UNPROCESSABLE_ENTITY, None, errors
-
-        if not self.check_auth(request):
-            return HTTPStatus.FORBIDDEN, None, ['Forbidden']
+        rejection = self.check_request(request)
+        if rejection is None:
+            rejection = self.check_rate(request)
+        if rejection is not None:
+            return rejection
 
         handler = self.methods_handlers.get(request.get('method', ''), None)
 
@@ -41,86 +78,514 @@ class MethodView(BaseView):
         else:
             return HTTPStatus.UNPROCESSABLE_ENTITY, None, ['the requested method is not defined']
 
+    def check_request(self, request: Dict) -> Union[Tuple[int, Any, List[str]], None]:
+        with metrics.timer('scoring_api_stage_seconds', stage='validate'):
+            status, errors = MethodValidator(conf=self.conf).validate(request)
+        if not status:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, errors
+
+        with metrics.timer('scoring_api_stage_seconds', stage='check_auth'):
+            authenticated = self.check_auth(request)
+        if not authenticated:
+            return HTTPStatus.FORBIDDEN, None, ['Forbidden']
+
+        return None
+
     def check_auth(self, request: Dict) -> bool:
         account = request.get('account', '')
         login = request.get('login', '')
         token = request.get('token', '')
 
-        if login == self.conf.admin_login:
-            line = self.conf.admin_login + str(self.conf.admin_salt)
-        else:
-            line = account + login + self.conf.salt
-
-        digest = hashlib.sha512(line.encode('utf-8')).hexdigest()
-        if digest == token:
-            self.logger.info(f'{login} - authentication passed')
+        if self.authenticator.check(account, login, token):
+            self.logger.info('%s - authentication passed', login)
             return True
 
-        self.logger.info(f'{login} - authentication failed')
+        self.logger.info('%s - authentication failed', login)
         return False
 
+    def check_rate(self, request: Dict) -> Union[Tuple[int, Any, List[str]], None]:
+        """
+        Takes a token of the bucket of the authenticated login, a batch is one request.
+        """
+        login = request.get('login', '')
+        return self.rate_rejection(login, self.rate_wait(login))
+
+    def rate_wait(self, login: str) -> float:
+        rate, burst = self.admission.rate()
+        if not rate:
+            return 0.0
+        if self.conf.admission_rate_shared:
+            try:
+                return self.store.take_tokens(RATE_PREFIX + login, rate, burst)
+            except StoreUnavailable:
+                # degraded: every process limits the login on its own
+                pass
+        return self.admission.rate_wait(login)
+
+    def rate_rejection(self, login: str, wait: float) -> Union[Tuple[int, Any, List[str]], None]:
+        if wait <= 0:
+            return None
+        self.admission.reject('rate_limit')
+        self.retry_after = self.admission.retry_after(wait)
+        self.logger.info('%s - rate limit exceeded, retry after %s s', login, self.retry_after)
+        return HTTPStatus.TOO_MANY_REQUESTS, None, ['rate limit exceeded']
+
     def method_online_score(self, data: Dict) -> Tuple[int, Any, Union[List[str], None]]:
         arguments = data.get('arguments', {})
-        status, errors = OnlineScoreValidator(conf=self.conf).validate(arguments)
+        with metrics.timer('scoring_api_stage_seconds', stage='validate_arguments'):
+            status, errors = OnlineScoreValidator(conf=self.conf).validate(arguments)
 
         if not status:
             return HTTPStatus.UNPROCESSABLE_ENTITY, None, errors
 
+        model, rejection = self.select_model(data)
+        if rejection is not None:
+            return rejection
+
         if data.get('login', '') == self.conf.admin_login:
             score = 42
         else:
-            score = self.get_score(**arguments)
+            with metrics.timer('scoring_api_stage_seconds', stage='get_score'):
+                score = self.get_score(**arguments, model=model)
 
         return HTTPStatus.OK, {'score': score}, None
 
+    def select_model(self, data: Dict) -> Tuple[Union[ScoringModel, None], Union[Tuple[int, Any, List[str]], None]]:
+        """
+        The scoring model named by the optional `model` field of the request, the default one without it.
+        """
+        version = data.get('model')
+        model = self.models.get(version)
+        if model is None:
+            return None, (HTTPStatus.UNPROCESSABLE_ENTITY, None, [f'unknown scoring model "{version}"'])
+        return model, None
+
     def method_clients_interests(self, data: Dict) -> Tuple[int, Any, Union[List[str], None]]:
         arguments = data.get('arguments', {})
-        status, errors = ClientsInterestsValidator(conf=self.conf).validate(arguments)
+        with metrics.timer('scoring_api_stage_seconds', stage='validate_arguments'):
+            status, errors = ClientsInterestsValidator(conf=self.conf).validate(arguments)
 
         if not status:
             return HTTPStatus.UNPROCESSABLE_ENTITY, None, errors
 
-        result = {client: self.get_interests(client) for client in arguments.get('client_ids')}
+        with metrics.timer('scoring_api_stage_seconds', stage='get_interests'):
+            result = self.get_interests_many(arguments.get('client_ids'))
 
         return HTTPStatus.OK, result, None
 
-    def get_score(self, phone=None, email=None, birthday=None, gender=None, first_name=None, last_name=None):
-        key_parts = [
-            first_name or '',
-            last_name or '',
-            phone or '',
-            birthday if birthday is not None else '',
-        ]
-        key_parts = [str(item) for item in key_parts]
-        line = ''.join(key_parts).encode('utf-8')
-        key = 'uid:' + hashlib.md5(line).hexdigest()
-
-        score = self.store[key] or 0
-
-        if score:
-            return float(score)
-
-        if phone:
-            score += 1.5
-        if email:
-            score += 1.5
-        if birthday and gender:
-            score += 1.5
-        if first_name and last_name:
-            score += 0.5
-
-        self.store.set(key, score, 60 * 60)
-        return score
+    def check_stream(self, request: Any) -> Union[Tuple[int, Any, List[str]], None]:
+        """
+        Validates and authenticates the first line of a streamed clients_interests request.
+        """
+        if not isinstance(request, dict):
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, ['the first line must be a request object']
+
+        rejection = self.check_request(request)
+        if rejection is None:
+            rejection = self.check_rate(request)
+        if rejection is not None:
+            return rejection
+
+        return self.check_stream_arguments(request)
+
+    def check_stream_arguments(self, request: Dict) -> Union[Tuple[int, Any, List[str]], None]:
+        if request.get('method') != 'clients_interests':
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, ['only the clients_interests method can be streamed']
+
+        with metrics.timer('scoring_api_stage_seconds', stage='validate_arguments'):
+            status, errors = StreamInterestsValidator(conf=self.conf).validate(request.get('arguments', {}))
+        if not status:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, errors
+
+        return None
+
+    def stream_interests(self, request: Dict, lines: Iterable[bytes]) -> Iterator[Dict[int, List[str]]]:
+        """
+        Resolves the client ids of the request arguments and of the following lines
+        in batches of `stream_batch_size` ids, yields the interests of every batch
+        as soon as it is read. Raises ValueError on a malformed line.
+        """
+        batch_size = self.conf.stream_batch_size
+        batch = list(request.get('arguments', {}).get('client_ids') or ())
+
+        for line in lines:
+            batch.extend(self.parse_client_ids(line))
+            while len(batch) >= batch_size:
+                with metrics.timer('scoring_api_stage_seconds', stage='get_interests'):
+                    result = self.get_interests_many(batch[:batch_size])
+                yield result
+                del batch[:batch_size]
+
+        while batch:
+            with metrics.timer('scoring_api_stage_seconds', stage='get_interests'):
+                result = self.get_interests_many(batch[:batch_size])
+            yield result
+            del batch[:batch_size]
+
+    @staticmethod
+    def parse_client_ids(line: bytes) -> List[int]:
+        """
+        A line of a streamed request holds one client id or a list of them.
+        """
+        try:
+            ids = json.loads(line)
+        except ValueError:
+            raise ValueError(f'the line {line[:64]!r} is not JSON')
+
+        if isinstance(ids, int):
+            return [ids]
+        if isinstance(ids, list) and all(isinstance(item, int) for item in ids):
+            return ids
+        raise ValueError(f'the line {line[:64]!r} is neither a client id nor a list of client ids')
+
+    def method_batch(self, data: Dict) -> Tuple[int, Any, Union[List[str], None]]:
+        """
+        Runs many online_score / clients_interests calls under one authentication,
+        all store reads are done with one MGET and all cache fills with one pipeline.
+        """
+        calls, rejection = self.prepare_batch(data)
+        if rejection is not None:
+            return rejection
+        model, rejection = self.select_model(data)
+        if rejection is not None:
+            return rejection
+
+        with metrics.timer('scoring_api_stage_seconds', stage='batch'):
+            keys = self.batch_keys(data, calls, model)
+            try:
+                values, degraded = dict(zip(keys, self.store.get_many(keys))), False
+            except StoreUnavailable:
+                values, degraded = {}, True
+
+            results, missing = self.resolve_batch(data, calls, values, degraded, model)
+            if not degraded:
+                self.store.set_many(missing, 60 * 60)
+
+        return HTTPStatus.OK, results, None
+
+    def prepare_batch(self, data: Dict) -> Tuple[List[BatchCall], Union[Tuple[int, Any, List[str]], None]]:
+        arguments = data.get('arguments', {})
+        status, errors = BatchValidator(conf=self.conf).validate(arguments)
+
+        if not status:
+            return [], (HTTPStatus.UNPROCESSABLE_ENTITY, None, errors)
+
+        calls = []
+        for call in arguments['calls']:
+            method = call.get('method', '')
+            call_arguments = call.get('arguments', {})
+
+            status, errors = BatchCallValidator(conf=self.conf).validate(call)
+            if status:
+                validator = self.batch_validators.get(method)
+                if validator is None:
+                    status, errors = False, ['the requested method is not defined']
+                else:
+                    status, errors = validator(conf=self.conf).validate(call_arguments)
+
+            rejection = None if status else (HTTPStatus.UNPROCESSABLE_ENTITY, None, errors)
+            calls.append(BatchCall(method, call_arguments, rejection))
+
+        return calls, None
+
+    def batch_keys(self, data: Dict, calls: List[BatchCall], model: Union[ScoringModel, None] = None) -> List[str]:
+        model = model if model is not None else self.models.get()
+        is_admin = data.get('login', '') == self.conf.admin_login
+        keys = []
+
+        for call in calls:
+            if call.rejection is not None:
+                continue
+            if call.method == 'online_score' and not is_admin:
+                keys.append(model.key(call.arguments))
+            elif call.method == 'clients_interests':
+                keys.extend(f'i:{cid}' for cid in call.arguments['client_ids'])
+
+        return list(dict.fromkeys(keys))
+
+    def resolve_batch(self,
+                      data: Dict,
+                      calls: List[BatchCall],
+                      values: Dict[str, Any],
+                      degraded: bool = False,
+                      model: Union[ScoringModel, None] = None
+                      ) -> Tuple[List[Dict], Dict]:
+        """
+        Builds the per call results from the values read from the store,
+        returns them and the values that must be written to the store.
+        `degraded` means the store could not be read, interests fall back
+        to `interests_fallback`. Scores are computed by `model`, the default one without it.
+        """
+        model = model if model is not None else self.models.get()
+        is_admin = data.get('login', '') == self.conf.admin_login
+        results = []
+        missing = {}
+
+        for call in calls:
+            if call.rejection is not None:
+                code, response, errors = call.rejection
+
+            elif call.method == 'online_score':
+                if is_admin:
+                    score = 42
+                else:
+                    key = model.key(call.arguments)
+                    score = values.get(key)
+                    if score:
+                        score = float(score)
+                    else:
+                        score = values[key] = missing[key] = float(model.score(call.arguments))
+                code, response, errors = HTTPStatus.OK, {'score': score}, None
+
+            elif degraded:
+                code, response, errors = HTTPStatus.OK, self.interests_fallback(call.arguments['client_ids']), None
+
+            else:
+                cids = call.arguments['client_ids']
+                keys = [f'i:{cid}' for cid in cids]
+                response, call_missing = self.resolve_interests(cids, keys, [values.get(key) for key in keys])
+                # later calls for the same ids must see the interests drawn here
+                values.update(call_missing)
+                missing.update(call_missing)
+                code, errors = HTTPStatus.OK, None
+
+            if errors:
+                results.append({'code': code, 'errors': errors})
+            else:
+                results.append({'code': code, 'response': response})
+
+        return results, missing
+
+    def get_score(self, phone=None, email=None, birthday=None, gender=None, first_name=None, last_name=None,
+                  model: Union[ScoringModel, None] = None):
+        model = model if model is not None else self.models.get()
+        arguments = dict(phone=phone, email=email, birthday=birthday, gender=gender,
+                         first_name=first_name, last_name=last_name)
+        key = model.key(arguments)
+
+        try:
+            # concurrent misses of the key wait for one computation
+            score = self.store.get_or_set(key, lambda: model.score(arguments), 60 * 60)
+        except StoreUnavailable:
+            # degraded: computed from the arguments and not cached
+            return float(model.score(arguments))
+
+        return float(score)
 
     def get_interests(self, cid: int) -> List[str]:
-        interests = ['cars', 'pets', 'travel', 'hi-tech', 'sport', 'music', 'books', 'tv', 'cinema', 'geek', 'otus']
         key = f'i:{cid}'
-        val = self.store.get(key)
+        try:
+            val = self.store.get_or_set(key, lambda: self.draw_interests([key])[key], 60 * 60)
+        except StoreUnavailable:
+            return self.interests_fallback([cid])[cid]
+
+        return json.loads(val)
+
+    def get_interests_many(self, cids: List[int]) -> Dict[int, List[str]]:
+        """
+        Same as `get_interests` for every id, in one MGET and at most one pipelined write.
+        """
+        keys = [f'i:{cid}' for cid in cids]
+        try:
+            values = self.store.get_or_set_many(keys, self.draw_interests, 60 * 60)
+        except StoreUnavailable:
+            return self.interests_fallback(cids)
+
+        return {cid: json.loads(val) for cid, val in zip(cids, values)}
+
+    @staticmethod
+    def draw_interests(keys: List[str]) -> Dict[str, str]:
+        """
+        New interests of the missing keys, encoded as they are stored.
+        """
+        return {key: json.dumps(random.sample(INTERESTS, 2)) for key in keys}
+
+    def interests_fallback(self, cids: List[int]) -> Dict[int, List[str]]:
+        """
+        Interests served while the store is unavailable, they are not cached.
+        """
+        return {cid: list(self.conf.interests_fallback) for cid in cids}
+
+    @staticmethod
+    def resolve_interests(cids: List[int], keys: List[str], values: List[Any]) -> Tuple[Dict, Dict]:
+        """
+        Decodes the stored interests and draws new ones for the missing ids,
+        returns the result and the values that must be written to the store.
+        """
+        result = {}
+        missing = {}
+
+        for cid, key, val in zip(cids, keys, values):
+            if val is None:
+                val = random.sample(INTERESTS, 2)
+                missing[key] = json.dumps(val)
+            else:
+                val = json.loads(val)
+            result[cid] = val
+
+        return result, missing
+
+
+class AsyncMethodView(MethodView):
+    """
+    `MethodView` for the asyncio engine: validation and authentication are shared,
+    the store calls are awaited.
+    """
+
+    def __init__(self,
+                 conf: Conf,
+                 store: AsyncKVStore,
+                 authenticator: Union[Authenticator, None] = None,
+                 models: Union[ScoringModels, None] = None,
+                 admission: Union[Admission, None] = None
+                 ) -> None:
+        super().__init__(conf, store, authenticator, models, admission)
+
+    async def post(self, request: Dict) -> Tuple[int, Any, List[str]]:
+        rejection = self.check_request(request)
+        if rejection is None:
+            rejection = await self.check_rate(request)
+        if rejection is not None:
+            return rejection
+
+        handler = self.methods_handlers.get(request.get('method', ''), None)
 
-        if val is None:
-            val = random.sample(interests, 2)
-            self.store.set(key, json.dumps(val), 60 * 60)
+        if handler is not None:
+            # noinspection PyArgumentList
+            return await handler(data=request)
+        else:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, ['the requested method is not defined']
+
+    async def method_online_score(self, data: Dict) -> Tuple[int, Any, Union[List[str], None]]:
+        arguments = data.get('arguments', {})
+        with metrics.timer('scoring_api_stage_seconds', stage='validate_arguments'):
+            status, errors = OnlineScoreValidator(conf=self.conf).validate(arguments)
+
+        if not status:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, errors
+
+        model, rejection = self.select_model(data)
+        if rejection is not None:
+            return rejection
+
+        if data.get('login', '') == self.conf.admin_login:
+            score = 42
         else:
-            val = json.loads(val)
+            with metrics.timer('scoring_api_stage_seconds', stage='get_score'):
+                score = await self.get_score(**arguments, model=model)
+
+        return HTTPStatus.OK, {'score': score}, None
+
+    async def method_clients_interests(self, data: Dict) -> Tuple[int, Any, Union[List[str], None]]:
+        arguments = data.get('arguments', {})
+        with metrics.timer('scoring_api_stage_seconds', stage='validate_arguments'):
+            status, errors = ClientsInterestsValidator(conf=self.conf).validate(arguments)
+
+        if not status:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, errors
+
+        with metrics.timer('scoring_api_stage_seconds', stage='get_interests'):
+            result = await self.get_interests_many(arguments.get('client_ids'))
+
+        return HTTPStatus.OK, result, None
+
+    async def check_rate(self, request: Dict) -> Union[Tuple[int, Any, List[str]], None]:
+        login = request.get('login', '')
+        return self.rate_rejection(login, await self.rate_wait(login))
+
+    async def rate_wait(self, login: str) -> float:
+        rate, burst = self.admission.rate()
+        if not rate:
+            return 0.0
+        if self.conf.admission_rate_shared:
+            try:
+                return await self.store.take_tokens(RATE_PREFIX + login, rate, burst)
+            except StoreUnavailable:
+                pass
+        return self.admission.rate_wait(login)
+
+    async def check_stream(self, request: Any) -> Union[Tuple[int, Any, List[str]], None]:
+        if not isinstance(request, dict):
+            return HTTPStatus.UNPROCESSABLE_ENTITY, None, ['the first line must be a request object']
+
+        rejection = self.check_request(request)
+        if rejection is None:
+            rejection = await self.check_rate(request)
+        if rejection is not None:
+            return rejection
+
+        return self.check_stream_arguments(request)
+
+    async def stream_interests(self,
+                               request: Dict,
+                               lines: AsyncIterator[bytes]
+                               ) -> AsyncIterator[Dict[int, List[str]]]:
+        batch_size = self.conf.stream_batch_size
+        batch = list(request.get('arguments', {}).get('client_ids') or ())
+
+        async for line in lines:
+            batch.extend(self.parse_client_ids(line))
+            while len(batch) >= batch_size:
+                with metrics.timer('scoring_api_stage_seconds', stage='get_interests'):
+                    result = await self.get_interests_many(batch[:batch_size])
+                yield result
+                del batch[:batch_size]
+
+        while batch:
+            with metrics.timer('scoring_api_stage_seconds', stage='get_interests'):
+                result = await self.get_interests_many(batch[:batch_size])
+            yield result
+            del batch[:batch_size]
+
+    async def method_batch(self, data: Dict) -> Tuple[int, Any, Union[List[str], None]]:
+        calls, rejection = self.prepare_batch(data)
+        if rejection is not None:
+            return rejection
+        model, rejection = self.select_model(data)
+        if rejection is not None:
+            return rejection
+
+        with metrics.timer('scoring_api_stage_seconds', stage='batch'):
+            keys = self.batch_keys(data, calls, model)
+            try:
+                values, degraded = dict(zip(keys, await self.store.get_many(keys))), False
+            except StoreUnavailable:
+                values, degraded = {}, True
+
+            results, missing = self.resolve_batch(data, calls, values, degraded, model)
+            if not degraded:
+                await self.store.set_many(missing, 60 * 60)
+
+        return HTTPStatus.OK, results, None
+
+    async def get_score(self, phone=None, email=None, birthday=None, gender=None, first_name=None, last_name=None,
+                        model: Union[ScoringModel, None] = None):
+        model = model if model is not None else self.models.get()
+        arguments = dict(phone=phone, email=email, birthday=birthday, gender=gender,
+                         first_name=first_name, last_name=last_name)
+        key = model.key(arguments)
+
+        try:
+            score = await self.store.get_or_set(key, lambda: model.score(arguments), 60 * 60)
+        except StoreUnavailable:
+            return float(model.score(arguments))
+
+        return float(score)
+
+    async def get_interests(self, cid: int) -> List[str]:
+        key = f'i:{cid}'
+        try:
+            val = await self.store.get_or_set(key, lambda: self.draw_interests([key])[key], 60 * 60)
+        except StoreUnavailable:
+            return self.interests_fallback([cid])[cid]
+
+        return json.loads(val)
+
+    async def get_interests_many(self, cids: List[int]) -> Dict[int, List[str]]:
+        keys = [f'i:{cid}' for cid in cids]
+        try:
+            values = await self.store.get_or_set_many(keys, self.draw_interests, 60 * 60)
+        except StoreUnavailable:
+            return self.interests_fallback(cids)
 
-        return val
+        return {cid: json.loads(val) for cid, val in zip(cids, values)}
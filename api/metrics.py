@@ -0,0 +1,191 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (name, type, help, [(labels, value)]) produced by a collector at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+class _Shard:
+    """
+    Counters and histograms written by one thread only.
+    """
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # bucket counts (the last one is +Inf) followed by the sum and the count
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+
+class Metrics:
+    """
+    Process-wide metrics registry rendered in the Prometheus text format.
+
+    Every thread writes to its own shard, so recording a value takes no lock;
+    the shards are merged when the metrics are scraped. Values that already
+    live elsewhere (cache and store state) are read by collectors at scrape time.
+    Pre-forked workers have separate registries.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+        self._descriptions: Dict[str, Tuple[str, str]] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def describe(self, name: str, kind: str, description: str) -> None:
+        self._descriptions[name] = (kind, description)
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        counters = self._shard().counters
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        histograms = self._shard().histograms
+        key = (name, tuple(sorted(labels.items())))
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self.buckets) + 3)
+
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            for shard in self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+    def _merge(self) -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], List[float]]]:
+        counters = {}
+        histograms = {}
+
+        with self._lock:
+            shards = list(self._shards)
+
+        for shard in shards:
+            # dict.copy does not release the GIL, the copy is consistent
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, value in shard.histograms.copy().items():
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = list(value)
+                else:
+                    histograms[key] = [a + b for a, b in zip(merged, value)]
+
+        return counters, histograms
+
+    def render(self) -> str:
+        counters, histograms = self._merge()
+        lines = []
+        described = set()
+
+        def header(name: str, default_kind: str) -> None:
+            if name in described:
+                return
+            described.add(name)
+            kind, description = self._descriptions.get(name, (default_kind, ''))
+            if description:
+                lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for (name, labels), histogram in sorted(histograms.items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram[-1]}')
+
+        with self._lock:
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            for name, kind, description, samples in collector():
+                if name not in described:
+                    described.add(name)
+                    lines.append(f'# HELP {name} {description}')
+                    lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    items = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + items + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+
+metrics = Metrics()
+
+metrics.describe('scoring_api_requests_total', 'counter', 'HTTP requests by path, API method and status code')
+metrics.describe('scoring_api_request_seconds', 'histogram', 'Time spent handling a request')
+metrics.describe('scoring_api_stage_seconds', 'histogram', 'Time spent in a request processing stage')
+metrics.describe('scoring_api_redis_commands_total', 'counter', 'Redis round trips by command')
+metrics.describe('scoring_api_redis_errors_total', 'counter', 'Failed Redis round trips by command')
+metrics.describe('scoring_api_redis_seconds', 'histogram', 'Redis round trip latency')
+metrics.describe('scoring_api_redis_rejected_total', 'counter', 'Redis commands rejected by the open circuit')
+metrics.describe('scoring_api_redis_reconnects_total', 'counter', 'Failed Redis reconnection attempts')
+metrics.describe('scoring_api_single_flight_lock_waits_total', 'counter',
+                 'Keys waited for while another process held their fill lock')
+metrics.describe('scoring_api_rejected_total', 'counter', 'Requests refused by the admission control by reason')
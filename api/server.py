@@ -0,0 +1,447 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import HTTPServer
+from typing import Dict
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from api.admission import Admission
+from api.auth import Authenticator
+from api.configurator import Conf
+from api.method.scoring import ScoringModels
+from api.metrics import metrics
+from api.store import AsyncKVStore
+from api.store import KVStore
+from api.warmup import WarmUp
+
+
+class ConfHTTPServer(HTTPServer):
+    def __init__(self, *args, conf: Conf, store_backend: Union[str, None] = None, **kwargs) -> None:
+        self.conf = conf
+        # the configured store backend is used without it
+        self.store_backend = store_backend
+        self.store: Union[KVStore, None] = None
+        self.authenticator = Authenticator(conf)
+        self.models = ScoringModels(conf)
+        self.warmup = WarmUp(conf)
+        self.admission = Admission(conf)
+        self._warmup_thread: Union[threading.Thread, None] = None
+        super().__init__(*args, **kwargs)
+
+    def open_store(self) -> None:
+        """
+        Creates the store shared by all requests of this process.
+
+        Called when the serve loop starts rather than in `__init__`, so that every
+        pre-forked worker opens its own connection pool after the fork.
+        """
+        if self.store is None:
+            self.store = KVStore(self.conf, backend=self.store_backend)
+            self.store.start_health_check()
+            metrics.register_collector(self.store.collect_metrics)
+            metrics.register_collector(self.authenticator.collect_metrics)
+            metrics.register_collector(self.admission.collect_metrics)
+
+    def start_warm_up(self) -> None:
+        """
+        Warms the process up in a background thread, requests are served meanwhile
+        and `/ready` answers 503 until it is done.
+        """
+        if self._warmup_thread is None:
+            metrics.register_collector(self.warmup.collect_metrics)
+            self._warmup_thread = threading.Thread(
+                target=self.warmup.run, args=(self.store, self.models), name='scoring_api-warm-up', daemon=True
+            )
+            self._warmup_thread.start()
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        self.open_store()
+        self.start_warm_up()
+        super().serve_forever(poll_interval)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self._warmup_thread is not None:
+            self._warmup_thread.join()
+            self._warmup_thread = None
+            metrics.unregister_collector(self.warmup.collect_metrics)
+        if self.store is not None:
+            metrics.unregister_collector(self.store.collect_metrics)
+            metrics.unregister_collector(self.authenticator.collect_metrics)
+            metrics.unregister_collector(self.admission.collect_metrics)
+            self.store.close()
+            self.store = None
+
+    def keep_alive_allowed(self) -> bool:
+        """
+        Whether a connection may stay open after its response. Connections are
+        served one at a time here, an idle one would block all the others.
+        """
+        return False
+
+    def finish_request(self, request: socket.socket, client_address: Tuple[str, int]) -> None:
+        self.RequestHandlerClass(
+            request, client_address, self,
+            conf=self.conf, store=self.store, authenticator=self.authenticator, models=self.models,
+            warmup=self.warmup, admission=self.admission
+        )
+
+
+class ThreadPoolHTTPServer(ConfHTTPServer):
+    """
+    Serves every accepted connection in a bounded pool of worker threads.
+
+    At most `threads` connections are processed at once and at most `queue_size`
+    more are waiting for a free worker; after that the accept loop blocks and new
+    connections stay in the listen backlog of the kernel. With `admission_max_in_flight`
+    set they are answered 503 right away instead.
+
+    An idle keep-alive connection holds its worker until its next request, so
+    connections are only kept open while a worker is left for new ones; the last
+    worker closes its connection after every response.
+    """
+    daemon_threads = True
+
+    def __init__(self, *args, threads: int = 8, queue_size: int = 64, **kwargs) -> None:
+        self.threads = threads
+        self.queue_size = queue_size
+        self.logger = logging.getLogger('scoring_api.Server')
+
+        self._executor: Union[ThreadPoolExecutor, None] = None
+        self._slots = threading.BoundedSemaphore(threads + queue_size)
+        # connections held by the workers, idle keep-alive ones included
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+        # one connection for every thread that may run a command at once
+        self.warmup.connections = threads
+
+    def process_request(self, request: socket.socket, client_address: Tuple[str, int]) -> None:
+        if self._executor is None:
+            # created lazily so that every pre-forked worker gets its own threads
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='scoring_api')
+
+        if self.conf.admission_max_in_flight:
+            if not self._slots.acquire(blocking=False):
+                self.reject_request(request)
+                return
+        else:
+            self._slots.acquire()
+        try:
+            self._executor.submit(self.process_request_thread, request, client_address)
+        except RuntimeError:
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def reject_request(self, request: socket.socket) -> None:
+        """
+        Answers 503 to a connection arriving while the queue is full, without reading its request.
+        """
+        self.admission.reject('queue_full')
+        code = HTTPStatus.SERVICE_UNAVAILABLE
+        body = json.dumps({'code': code, 'error': 'Server Overloaded'}).encode('utf-8')
+        head = (
+            f'HTTP/1.1 {code.value} {code.phrase}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Retry-After: {self.admission.retry_after()}\r\n'
+            f'Connection: close\r\n'
+            f'\r\n'
+        )
+        try:
+            request.sendall(head.encode('latin-1') + body)
+            # unread request bytes would turn the close into a reset that may discard the answer
+            request.setblocking(False)
+            while request.recv(65536):
+                pass
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def keep_alive_allowed(self) -> bool:
+        return self._busy < self.threads
+
+    def process_request_thread(self, request: socket.socket, client_address: Tuple[str, int]) -> None:
+        with self._busy_lock:
+            self._busy += 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self._busy_lock:
+                self._busy -= 1
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        super().server_close()
+
+
+class AsyncHTTPServer:
+    """
+    Serves all connections of the process from one asyncio event loop.
+
+    The listening socket is bound in `__init__`, so the server can be pre-forked
+    like `ConfHTTPServer`; the loop, the store and the connection tasks are created
+    in `serve_forever`. `shutdown` stops accepting connections and waits for the
+    requests in progress.
+    """
+    request_queue_size = 128
+
+    def __init__(self,
+                 server_address: Tuple[str, int],
+                 handler_class,
+                 conf: Conf,
+                 store_backend: Union[str, None] = None
+                 ) -> None:
+        self.server_address = server_address
+        self.RequestHandlerClass = handler_class
+        self.conf = conf
+        self.store_backend = store_backend
+        self.store: Union[AsyncKVStore, None] = None
+        self.authenticator = Authenticator(conf)
+        self.models = ScoringModels(conf)
+        self.warmup = WarmUp(conf, connections=conf.redis_max_connections)
+        self.admission = Admission(conf)
+        self.logger = logging.getLogger('scoring_api.Server')
+
+        self.socket = socket.create_server(server_address, backlog=self.request_queue_size)
+        self.server_address = self.socket.getsockname()[:2]
+
+        self._loop: Union[asyncio.AbstractEventLoop, None] = None
+        self._stopped: Union[asyncio.Event, None] = None
+        self._shutdown_request = threading.Event()
+        self._connections: Set[asyncio.Task] = set()
+
+    def serve_forever(self) -> None:
+        asyncio.run(self._serve())
+
+    async def _serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        if self._shutdown_request.is_set():
+            return
+
+        if self.store is None:
+            self.store = AsyncKVStore(self.conf, backend=self.store_backend)
+        await self.store.connect()
+        metrics.register_collector(self.store.collect_metrics)
+        metrics.register_collector(self.authenticator.collect_metrics)
+        metrics.register_collector(self.warmup.collect_metrics)
+        metrics.register_collector(self.admission.collect_metrics)
+        warmup = asyncio.create_task(self.warmup.run_async(self.store, self.models))
+
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket)
+        try:
+            await self._stopped.wait()
+        finally:
+            server.close()
+            if not warmup.done():
+                warmup.cancel()
+            if self._connections:
+                await asyncio.wait(self._connections, timeout=self.conf.server_shutdown_timeout)
+            # idle keep-alive connections
+            for task in self._connections:
+                task.cancel()
+            metrics.unregister_collector(self.store.collect_metrics)
+            metrics.unregister_collector(self.authenticator.collect_metrics)
+            metrics.unregister_collector(self.warmup.collect_metrics)
+            metrics.unregister_collector(self.admission.collect_metrics)
+            await self.store.close()
+            self.store = None
+            self._loop = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            await self.RequestHandlerClass(
+                reader, writer,
+                conf=self.conf, store=self.store, authenticator=self.authenticator, models=self.models,
+                warmup=self.warmup, admission=self.admission
+            ).handle()
+        except Exception:
+            self.logger.exception('Unexpected error while handling %s', writer.get_extra_info("peername"))
+        finally:
+            self._connections.discard(task)
+
+    def shutdown(self) -> None:
+        """
+        Can be called from any thread and from signal handlers.
+        """
+        self._shutdown_request.set()
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._stopped.set)
+
+    def server_close(self) -> None:
+        self.socket.close()
+
+
+class PreForkServer:
+    """
+    Runs `workers` processes that share one listening socket.
+
+    The socket is bound by the master before forking, every child runs its own
+    `serve_forever` loop on it. SIGTERM and SIGINT received by the master are
+    forwarded to the children, which finish the requests in progress and exit.
+    SIGHUP is forwarded as well, every child reloads its config.
+    Children that die unexpectedly are restarted.
+    """
+
+    def __init__(self, server: Union[ConfHTTPServer, AsyncHTTPServer], workers: int, shutdown_timeout: float = 10) -> None:
+        self.server = server
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.logger = logging.getLogger('scoring_api.Server')
+
+        self._children: Dict[int, int] = {}
+        self._stopping = False
+
+    def serve_forever(self) -> None:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._reload)
+
+        for number in range(self.workers):
+            self._spawn(number)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            number = self._children.pop(pid, None)
+            if number is None:
+                continue
+
+            if not self._stopping:
+                self.logger.error('worker %s (pid %s) exited with status %s, restarting', number, pid, status)
+                time.sleep(0.1)
+                self._spawn(number)
+
+    def _spawn(self, number: int) -> None:
+        pid = os.fork()
+        if pid:
+            self._children[pid] = number
+            return
+
+        code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            install_graceful_shutdown(self.server)
+            install_config_reload(self.server.conf)
+            self.logger.info('worker %s started with pid %s', number, os.getpid())
+            self.server.serve_forever()
+            self.server.server_close()
+        except BaseException as e:
+            self.logger.exception('worker %s failed: %s', number, e)
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _stop(self, signum: int, frame) -> None:
+        if self._stopping:
+            return
+        self._stopping = True
+        self.logger.info('received signal %s, stopping %s workers', signum, len(self._children))
+
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        threading.Thread(target=self._kill_after_timeout, daemon=True).start()
+
+    def _reload(self, signum: int, frame) -> None:
+        self.logger.info('received signal %s, reloading the config of %s workers', signum, len(self._children))
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    def _kill_after_timeout(self) -> None:
+        time.sleep(self.shutdown_timeout)
+        for pid in list(self._children):
+            self.logger.error('worker pid %s did not stop in %s seconds, killing', pid, self.shutdown_timeout)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def server_close(self) -> None:
+        self.server.server_close()
+
+
+def install_graceful_shutdown(server: Union[HTTPServer, AsyncHTTPServer]) -> None:
+    """
+    Stops `server.serve_forever` on SIGTERM.
+
+    `shutdown` waits for the serve loop to exit, so it must not run in the thread
+    that executes the loop, which is where signal handlers are called.
+    """
+
+    def handler(signum: int, frame) -> None:
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handler)
+
+
+def install_config_reload(conf: Conf) -> None:
+    """
+    Reloads `conf` on SIGHUP and, every `config_watch_interval` seconds, when its files change.
+
+    The reload runs in a thread of its own, listeners switching store backends
+    must not run inside the serve loop of the main thread.
+    """
+
+    def handler(signum: int, frame) -> None:
+        threading.Thread(target=conf.reload, daemon=True).start()
+
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, handler)
+    conf.watch(conf.config_watch_interval)
+
+
+def create_server(address: Tuple[str, int], handler_class, conf: Conf, threads: int = 0, engine: str = 'threaded',
+                  store_backend: Union[str, None] = None) -> Union[ConfHTTPServer, AsyncHTTPServer]:
+    """
+    The server of one process, without the signal handlers and the config watcher of `make_server`.
+    """
+    if engine == 'asyncio':
+        return AsyncHTTPServer(address, handler_class, conf=conf, store_backend=store_backend)
+    if threads > 0:
+        return ThreadPoolHTTPServer(address, handler_class, conf=conf, store_backend=store_backend,
+                                    threads=threads, queue_size=conf.server_queue_size)
+    return ConfHTTPServer(address, handler_class, conf=conf, store_backend=store_backend)
+
+
+def make_server(address: Tuple[str, int], handler_class, conf: Conf, workers: int = 1, threads: int = 0,
+                engine: str = 'threaded') -> Union[ConfHTTPServer, AsyncHTTPServer, PreForkServer]:
+    server = create_server(address, handler_class, conf, threads=threads, engine=engine)
+
+    if workers > 1:
+        return PreForkServer(server, workers, shutdown_timeout=conf.server_shutdown_timeout)
+
+    install_graceful_shutdown(server)
+    install_config_reload(conf)
+    return server
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Union
+
+Load = Callable[[List[str]], Dict[str, Any]]
+AsyncLoad = Callable[[List[str]], Awaitable[Dict[str, Any]]]
+
+
+class Flight:
+    """
+    One load in progress, shared by the keys it was started for.
+    """
+    __slots__ = ('done', 'values', 'error')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.values: Dict[str, Any] = {}
+        self.error: Union[BaseException, None] = None
+
+    def result(self, key: str) -> Any:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.values[key]
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent loads of the same keys in a process.
+
+    The first caller of a key leads its load, callers asking for the key while the
+    load is in progress wait for its result or its exception instead of loading
+    it again. A caller leads the keys nobody is loading and joins the others, it
+    runs its own load before it waits, so two callers sharing keys never wait for
+    each other. Safe to share between threads.
+    """
+
+    def __init__(self) -> None:
+        # keys answered by the load of another caller
+        self.coalesced = 0
+
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def do(self, keys: Sequence[str], load: Load) -> Dict[str, Any]:
+        """
+        Values of `keys`, `load(led_keys)` returns a value for every key it gets.
+        """
+        flight = Flight()
+        led: List[str] = []
+        joined: Dict[str, Flight] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                current = self._flights.get(key)
+                if current is None:
+                    self._flights[key] = flight
+                    led.append(key)
+                else:
+                    joined[key] = current
+            self.coalesced += len(joined)
+
+        values: Dict[str, Any] = {}
+        if led:
+            try:
+                flight.values = values = load(led)
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in led:
+                        del self._flights[key]
+                flight.done.set()
+
+        if joined:
+            values = dict(values)
+            for key, current in joined.items():
+                values[key] = current.result(key)
+        return values
+
+
+class AsyncSingleFlight:
+    """
+    `SingleFlight` for the tasks of one event loop.
+
+    A load runs in a task of its own, a leader cancelled while waiting does not
+    cancel the load the other callers wait for.
+    """
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+
+        self._flights: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, keys: Sequence[str], load: AsyncLoad) -> Dict[str, Any]:
+        led: List[str] = []
+        joined: Dict[str, asyncio.Task] = {}
+        for key in dict.fromkeys(keys):
+            current = self._flights.get(key)
+            if current is None:
+                led.append(key)
+            else:
+                joined[key] = current
+        self.coalesced += len(joined)
+
+        values: Dict[str, Any] = {}
+        if led:
+            task = asyncio.ensure_future(load(led))
+            for key in led:
+                self._flights[key] = task
+            task.add_done_callback(lambda done: self._landed(done, led))
+            values = await asyncio.shield(task)
+
+        if joined:
+            values = dict(values)
+            for key, task in joined.items():
+                values[key] = (await asyncio.shield(task))[key]
+        return values
+
+    def _landed(self, task: asyncio.Task, keys: List[str]) -> None:
+        for key in keys:
+            if self._flights.get(key) is task:
+                del self._flights[key]
+        if not task.cancelled():
+            # retrieved here in case every caller waiting for it was cancelled
+            task.exception()
+
@@ -1,106 +1,844 @@
+import asyncio
 import logging
+import threading
 import time
+import uuid
+from contextlib import contextmanager
 from random import random
 from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterator
+from typing import List
+from typing import Sequence
+from typing import Tuple
 from typing import Union
 
 import redis
 
+from api.backends import AsyncMemoryBackend
+from api.backends import AsyncRedisBackend
+from api.backends import AsyncReplicatedRedisBackend
+from api.backends import AsyncShardedRedisBackend
+from api.backends import MemoryBackend
+from api.backends import RedisBackend
+from api.backends import ReplicatedRedisBackend
+from api.backends import ShardedRedisBackend
+from api.breaker import CircuitBreaker
+from api.cache import LocalCache
+from api.cache import MISSING
 from api.configurator import Conf
+from api.configurator import Snapshot
+from api.metrics import Family
+from api.metrics import metrics
+from api.singleflight import AsyncSingleFlight
+from api.singleflight import SingleFlight
+from api.writebehind import AsyncWriteBehind
+from api.writebehind import WriteBehind
 
+# settings of the backend connections, a change makes the store switch to a new backend
+STORE_KEYS = (
+    'store_backend', 'redis_host', 'redis_port', 'redis_db', 'redis_shards', 'redis_shard_replicas',
+    'memory_max_entries', 'redis_replicas', 'redis_replica_retry_timeout', 'redis_max_connections',
+    'redis_pool_timeout',
+)
+# keys of the Redis locks taken by `single_flight_lock_timeout`
+LOCK_PREFIX = 'lock:'
+# seconds between two reads of keys another process is filling
+LOCK_POLL_INTERVAL = 0.01
 
-class KVStore:
+Compute = Callable[[List[str]], Dict[str, Any]]
+
+
+class StoreUnavailable(redis.exceptions.ConnectionError):
+    """
+    Redis can not be reached or its circuit breaker is open.
+    """
+
+
+class BaseKVStore:
     def __init__(self,
                  conf: Union[Conf, None] = None,
                  host: str = '127.0.0.1',
                  port: int = 6379,
-                 db: int = 0
+                 db: int = 0,
+                 backend: Union[str, None] = None
                  ) -> None:
 
         self.conf = conf
+        # an explicit backend is kept when the config changes
+        self._backend_override = backend
+        self.host = host
+        self.port = port
+        self.db = db
+        self.backend_name = 'redis'
+        self.shards: List[Dict] = []
+        self.shard_replicas = 160
+        self.memory_max_entries = 1000000
+        self.replicas: List[Dict] = []
+        self.replica_retry_timeout = 10
+        # WriteBehind parameters, None writes on the request path
+        self.write_behind_params: Union[Dict, None] = None
+        # concurrent misses of a key share one read and one fill, across processes with a lock timeout
+        self.single_flight = True
+        self.lock_timeout = 0.0
         self.reconnect_try = True
-        self.reconnect_attempt = 5
         self.reconnect_timeout = 1
+        self.reconnect_max_timeout = 30
         self.reconnect_smart_delay = True
+        self.max_connections = 16
+        self.pool_timeout = 1
+        self.health_check_interval = 10
+        failure_threshold = 5
+        reset_timeout = 30
 
         if self.conf is not None:
-            self.host = self.conf.redis_host
-            self.port = self.conf.redis_port
-            self.db = self.conf.redis_db
+            self._configure(self.conf.snapshot)
+            if self.conf.write_behind_enabled:
+                self.write_behind_params = dict(
+                    max_size=self.conf.write_behind_queue_size,
+                    batch_size=self.conf.write_behind_batch_size,
+                    interval=self.conf.write_behind_flush_interval,
+                    drop_policy=self.conf.write_behind_drop_policy,
+                )
+            self.single_flight = self.conf.single_flight_enabled
+            self.lock_timeout = self.conf.single_flight_lock_timeout
             self.reconnect_try = self.conf.redis_reconnect_try
-            self.reconnect_attempt = self.conf.redis_reconnect_attempt
             self.reconnect_timeout = self.conf.redis_reconnect_timeout
+            self.reconnect_max_timeout = self.conf.redis_reconnect_max_timeout
             self.reconnect_smart_delay = self.conf.redis_reconnect_smart_delay
+            self.health_check_interval = self.conf.redis_health_check_interval
+            failure_threshold = self.conf.redis_breaker_failure_threshold
+            reset_timeout = self.conf.redis_breaker_reset_timeout
 
-        self.host = host
-        self.port = port
-        self.db = db
+        if backend is not None:
+            self.backend_name = backend
+
+        self.logger = logging.getLogger('scoring_api.Store')
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._reconnect_delay = self.reconnect_timeout
+
+        # optional in-process tier in front of Redis, one cache per key prefix
+        self.local_caches: Dict[str, LocalCache] = {}
+        if self.conf is not None and self.conf.local_cache_enabled:
+            for prefix, params in self.conf.local_cache.items():
+                self.local_caches[prefix] = LocalCache(**params)
+
+    def _configure(self, conf: Snapshot) -> None:
+        """
+        Takes the `STORE_KEYS` settings of the backend connections.
+        """
+        self.host = conf.redis_host
+        self.port = conf.redis_port
+        self.db = conf.redis_db
+        self.backend_name = conf.store_backend if self._backend_override is None else self._backend_override
+        self.shards = conf.redis_shards
+        self.shard_replicas = conf.redis_shard_replicas
+        self.memory_max_entries = conf.memory_max_entries
+        self.replicas = conf.redis_replicas
+        self.replica_retry_timeout = conf.redis_replica_retry_timeout
+        self.max_connections = conf.redis_max_connections
+        self.pool_timeout = conf.redis_pool_timeout
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state is not CircuitBreaker.OPEN
+
+    def _local_cache(self, key: str) -> Union[LocalCache, None]:
+        for prefix, cache in self.local_caches.items():
+            if key.startswith(prefix):
+                return cache
+        return None
 
-        self.logger = logging.getLogger(f'log_analyzer.Store')
+    def _cache_get(self, key: str) -> Any:
+        cache = self._local_cache(key) if self.local_caches else None
+        return MISSING if cache is None else cache.get(key)
 
-        self.pool: Union[redis.ConnectionPool, None] = None
-        self.server: Union[redis.Redis, None] = None
+    def _cache_set(self, key: str, val: Any, ex: Union[int, None] = None) -> None:
+        cache = self._local_cache(key) if self.local_caches else None
+        if cache is not None and val is not None:
+            # keep what Redis would return, it stores numbers as strings
+            cache.set(key, val if isinstance(val, str) else str(val), ex)
 
-        self._get_server()
+    def _cache_get_many(self, keys: Sequence[str]) -> Tuple[List[Any], List[int]]:
+        """
+        Returns the locally cached values (MISSING where absent) and the indexes
+        of the keys that must be read from Redis.
+        """
+        if not self.local_caches:
+            return [MISSING] * len(keys), list(range(len(keys)))
 
-    def _get_server(self):
-        self.logger.info(f'try to redis connect')
-        self.pool = None
-        self.server = None
-        _error = False
+        values = [self._cache_get(key) for key in keys]
+        return values, [i for i, val in enumerate(values) if val is MISSING]
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {prefix: cache.stats() for prefix, cache in self.local_caches.items()}
+
+    @contextmanager
+    def _command(self, command: str) -> Iterator[None]:
+        """
+        Counts and times one round trip to Redis and reports its outcome to the
+        circuit breaker. Raises `StoreUnavailable` without calling Redis while the
+        circuit is open and instead of connection errors and timeouts.
+        """
+        if not self.breaker.allow():
+            metrics.inc('scoring_api_redis_rejected_total', command=command)
+            raise StoreUnavailable(f'Redis circuit is {self.breaker.state}')
+
+        metrics.inc('scoring_api_redis_commands_total', command=command)
+        started = time.perf_counter()
         try:
-            self.pool = redis.ConnectionPool(
-                host=self.host,
-                port=self.port,
-                db=self.db,
-                decode_responses=True
-            )
-            self.server = redis.Redis(
-                connection_pool=self.pool,
-                socket_timeout=0.5,
-                socket_connect_timeout=0.5,
-                retry_on_timeout=False,
-                health_check_interval=10
-            )
-            self.server.ping()
-        except redis.exceptions.ConnectionError as e:
-            self.logger.error(f"Redis connection - ConnectionError {e}")
-            _error = True
-        except redis.exceptions.ResponseError as e:
-            self.logger.error(f"Redis connection - ResponseError {e}")
-            _error = True
-
-        if _error:
-            if self.reconnect_try and self.reconnect_attempt > 0:
-                self.reconnect_attempt -= 1
-
-                self.logger.error(f'waiting for reconnection after {self.reconnect_timeout} seconds ')
-                time.sleep(self.reconnect_timeout)
-
-                if self.reconnect_smart_delay:
-                    self.reconnect_timeout = self.reconnect_timeout * 2 + random()
-
-                self._get_server()
-            else:
-                raise redis.exceptions.ConnectionError
+            yield
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            metrics.inc('scoring_api_redis_errors_total', command=command)
+            self.logger.error('Redis %s - %s %s', command, type(e).__name__, e)
+            self.breaker.record_failure()
+            raise StoreUnavailable(str(e)) from e
+        except redis.exceptions.RedisError:
+            metrics.inc('scoring_api_redis_errors_total', command=command)
+            # the server answered, the connection is fine
+            self.breaker.record_success()
+            raise
+        except BaseException:
+            # an error of the caller or a cancelled task says nothing about Redis,
+            # but a half open circuit must not keep waiting for the outcome of its trial
+            self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            metrics.observe('scoring_api_redis_seconds', time.perf_counter() - started, command=command)
 
-    def get(self, key) -> Any:
+    def collect_metrics(self) -> List[Family]:
+        """
+        Collector for `api.metrics`, reports the connection state and the local cache counters.
+        """
+        stats = self.cache_stats()
+        families = [
+            ('scoring_api_redis_up', 'gauge', 'Whether the Redis circuit is not open',
+             [({}, int(self.healthy))]),
+            ('scoring_api_redis_circuit_state', 'gauge', 'Current state of the Redis circuit breaker',
+             [({'state': state}, int(state is self.breaker.state)) for state in CircuitBreaker.STATES]),
+            ('scoring_api_redis_circuit_opened_total', 'counter', 'Times the Redis circuit was opened',
+             [({}, self.breaker.opened)]),
+        ]
+        fallbacks = getattr(self.backend, 'fallbacks', None)
+        if fallbacks is not None:
+            families.append(('scoring_api_redis_replica_fallbacks_total', 'counter',
+                             'Reads repeated on the primary after a replica failed', [({}, fallbacks)]))
+        if self.flights is not None:
+            families.append(('scoring_api_single_flight_coalesced_total', 'counter',
+                             'Keys answered by the read and fill of a concurrent request', [({}, self.flights.coalesced)]))
+        if self.write_behind is not None:
+            families.extend((
+                ('scoring_api_write_behind_pending', 'gauge', 'Writes waiting in the write-behind queue',
+                 [({}, len(self.write_behind))]),
+                ('scoring_api_write_behind_flushed_total', 'counter', 'Keys written by the write-behind worker',
+                 [({}, self.write_behind.flushed)]),
+                ('scoring_api_write_behind_failed_total', 'counter',
+                 'Keys the write-behind worker failed to write', [({}, self.write_behind.failed)]),
+                ('scoring_api_write_behind_dropped_total', 'counter', 'Writes dropped by a full write-behind queue',
+                 [({}, self.write_behind.dropped)]),
+            ))
+        for name, kind, description in (
+                ('hits', 'counter', 'Local cache hits by key prefix'),
+                ('misses', 'counter', 'Local cache misses by key prefix'),
+                ('evictions', 'counter', 'Local cache evictions by key prefix'),
+                ('entries', 'gauge', 'Local cache entries by key prefix'),
+        ):
+            suffix = '' if kind == 'gauge' else '_total'
+            families.append((
+                f'scoring_api_local_cache_{name}{suffix}', kind, description,
+                [({'prefix': prefix}, item[name]) for prefix, item in stats.items()],
+            ))
+        return families
+
+    def _redis_kwargs(self, host: str, port: int, db: int = 0) -> dict:
+        return dict(
+            host=host,
+            port=port,
+            db=db,
+            decode_responses=True,
+            max_connections=self.max_connections,
+            timeout=self.pool_timeout,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+
+    def _create_backend(self, asynchronous: bool = False):
+        """
+        Builds the backend named by `store_backend`: one Redis server with optional
+        read replicas (`redis_replicas`), Redis servers sharded by key (`redis_shards`)
+        or an in-process dict.
+        """
+        if self.backend_name == 'memory':
+            return (AsyncMemoryBackend if asynchronous else MemoryBackend)(self.memory_max_entries)
+
+        redis_backend = AsyncRedisBackend if asynchronous else RedisBackend
+        if self.backend_name == 'redis':
+            primary = redis_backend(**self._redis_kwargs(self.host, self.port, self.db))
+            if not self.replicas:
+                return primary
+            replicas = [redis_backend(**self._redis_kwargs(**replica)) for replica in self.replicas]
+            replicated_backend = AsyncReplicatedRedisBackend if asynchronous else ReplicatedRedisBackend
+            return replicated_backend(primary, replicas, self.replica_retry_timeout)
+        if self.backend_name == 'sharded':
+            shards = [redis_backend(**self._redis_kwargs(**shard)) for shard in self.shards]
+            return (AsyncShardedRedisBackend if asynchronous else ShardedRedisBackend)(shards, self.shard_replicas)
+
+        raise ValueError(f'Unknown store backend "{self.backend_name}", available: redis, sharded, memory')
+
+    def _reconnect_failed(self) -> float:
+        """
+        Returns the seconds to wait before the next reconnection attempt,
+        the wait grows with every failed attempt when `reconnect_smart_delay` is set.
+        """
+        metrics.inc('scoring_api_redis_reconnects_total')
+        delay = self._reconnect_delay
+        if self.reconnect_smart_delay:
+            self._reconnect_delay = min(self._reconnect_delay * 2 + random(), self.reconnect_max_timeout)
+        self.logger.error('waiting for reconnection after %.1f seconds', delay)
+        return delay
+
+    def _reconnected(self) -> None:
+        self.logger.info('Redis reconnected, letting a trial request through')
+        self._reconnect_delay = self.reconnect_timeout
+        self.breaker.half_open()
+
+    def _next_check(self) -> float:
+        if self.breaker.state is CircuitBreaker.OPEN:
+            return self._reconnect_delay if self.reconnect_try else self.breaker.reset_timeout
+        return self.health_check_interval if self.health_check_interval > 0 else self.reconnect_timeout
+
+    @staticmethod
+    def _missing(values: Dict[str, Any]) -> List[str]:
+        return [key for key, val in values.items() if val is None]
+
+
+class KVStore(BaseKVStore):
+    """
+    Key-value store on one of the backends of `api.backends` behind a circuit breaker.
+
+    Connection errors never stall a request: a failing command raises
+    `StoreUnavailable` at once, after `redis_breaker_failure_threshold` failures
+    the circuit opens and commands are rejected without touching the network.
+    The health check thread then reconnects in the background and lets a trial
+    request through once Redis answers again.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.backend: Union[RedisBackend, ReplicatedRedisBackend, ShardedRedisBackend, MemoryBackend, None] = None
+        self.write_behind: Union[WriteBehind, None] = None
+        self.flights: Union[SingleFlight, None] = SingleFlight() if self.single_flight else None
+
+        self._health_check_stop = threading.Event()
+        self._health_check_thread: Union[threading.Thread, None] = None
+
+        self._connect()
+        if self.write_behind_params is not None:
+            self.write_behind = WriteBehind(self._write_many, **self.write_behind_params)
+        if self.conf is not None:
+            self.conf.subscribe(self.reconfigure, STORE_KEYS)
+
+    def reconfigure(self, snapshot: Snapshot, changed: FrozenSet[str]) -> None:
+        """
+        Config listener, switches to a backend made with the new connection settings.
+        Commands in progress finish or fail on the previous backend, which is disconnected.
+        """
+        self._configure(snapshot)
+        self.logger.info('store settings changed, switching to a new %s backend', self.backend_name)
+        previous, self.backend = self.backend, self._create_backend()
+        try:
+            self.backend.ping()
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+            self.breaker.open()
+        else:
+            if self.breaker.state is not CircuitBreaker.CLOSED:
+                self._reconnected()
+        if previous is not None:
+            previous.disconnect()
+
+    def warm_up(self, connections: int) -> None:
+        """
+        Opens up to `connections` connections of every Redis pool, so that the first
+        requests do not wait for TCP handshakes. A failure is only logged, the
+        health check deals with an unreachable server.
+        """
+        if not self.healthy:
+            return
+        try:
+            self.backend.connect(connections)
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            self.logger.warning('store warm-up failed - %s %s', type(e).__name__, e)
+
+    def _connect(self) -> None:
+        self.logger.info('try to connect to the %s store', self.backend_name)
+        self.backend = self._create_backend()
+        try:
+            with self._command('ping'):
+                self.backend.ping()
+        except StoreUnavailable:
+            # start degraded, the health check thread keeps reconnecting
+            self.breaker.open()
+
+    def start_health_check(self) -> None:
+        """
+        Pings the server from a background thread every `health_check_interval` seconds
+        and reconnects while the circuit is open, so that the request path never waits
+        for a connection check or a reconnection.
+        """
+        if self._health_check_thread is not None:
+            return
+
+        self._health_check_stop.clear()
+        self._health_check_thread = threading.Thread(
+            target=self._health_check, name='scoring_api-store-health', daemon=True
+        )
+        self._health_check_thread.start()
+
+    def _health_check(self) -> None:
+        while not self._health_check_stop.wait(self._next_check()):
+            if self.breaker.state is CircuitBreaker.OPEN:
+                if self.reconnect_try:
+                    self._reconnect()
+            elif self.health_check_interval > 0:
+                try:
+                    with self._command('ping'):
+                        self.backend.ping()
+                except StoreUnavailable:
+                    # drop the broken connections, the next command opens a fresh one
+                    self.backend.disconnect()
+
+    def _reconnect(self) -> None:
         try:
-            val = self.server.get(name=key)
-        except redis.exceptions.ConnectionError as e:
-            self.logger.error(f"Redis connection - ConnectionError {e}")
-            val = None
+            # bypasses the breaker, it is the probe deciding to close it
+            self.backend.ping()
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+            self.backend.disconnect()
+            self._reconnect_failed()
+        else:
+            self._reconnected()
 
+    def close(self) -> None:
+        if self.conf is not None:
+            self.conf.unsubscribe(self.reconfigure)
+        if self.write_behind is not None:
+            # writes out the pending keys
+            self.write_behind.close()
+            self.write_behind = None
+        self._health_check_stop.set()
+        if self._health_check_thread is not None:
+            self._health_check_thread.join()
+            self._health_check_thread = None
+        if self.backend is not None:
+            self.backend.disconnect()
+
+    def get(self, key) -> Any:
+        """
+        Raises `StoreUnavailable` when Redis can not be reached, writes never raise it.
+        """
+        val = self._cache_get(key)
+        if val is not MISSING:
+            return val
+
+        with self._command('get'):
+            val = self.backend.get(key)
+
+        self._cache_set(key, val)
         return val
 
     def set(self, key, val, ex: Union[int, None] = None):
+        """
+        With write-behind enabled only queues the write, it reaches Redis in a later pipeline.
+        """
+        self._cache_set(key, val, ex)
+        if self.write_behind is not None:
+            self.write_behind.put(key, val, ex)
+            return
+
         try:
-            self.server.set(name=key, value=val, ex=ex)
-        except redis.exceptions.ConnectionError as e:
-            self.logger.error(f"Redis connection - ConnectionError {e}")
+            with self._command('set'):
+                self.backend.set(key, val, ex)
+        except StoreUnavailable:
+            # cache fills are best effort
+            pass
+
+    def get_many(self, keys: Sequence[str]) -> List[Any]:
+        """
+        Reads all keys with a single MGET, missing keys are returned as None.
+        Keys found in the local cache are not requested from Redis.
+        Raises `StoreUnavailable` like `get`.
+        """
+        values, missing = self._cache_get_many(keys)
+        if not missing:
+            return values
+
+        with self._command('mget'):
+            found = self.backend.mget([keys[i] for i in missing])
+
+        for i, val in zip(missing, found):
+            values[i] = val
+            self._cache_set(keys[i], val)
+
+        return values
+
+    def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None):
+        """
+        Writes all pairs in one pipelined round trip per server, each key gets its own `ex`.
+        Queued like `set` with write-behind enabled.
+        """
+        if not mapping:
+            return
+
+        for key, val in mapping.items():
+            self._cache_set(key, val, ex)
+
+        if self.write_behind is not None:
+            self.write_behind.put_many(mapping, ex)
+        else:
+            self._write_many(mapping, ex)
+
+    def _write_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> bool:
+        """
+        Writes `mapping` with one pipeline, returns False when the store is unavailable.
+        """
+        try:
+            with self._command('pipeline'):
+                self.backend.set_many(mapping, ex)
+        except StoreUnavailable:
+            return False
+        return True
+
+    def get_or_set(self, key: str, compute: Callable[[], Any], ex: Union[int, None] = None) -> Any:
+        """
+        Value of `key`, a missing one is set to `compute()`. See `get_or_set_many`.
+        """
+        return self.get_or_set_many([key], lambda missing: {key: compute()}, ex)[0]
+
+    def get_or_set_many(self, keys: Sequence[str], compute: Compute, ex: Union[int, None] = None) -> List[Any]:
+        """
+        Values of `keys` like `get_many`, the missing keys are set to the values of
+        `compute(missing_keys)`. Concurrent calls share the read and the fill of
+        their common keys, so a key is computed once; with `single_flight_lock_timeout`
+        also across processes. Stored values are returned as strings, computed ones
+        as computed. Raises `StoreUnavailable` like `get`, nothing is computed then.
+        """
+        if self.flights is None:
+            values = self._load(keys, compute, ex)
+        else:
+            values = self.flights.do(keys, lambda led: self._load(led, compute, ex))
+        return [values[key] for key in keys]
+
+    def _load(self, keys: Sequence[str], compute: Compute, ex: Union[int, None]) -> Dict[str, Any]:
+        values = dict(zip(keys, self.get_many(keys)))
+        missing = self._missing(values)
+        if missing:
+            fill = self._fill_locked if self.lock_timeout > 0 else self._fill
+            values.update(fill(missing, compute, ex))
+        return values
+
+    def _fill(self, keys: List[str], compute: Compute, ex: Union[int, None]) -> Dict[str, Any]:
+        filled = compute(keys)
+        self.set_many(filled, ex)
+        return filled
+
+    def _fill_locked(self, keys: List[str], compute: Compute, ex: Union[int, None]) -> Dict[str, Any]:
+        """
+        Fills the keys whose Redis lock this process took and reads the keys other
+        processes are filling, keys still missing after `lock_timeout` seconds are
+        filled here as well.
+        """
+        token = uuid.uuid4().hex
+        try:
+            with self._command('lock'):
+                locked = self.backend.lock([LOCK_PREFIX + key for key in keys], token, self.lock_timeout)
+        except StoreUnavailable:
+            return self._fill(keys, compute, ex)
+
+        owned = [key for key, ok in zip(keys, locked) if ok]
+        values: Dict[str, Any] = {key: None for key, ok in zip(keys, locked) if not ok}
+        if owned:
+            filled = compute(owned)
+            for key, val in filled.items():
+                self._cache_set(key, val, ex)
+            # the waiting processes poll Redis, the values skip the write-behind queue
+            self._write_many(filled, ex)
+            try:
+                with self._command('unlock'):
+                    self.backend.unlock([LOCK_PREFIX + key for key in owned], token)
+            except StoreUnavailable:
+                # the locks expire
+                pass
+            values.update(filled)
+
+        waiting = self._missing(values)
+        if waiting:
+            metrics.inc('scoring_api_single_flight_lock_waits_total', len(waiting))
+        deadline = time.monotonic() + self.lock_timeout
+        while waiting and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            try:
+                values.update((key, val) for key, val in zip(waiting, self.get_many(waiting)) if val is not None)
+            except StoreUnavailable:
+                break
+            waiting = self._missing(values)
+
+        if waiting:
+            values.update(self._fill(waiting, compute, ex))
+        return values
+
+    def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """
+        Takes `cost` tokens of the bucket `key` kept in Redis, returns 0 or the seconds
+        until it holds enough of them. Raises `StoreUnavailable` like `get`.
+        """
+        with self._command('rate_limit'):
+            return self.backend.take_tokens(key, rate, burst, cost)
 
     def __getitem__(self, key) -> Any:
         return self.get(key)
 
     def __setitem__(self, key, val):
         self.set(key, val)
+
+
+class AsyncKVStore(BaseKVStore):
+    """
+    `KVStore` for the asyncio engine, `get`/`set`, the circuit breaker and the reconnection
+    policy are the same but waiting on Redis suspends the calling task instead of blocking a thread.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+
+        self.backend: Union[AsyncRedisBackend, AsyncReplicatedRedisBackend, AsyncShardedRedisBackend,
+                            AsyncMemoryBackend, None] = None
+        self.write_behind: Union[AsyncWriteBehind, None] = None
+        self.flights: Union[AsyncSingleFlight, None] = AsyncSingleFlight() if self.single_flight else None
+        self._health_check_task: Union[asyncio.Task, None] = None
+        self._loop: Union[asyncio.AbstractEventLoop, None] = None
+        self._switch_task: Union[asyncio.Task, None] = None
+
+    async def connect(self) -> None:
+        """
+        Creates the backend and starts the health check task of the running loop,
+        never waits for Redis longer than one connection timeout.
+        """
+        self.logger.info('try to connect to the %s store', self.backend_name)
+        self.backend = self._create_backend(asynchronous=True)
+        try:
+            with self._command('ping'):
+                await self.backend.ping()
+        except StoreUnavailable:
+            self.breaker.open()
+
+        self._health_check_task = asyncio.create_task(self._health_check())
+        if self.write_behind_params is not None:
+            self.write_behind = AsyncWriteBehind(self._write_many, **self.write_behind_params)
+        if self.conf is not None:
+            self._loop = asyncio.get_running_loop()
+            self.conf.subscribe(self.reconfigure, STORE_KEYS)
+
+    def reconfigure(self, snapshot: Snapshot, changed: FrozenSet[str]) -> None:
+        """
+        Config listener called from any thread, the backend is switched by a task of the store loop.
+        """
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._start_switch, snapshot)
+
+    def _start_switch(self, snapshot: Snapshot) -> None:
+        self._switch_task = asyncio.ensure_future(self._switch_backend(snapshot))
+
+    async def _switch_backend(self, snapshot: Snapshot) -> None:
+        self._configure(snapshot)
+        self.logger.info('store settings changed, switching to a new %s backend', self.backend_name)
+        previous, self.backend = self.backend, self._create_backend(asynchronous=True)
+        try:
+            await self.backend.ping()
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+            self.breaker.open()
+        else:
+            if self.breaker.state is not CircuitBreaker.CLOSED:
+                self._reconnected()
+        if previous is not None:
+            await previous.disconnect()
+
+    async def warm_up(self, connections: int) -> None:
+        if not self.healthy:
+            return
+        try:
+            await self.backend.connect(connections)
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            self.logger.warning('store warm-up failed - %s %s', type(e).__name__, e)
+
+    async def _health_check(self) -> None:
+        while True:
+            await asyncio.sleep(self._next_check())
+            if self.breaker.state is CircuitBreaker.OPEN:
+                if self.reconnect_try:
+                    await self._reconnect()
+            elif self.health_check_interval > 0:
+                try:
+                    with self._command('ping'):
+                        await self.backend.ping()
+                except StoreUnavailable:
+                    await self.backend.disconnect()
+
+    async def _reconnect(self) -> None:
+        try:
+            await self.backend.ping()
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+            await self.backend.disconnect()
+            self._reconnect_failed()
+        else:
+            self._reconnected()
+
+    async def close(self) -> None:
+        if self.conf is not None:
+            self.conf.unsubscribe(self.reconfigure)
+            self._loop = None
+        if self._switch_task is not None:
+            await self._switch_task
+            self._switch_task = None
+        if self.write_behind is not None:
+            await self.write_behind.close()
+            self.write_behind = None
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            self._health_check_task = None
+        if self.backend is not None:
+            await self.backend.disconnect()
+
+    async def get(self, key) -> Any:
+        """
+        Raises `StoreUnavailable` when Redis can not be reached, writes never raise it.
+        """
+        val = self._cache_get(key)
+        if val is not MISSING:
+            return val
+
+        with self._command('get'):
+            val = await self.backend.get(key)
+
+        self._cache_set(key, val)
+        return val
+
+    async def set(self, key, val, ex: Union[int, None] = None):
+        self._cache_set(key, val, ex)
+        if self.write_behind is not None:
+            self.write_behind.put(key, val, ex)
+            return
+
+        try:
+            with self._command('set'):
+                await self.backend.set(key, val, ex)
+        except StoreUnavailable:
+            # cache fills are best effort
+            pass
+
+    async def get_many(self, keys: Sequence[str]) -> List[Any]:
+        values, missing = self._cache_get_many(keys)
+        if not missing:
+            return values
+
+        with self._command('mget'):
+            found = await self.backend.mget([keys[i] for i in missing])
+
+        for i, val in zip(missing, found):
+            values[i] = val
+            self._cache_set(keys[i], val)
+
+        return values
+
+    async def set_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None):
+        if not mapping:
+            return
+
+        for key, val in mapping.items():
+            self._cache_set(key, val, ex)
+
+        if self.write_behind is not None:
+            self.write_behind.put_many(mapping, ex)
+        else:
+            await self._write_many(mapping, ex)
+
+    async def _write_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> bool:
+        try:
+            with self._command('pipeline'):
+                await self.backend.set_many(mapping, ex)
+        except StoreUnavailable:
+            return False
+        return True
+
+    async def get_or_set(self, key: str, compute: Callable[[], Any], ex: Union[int, None] = None) -> Any:
+        return (await self.get_or_set_many([key], lambda missing: {key: compute()}, ex))[0]
+
+    async def get_or_set_many(self, keys: Sequence[str], compute: Compute, ex: Union[int, None] = None) -> List[Any]:
+        if self.flights is None:
+            values = await self._load(keys, compute, ex)
+        else:
+            values = await self.flights.do(keys, lambda led: self._load(led, compute, ex))
+        return [values[key] for key in keys]
+
+    async def _load(self, keys: Sequence[str], compute: Compute, ex: Union[int, None]) -> Dict[str, Any]:
+        values = dict(zip(keys, await self.get_many(keys)))
+        missing = self._missing(values)
+        if missing:
+            fill = self._fill_locked if self.lock_timeout > 0 else self._fill
+            values.update(await fill(missing, compute, ex))
+        return values
+
+    async def _fill(self, keys: List[str], compute: Compute, ex: Union[int, None]) -> Dict[str, Any]:
+        filled = compute(keys)
+        await self.set_many(filled, ex)
+        return filled
+
+    async def _fill_locked(self, keys: List[str], compute: Compute, ex: Union[int, None]) -> Dict[str, Any]:
+        token = uuid.uuid4().hex
+        try:
+            with self._command('lock'):
+                locked = await self.backend.lock([LOCK_PREFIX + key for key in keys], token, self.lock_timeout)
+        except StoreUnavailable:
+            return await self._fill(keys, compute, ex)
+
+        owned = [key for key, ok in zip(keys, locked) if ok]
+        values: Dict[str, Any] = {key: None for key, ok in zip(keys, locked) if not ok}
+        if owned:
+            filled = compute(owned)
+            for key, val in filled.items():
+                self._cache_set(key, val, ex)
+            await self._write_many(filled, ex)
+            try:
+                with self._command('unlock'):
+                    await self.backend.unlock([LOCK_PREFIX + key for key in owned], token)
+            except StoreUnavailable:
+                pass
+            values.update(filled)
+
+        waiting = self._missing(values)
+        if waiting:
+            metrics.inc('scoring_api_single_flight_lock_waits_total', len(waiting))
+        deadline = time.monotonic() + self.lock_timeout
+        while waiting and time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            try:
+                values.update((key, val) for key, val in zip(waiting, await self.get_many(waiting)) if val is not None)
+            except StoreUnavailable:
+                break
+            waiting = self._missing(values)
+
+        if waiting:
+            values.update(await self._fill(waiting, compute, ex))
+        return values
+
+    async def take_tokens(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        with self._command('rate_limit'):
+            return await self.backend.take_tokens(key, rate, burst, cost)
+
+    def __getitem__(self, key) -> Awaitable[Any]:
+        return self.get(key)
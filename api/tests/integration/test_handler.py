@@ -0,0 +1,388 @@
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import re
+import socket
+import threading
+import time
+import unittest
+import unittest.mock
+import urllib.error
+import uuid
+import urllib.request
+from http import HTTPStatus
+
+import api
+from api.configurator import Conf
+from api.encoder import ENCODERS
+from api.encoder import json_dumps
+from api.handler import AsyncMainHandler
+from api.handler import MainHandler
+from api.server import AsyncHTTPServer
+from api.server import ThreadPoolHTTPServer
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+        self.server = self.make_server()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+
+    def make_server(self):
+        return ThreadPoolHTTPServer(('127.0.0.1', 0), MainHandler, conf=self.conf, threads=2, queue_size=2)
+
+    def post(self, path, data, headers=None):
+        request = urllib.request.Request(self.url + path, data=data, headers=headers or {}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, json.loads(self.read_body(response))
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(self.read_body(e))
+
+    @staticmethod
+    def read_body(response):
+        body = response.read()
+        if response.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def interests_request(self, client_ids, login='h&f'):
+        request = {"account": "horns&hoofs", "login": login, "method": "clients_interests",
+                   "arguments": {"client_ids": client_ids}}
+        request['token'] = hashlib.sha512(
+            (request['account'] + request['login'] + self.conf.salt).encode('utf-8')
+        ).hexdigest()
+        return json.dumps(request).encode('utf8')
+
+    def test_admin_score(self):
+        request = {"account": "horns&hoofs", "login": self.conf.admin_login, "method": "online_score",
+                   "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"}}
+        request['token'] = hashlib.sha512(
+            (self.conf.admin_login + str(self.conf.admin_salt)).encode('utf-8')
+        ).hexdigest()
+
+        code, body = self.post('/method/', json.dumps(request).encode('utf8'))
+        self.assertEqual(HTTPStatus.OK, code)
+        self.assertEqual({'code': HTTPStatus.OK, 'response': {'score': 42}}, body)
+
+    def test_invalid_request(self):
+        code, body = self.post('/method/', b'{}')
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, code)
+        self.assertTrue(body['errors'])
+
+    def test_bad_json(self):
+        code, body = self.post('/method/', b'{')
+        self.assertEqual(HTTPStatus.BAD_REQUEST, code)
+
+    def test_not_found(self):
+        code, body = self.post('/unknown/', b'{}')
+        self.assertEqual(HTTPStatus.NOT_FOUND, code)
+
+    def test_interests_are_encoded_once(self):
+        code, body = self.post('/method/', self.interests_request([1, 2]))
+        self.assertEqual(HTTPStatus.OK, code)
+        self.assertEqual({'1', '2'}, set(body['response']))
+
+    def test_huge_client_id(self):
+        # beyond the 64-bit ints of orjson
+        code, body = self.post('/method/', self.interests_request([10 ** 30]))
+        self.assertEqual(HTTPStatus.OK, code)
+        self.assertEqual({str(10 ** 30)}, set(body['response']))
+
+    def test_encoder_failure(self):
+        def encode(obj):
+            # results fail, the error response is encoded
+            if 'response' in obj:
+                raise TypeError('can not encode')
+            return json_dumps(obj)
+
+        self.conf.update(response_encoder='json')
+        with unittest.mock.patch.dict(ENCODERS, {'json': encode}):
+            code, body = self.post('/method/', self.interests_request([1]))
+        self.assertEqual(HTTPStatus.INTERNAL_SERVER_ERROR, code)
+
+    def test_gzip(self):
+        client_ids = list(range(1000))
+        request = urllib.request.Request(self.url + '/method/', data=self.interests_request(client_ids),
+                                         headers={'Accept-Encoding': 'gzip'}, method='POST')
+        with urllib.request.urlopen(request, timeout=5) as response:
+            self.assertEqual('gzip', response.headers.get('Content-Encoding'))
+            body = json.loads(self.read_body(response))
+
+        self.assertEqual(len(client_ids), len(body['response']))
+
+    def test_keep_alive(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=5)
+        try:
+            connection.request('POST', '/method/', body=b'{}')
+            first = connection.getresponse()
+            first.read()
+            sock = connection.sock
+
+            connection.request('POST', '/method/', body=b'{')
+            second = connection.getresponse()
+            second.read()
+
+            self.assertEqual(11, first.version)
+            self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, first.status)
+            self.assertEqual(HTTPStatus.BAD_REQUEST, second.status)
+            self.assertIsNotNone(first.getheader('Content-Length'))
+            self.assertIs(sock, connection.sock)
+        finally:
+            connection.close()
+
+    def test_idle_connections_leave_a_worker(self):
+        connections = [http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=5)
+                       for _ in range(2)]
+        try:
+            responses = []
+            for connection in connections:
+                connection.request('POST', '/method/', body=b'{}')
+                response = connection.getresponse()
+                response.read()
+                responses.append(response)
+
+            # both connections stay open, the idle ones must not keep a new client waiting
+            self.assertTrue(self.server.warmup.wait(5))
+            started = time.monotonic()
+            with urllib.request.urlopen(self.url + '/ready', timeout=5) as response:
+                response.read()
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            for connection in connections:
+                connection.close()
+
+        self.assertEqual('keep-alive', responses[0].getheader('Connection'))
+        if isinstance(self.server, ThreadPoolHTTPServer):
+            # the second connection got the last of the two workers
+            self.assertEqual('close', responses[1].getheader('Connection'))
+
+    def test_pipelined_requests(self):
+        request = b'POST /method/ HTTP/1.1\r\nHost: localhost\r\nContent-Length: 2\r\n\r\n{}'
+        last = b'POST /unknown/ HTTP/1.1\r\nHost: localhost\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}'
+
+        with socket.create_connection(('127.0.0.1', self.server.server_address[1]), timeout=5) as sock:
+            sock.sendall(request + request + last)
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+
+        statuses = re.findall(rb'HTTP/1.1 (\d{3}) ', data)
+        self.assertEqual([b'422', b'422', b'404'], statuses)
+
+    def test_length_required(self):
+        with socket.create_connection(('127.0.0.1', self.server.server_address[1]), timeout=5) as sock:
+            sock.sendall(b'POST /method/ HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            self.assertIn(b' 411 ', sock.recv(65536).split(b'\r\n')[0])
+
+    def test_body_too_large(self):
+        self.conf.update(admission_max_body_size=16)
+        with socket.create_connection(('127.0.0.1', self.server.server_address[1]), timeout=5) as sock:
+            # refused from the headers, the body is never sent
+            sock.sendall(b'POST /method/ HTTP/1.1\r\nHost: localhost\r\nContent-Length: 1000000\r\n\r\n')
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+
+        self.assertIn(b' 413 ', data.split(b'\r\n')[0])
+        self.assertIn(b'Connection: close', data)
+
+    def test_negative_length(self):
+        self.conf.update(admission_max_body_size=1000)
+        with socket.create_connection(('127.0.0.1', self.server.server_address[1]), timeout=5) as sock:
+            sock.sendall(b'POST /method/ HTTP/1.1\r\nHost: localhost\r\nContent-Length: -1\r\n\r\n{}')
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+
+        self.assertIn(b' 400 ', data.split(b'\r\n')[0])
+        self.assertIn(b'Connection: close', data)
+
+    def test_overloaded(self):
+        self.conf.update(admission_max_in_flight=1)
+        self.assertTrue(self.server.admission.enter())
+        self.addCleanup(self.server.admission.leave)
+
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=5)
+        try:
+            connection.request('POST', '/method/', body=self.interests_request([1]))
+            response = connection.getresponse()
+            body = json.loads(response.read())
+        finally:
+            connection.close()
+
+        self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, response.status)
+        self.assertEqual(str(self.conf.admission_retry_after), response.getheader('Retry-After'))
+        self.assertEqual({'code': 503, 'error': 'Server Overloaded'}, body)
+
+    def rate_limited(self, shared):
+        self.conf.update(admission_rate_limit=0.5, admission_rate_shared=shared)
+        login = uuid.uuid4().hex
+
+        code, body = self.post('/method/', self.interests_request([1], login))
+        self.assertEqual(HTTPStatus.OK, code)
+        request = urllib.request.Request(self.url + '/method/', data=self.interests_request([1], login), method='POST')
+        with self.assertRaises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(request, timeout=5)
+        self.assertEqual(HTTPStatus.TOO_MANY_REQUESTS, e.exception.code)
+        self.assertEqual('2', e.exception.headers['Retry-After'])
+        self.assertEqual(['rate limit exceeded'], json.loads(self.read_body(e.exception))['errors'])
+
+        # other logins have buckets of their own
+        code, body = self.post('/method/', self.interests_request([1], uuid.uuid4().hex))
+        self.assertEqual(HTTPStatus.OK, code)
+
+        response, results = self.stream([self.interests_request([1], login)])
+        self.assertEqual(HTTPStatus.TOO_MANY_REQUESTS, response.status)
+        self.assertIsNotNone(response.getheader('Retry-After'))
+
+    def test_rate_limited(self):
+        self.rate_limited(shared=False)
+
+    def test_rate_limited_shared(self):
+        self.rate_limited(shared=True)
+
+    def test_metrics(self):
+        self.post('/method/', self.interests_request([1]))
+
+        with urllib.request.urlopen(self.url + '/metrics', timeout=5) as response:
+            self.assertEqual(HTTPStatus.OK, response.status)
+            self.assertTrue(response.headers.get('Content-Type').startswith('text/plain; version=0.0.4'))
+            body = response.read().decode('utf-8')
+
+        self.assertRegex(body, r'scoring_api_requests_total\{code="200",method="clients_interests",path="method"\} \d+')
+        self.assertIn('scoring_api_stage_seconds_bucket{stage="check_auth",le="+Inf"}', body)
+        self.assertIn('scoring_api_redis_commands_total{command="mget"}', body)
+        self.assertIn('scoring_api_redis_up 1', body)
+
+    def test_ready(self):
+        self.assertTrue(self.server.warmup.wait(5))
+        with urllib.request.urlopen(self.url + '/ready', timeout=5) as response:
+            self.assertEqual(HTTPStatus.OK, response.status)
+            self.assertEqual({'code': 200, 'response': {'ready': True}}, json.loads(self.read_body(response)))
+        self.assertIn('store', self.server.warmup.stages)
+
+        self.server.warmup.ready.clear()
+        with self.assertRaises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(self.url + '/ready', timeout=5)
+        self.assertEqual(HTTPStatus.SERVICE_UNAVAILABLE, e.exception.code)
+        self.assertEqual({'code': 503, 'error': 'warming up'}, json.loads(self.read_body(e.exception)))
+
+        # readiness probes get a series of their own
+        with urllib.request.urlopen(self.url + '/metrics', timeout=5) as response:
+            body = response.read().decode('utf-8')
+        self.assertRegex(body, r'scoring_api_requests_total\{code="503",method="",path="ready"\} \d+')
+
+    def stream(self, lines, chunked=True):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=5)
+        try:
+            headers = {'Content-Type': 'application/x-ndjson'}
+            if chunked:
+                headers['Transfer-Encoding'] = 'chunked'
+                body = (line + b'\n' for line in lines)
+            else:
+                body = b'\n'.join(lines)
+            connection.request('POST', '/method/', body=body, headers=headers, encode_chunked=chunked)
+            response = connection.getresponse()
+            body = response.read()
+            return response, [json.loads(line) for line in body.splitlines()]
+        finally:
+            connection.close()
+
+    def test_stream_interests(self):
+        self.conf.update(stream_batch_size=3)
+        lines = [self.interests_request([1]), b'2', b'[3, 4]', b'', b'[5, 6, 7]']
+
+        for chunked in (True, False):
+            with self.subTest(chunked=chunked):
+                response, results = self.stream(lines, chunked)
+
+                self.assertEqual(HTTPStatus.OK, response.status)
+                self.assertEqual('application/x-ndjson', response.getheader('Content-Type'))
+                self.assertEqual('chunked', response.getheader('Transfer-Encoding'))
+                self.assertEqual([HTTPStatus.OK] * 3, [result['code'] for result in results])
+                self.assertEqual([['1', '2', '3'], ['4', '5', '6'], ['7']],
+                                 [list(result['response']) for result in results])
+
+    def test_stream_rejected(self):
+        response, results = self.stream([b'{}', b'1'])
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, response.status)
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, results[0]['code'])
+
+        request = json.loads(self.interests_request([]))
+        request['method'] = 'online_score'
+        response, results = self.stream([json.dumps(request).encode('utf8')])
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, response.status)
+        self.assertEqual(['only the clients_interests method can be streamed'], results[0]['errors'])
+
+    def test_stream_bad_line(self):
+        self.conf.update(stream_batch_size=1)
+        response, results = self.stream([self.interests_request([]), b'1', b'"2"', b'3'])
+
+        self.assertEqual(HTTPStatus.OK, response.status)
+        self.assertEqual([HTTPStatus.OK, HTTPStatus.UNPROCESSABLE_ENTITY], [result['code'] for result in results])
+        self.assertEqual({'1'}, set(results[0]['response']))
+
+    def test_stream_line_too_long(self):
+        request = self.interests_request([1])
+        self.conf.update(stream_max_line_size=len(request))
+        response, results = self.stream([request, b'[' + b'1, ' * len(request) + b'1]'])
+
+        self.assertEqual(HTTPStatus.OK, response.status)
+        self.assertEqual(HTTPStatus.BAD_REQUEST, results[-1]['code'])
+
+    def test_stream_huge_chunk(self):
+        # a line limit hit inside a chunk declared as 1 GiB is answered before the chunk arrives
+        self.conf.update(stream_max_line_size=1024)
+        request = self.interests_request([1]) + b'\n'
+        with socket.create_connection(self.server.server_address, timeout=5) as sock:
+            sock.sendall(
+                b'POST /method/ HTTP/1.1\r\nHost: test\r\nContent-Type: application/x-ndjson\r\n'
+                b'Transfer-Encoding: chunked\r\n\r\n'
+                b'%X\r\n%s\r\n' % (len(request), request) + b'40000000\r\n' + b'1' * 131072
+            )
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+
+        self.assertTrue(data.startswith(b'HTTP/1.1 200'), data[:100])
+        self.assertIn(b'"code":400', data.replace(b' ', b''))
+
+    def test_get_with_body(self):
+        # the body must not be parsed as a request pipelined behind the GET
+        smuggled = b'GET /unknown HTTP/1.1\r\nHost: test\r\n\r\n'
+        with socket.create_connection(self.server.server_address, timeout=5) as sock:
+            sock.sendall(
+                b'GET /metrics HTTP/1.1\r\nHost: test\r\nContent-Length: %d\r\n\r\n%s' % (len(smuggled), smuggled)
+            )
+            data = b''
+            while chunk := sock.recv(65536):
+                data += chunk
+
+        self.assertTrue(data.startswith(b'HTTP/1.1 200'), data[:100])
+        self.assertIn(b'Connection: close', data)
+        self.assertNotIn(b'HTTP/1.1 404', data)
+
+    def test_get_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(self.url + '/method/', timeout=5)
+        self.assertEqual(HTTPStatus.NOT_FOUND, e.exception.code)
+
+
+class AsyncTestSuite(TestSuite):
+    def make_server(self):
+        return AsyncHTTPServer(('127.0.0.1', 0), AsyncMainHandler, conf=self.conf)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -1,13 +1,17 @@
+import asyncio
 import datetime
 import functools
 import hashlib
 import os
 import unittest
+import uuid
 from http import HTTPStatus
 
 import api
 from api.configurator import Conf
+from api.method.views import AsyncMethodView
 from api.method.views import MethodView
+from api.store import AsyncKVStore
 
 
 def cases(cases_items):
@@ -30,6 +34,9 @@ class TestSuite(unittest.TestCase):
     def get_response(self, request):
         return MethodView(conf=self.conf).post(request)
 
+    def get_stream(self, request, lines):
+        return list(MethodView(conf=self.conf).stream_interests(request, lines))
+
     def set_valid_auth(self, request):
         if request.get("login") == self.conf.admin_login:
             line = self.conf.admin_login + str(self.conf.admin_salt)
@@ -113,6 +120,29 @@ class TestSuite(unittest.TestCase):
         score = response.get("score")
         self.assertEqual(score, 42)
 
+    def test_score_model(self):
+        self.conf.update(scoring_models={
+            **self.conf.scoring_models,
+            'v2': {'features': [{'arguments': ['phone', 'email'], 'weight': 10}]},
+        })
+        arguments = {"phone": "79175002040", "email": "stupnikov@otus.ru"}
+
+        for model, expected in ((None, 3.0), ('v1', 3.0), ('v2', 10)):
+            request = {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "arguments": arguments}
+            if model is not None:
+                request["model"] = model
+            self.set_valid_auth(request)
+            code, response, errors = self.get_response(request)
+            self.assertEqual(HTTPStatus.OK, code, (request, errors))
+            self.assertEqual(expected, response["score"], model)
+
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "arguments": arguments,
+                   "model": "v3"}
+        self.set_valid_auth(request)
+        code, response, errors = self.get_response(request)
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, code)
+        self.assertEqual(['unknown scoring model "v3"'], errors)
+
     @cases([
         {"client_ids": [1, 2, 3], "date": datetime.datetime.today().strftime("%d.%m.%Y")},
         {"client_ids": [1, 2], "date": "19.07.2017"},
@@ -143,6 +173,140 @@ class TestSuite(unittest.TestCase):
         self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, code, (arguments, errors))
         self.assertTrue(len(errors))
 
+    def test_ok_batch_request(self):
+        calls = [
+            {"method": "online_score", "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"}},
+            {"method": "clients_interests", "arguments": {"client_ids": [1, 2]}},
+            {"method": "clients_interests", "arguments": {"client_ids": [2, 3]}},
+            {"method": "online_score", "arguments": {"phone": "89175002040"}},
+            {"method": "unknown", "arguments": {}},
+            {"arguments": {}},
+        ]
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "batch", "arguments": {"calls": calls}}
+        self.set_valid_auth(request)
+        code, response, errors = self.get_response(request)
+        self.assertEqual(HTTPStatus.OK, code, errors)
+        self.assertEqual(len(calls), len(response))
+        self.assertEqual([HTTPStatus.OK] * 3 + [HTTPStatus.UNPROCESSABLE_ENTITY] * 3, [r['code'] for r in response])
+        self.assertEqual(3.0, response[0]['response']['score'])
+        self.assertEqual({1, 2}, set(response[1]['response']))
+        self.assertEqual(response[1]['response'][2], response[2]['response'][2])
+        self.assertTrue(all(len(r['errors']) for r in response[3:]))
+
+    def test_batch_scores_are_floats(self):
+        self.conf.update(scoring_models={'v1': {'features': [{'arguments': ['phone', 'email'], 'weight': 2}]}})
+        # a phone never scored before, so the score is computed and not read from the store
+        arguments = {"phone": f"7{uuid.uuid4().int % 10 ** 10:010d}", "email": "stupnikov@otus.ru"}
+        calls = [{"method": "online_score", "arguments": arguments}]
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "batch", "arguments": {"calls": calls}}
+        self.set_valid_auth(request)
+        code, response, errors = self.get_response(request)
+
+        self.assertEqual(HTTPStatus.OK, code, errors)
+        self.assertEqual(2.0, response[0]['response']['score'])
+        self.assertIs(float, type(response[0]['response']['score']))
+
+    @cases([
+        {},
+        {"calls": []},
+        {"calls": {"method": "online_score"}},
+        {"calls": ["online_score"]},
+    ])
+    def test_invalid_batch_request(self, arguments):
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "batch", "arguments": arguments}
+        self.set_valid_auth(request)
+        code, response, errors = self.get_response(request)
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, code, (arguments, errors))
+        self.assertTrue(len(errors))
+
+    def test_batch_request_too_long(self):
+        calls = [{"method": "clients_interests", "arguments": {"client_ids": [1]}}] * (self.conf.batch_max_calls + 1)
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "batch", "arguments": {"calls": calls}}
+        self.set_valid_auth(request)
+        code, response, errors = self.get_response(request)
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, code)
+
+    def test_stream_interests(self):
+        self.conf.update(stream_batch_size=2)
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "clients_interests",
+                   "arguments": {"client_ids": [1]}}
+        self.set_valid_auth(request)
+        self.assertIsNone(MethodView(conf=self.conf).check_stream(request))
+
+        results = self.get_stream(request, [b'2', b'[3, 4, 5]'])
+        self.assertEqual([[1, 2], [3, 4], [5]], [list(result) for result in results])
+        self.assertTrue(all(isinstance(interests, list) for result in results for interests in result.values()))
+
+        with self.assertRaises(ValueError):
+            self.get_stream(request, [b'2', b'{"id": 3}'])
+
+    @cases([
+        [],
+        {"account": "horns&hoofs", "login": "h&f", "method": "online_score", "arguments": {}},
+        {"account": "horns&hoofs", "login": "h&f", "method": "clients_interests", "arguments": {"date": "1"}},
+    ])
+    def test_invalid_stream_request(self, request):
+        if isinstance(request, dict):
+            self.set_valid_auth(request)
+        code, response, errors = MethodView(conf=self.conf).check_stream(request)
+        self.assertEqual(HTTPStatus.UNPROCESSABLE_ENTITY, code)
+        self.assertTrue(errors)
+
+    @unittest.skipIf(Conf().store_backend != 'redis', 'an unreachable port means nothing to this backend')
+    def test_store_unavailable(self):
+        # nothing listens there, requests are served degraded
+        self.conf.update(redis_port=1)
+
+        score = {"method": "online_score", "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru"}}
+        interests = {"method": "clients_interests", "arguments": {"client_ids": [1, 2]}}
+        fallback = self.conf.interests_fallback
+
+        for call, expected in ((score, {'score': 3.0}), (interests, {1: fallback, 2: fallback})):
+            request = {"account": "horns&hoofs", "login": "h&f", **call}
+            self.set_valid_auth(request)
+            code, response, errors = self.get_response(request)
+            self.assertEqual(HTTPStatus.OK, code, errors)
+            self.assertEqual(expected, response)
+
+        request = {"account": "horns&hoofs", "login": "h&f", "method": "batch", "arguments": {"calls": [score, interests]}}
+        self.set_valid_auth(request)
+        code, response, errors = self.get_response(request)
+        self.assertEqual(HTTPStatus.OK, code, errors)
+        self.assertEqual([{'score': 3.0}, {1: fallback, 2: fallback}], [r['response'] for r in response])
+
+
+class AsyncTestSuite(TestSuite):
+    """
+    Runs the same cases against the asyncio engine.
+    """
+
+    def get_response(self, request):
+        async def post():
+            store = AsyncKVStore(conf=self.conf)
+            await store.connect()
+            try:
+                return await AsyncMethodView(conf=self.conf, store=store).post(request)
+            finally:
+                await store.close()
+
+        return asyncio.run(post())
+
+    def get_stream(self, request, lines):
+        async def stream():
+            async def read():
+                for line in lines:
+                    yield line
+
+            store = AsyncKVStore(conf=self.conf)
+            await store.connect()
+            try:
+                return [result async for result in AsyncMethodView(conf=self.conf, store=store)
+                        .stream_interests(request, read())]
+            finally:
+                await store.close()
+
+        return asyncio.run(stream())
+
 
 if __name__ == "__main__":
     os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
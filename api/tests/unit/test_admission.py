@@ -0,0 +1,95 @@
+import os
+import threading
+import unittest
+
+import api
+from api.admission import Admission
+from api.admission import TokenBuckets
+from api.configurator import Conf
+from api.metrics import metrics
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+
+    def test_bucket_refills(self):
+        buckets = TokenBuckets()
+        self.assertEqual([0, 0, 0], [buckets.take('a', 2, 3, now=0) for _ in range(3)])
+        self.assertEqual(0.5, buckets.take('a', 2, 3, now=0))
+        # nothing was taken by the refused request
+        self.assertEqual(0, buckets.take('a', 2, 3, now=0.5))
+        self.assertEqual(0.5, buckets.take('a', 2, 3, now=0.5))
+        # a bucket never holds more than the burst
+        self.assertEqual([0, 0, 0], [buckets.take('a', 2, 3, now=100) for _ in range(3)])
+        self.assertEqual(0.5, buckets.take('a', 2, 3, now=100))
+        self.assertEqual(0, buckets.take('b', 2, 3, now=100))
+
+    def test_buckets_are_bounded(self):
+        buckets = TokenBuckets(max_entries=2)
+        for key in ('a', 'b', 'a', 'c'):
+            buckets.take(key, 1, 1, now=0)
+
+        self.assertEqual(2, len(buckets))
+        # the least recently used bucket was dropped and starts full
+        self.assertEqual(0, buckets.take('b', 1, 1, now=0))
+        self.assertEqual(1, buckets.take('c', 1, 1, now=0))
+
+    def test_concurrent_takes(self):
+        buckets = TokenBuckets()
+        taken = []
+
+        def take():
+            taken.extend(1 for _ in range(100) if buckets.take('a', 0.001, 200) == 0)
+
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(200, len(taken))
+
+    def test_in_flight(self):
+        admission = Admission(self.conf)
+        self.assertTrue(all(admission.enter() for _ in range(5)))
+
+        self.conf.update(admission_max_in_flight=5)
+        self.assertFalse(admission.enter())
+        admission.leave()
+        self.assertTrue(admission.enter())
+        self.assertEqual(5, admission.in_flight)
+        self.assertIn('scoring_api_rejected_total{reason="in_flight"}', metrics.render())
+
+    def test_rate(self):
+        admission = Admission(self.conf)
+        self.assertEqual(0, admission.rate_wait('login'))
+
+        self.conf.update(admission_rate_limit=2.0)
+        self.assertEqual((2.0, 2.0), admission.rate())
+        self.assertEqual([0, 0], [admission.rate_wait('login') for _ in range(2)])
+        self.assertGreater(admission.rate_wait('login'), 0)
+        self.assertEqual(0, admission.rate_wait('other'))
+
+        self.conf.update(admission_rate_burst=10)
+        self.assertEqual((2.0, 10), admission.rate())
+
+    def test_body_size(self):
+        self.conf.update(admission_max_body_size=10)
+        admission = Admission(self.conf)
+        self.assertFalse(admission.too_large(10))
+        self.assertTrue(admission.too_large(11))
+
+        self.conf.update(admission_max_body_size=0)
+        self.assertFalse(admission.too_large(10 ** 9))
+
+    def test_retry_after(self):
+        admission = Admission(self.conf)
+        self.assertEqual(self.conf.admission_retry_after, admission.retry_after())
+        self.assertEqual(1, admission.retry_after(0.01))
+        self.assertEqual(3, admission.retry_after(2.5))
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import unittest
+
+import api
+from api.auth import Authenticator
+from api.configurator import Conf
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+        self.authenticator = Authenticator(self.conf)
+        self.salt = self.conf.salt
+
+    def token(self, account, login):
+        if login == self.conf.admin_login:
+            line = self.conf.admin_login + str(self.conf.admin_salt)
+        else:
+            line = account + login + self.conf.salt
+        return hashlib.sha512(line.encode('utf-8')).hexdigest()
+
+    def test_user_token(self):
+        token = self.token('horns&hoofs', 'h&f')
+        self.assertTrue(self.authenticator.check('horns&hoofs', 'h&f', token))
+        self.assertFalse(self.authenticator.check('horns&hoofs', 'h&f', token[:-1]))
+        self.assertFalse(self.authenticator.check('horns&hoofs', 'h&f', 'токен'))
+
+    def test_admin_token(self):
+        token = self.token('', self.conf.admin_login)
+        self.assertTrue(self.authenticator.check('any', self.conf.admin_login, token))
+        self.assertFalse(self.authenticator.check('any', self.conf.admin_login, ''))
+
+    def test_verified_tokens_are_cached(self):
+        token = self.token('horns&hoofs', 'h&f')
+        self.authenticator.check('horns&hoofs', 'h&f', token)
+        self.authenticator.check('horns&hoofs', 'h&f', token)
+        self.assertEqual(1, self.authenticator.stats()['hits'])
+
+    def test_salt_change_invalidates_cache(self):
+        token = self.token('horns&hoofs', 'h&f')
+        self.assertTrue(self.authenticator.check('horns&hoofs', 'h&f', token))
+
+        self.conf.update(salt=self.salt + '-rotated')
+        self.assertFalse(self.authenticator.check('horns&hoofs', 'h&f', token))
+        self.assertTrue(self.authenticator.check('horns&hoofs', 'h&f', self.token('horns&hoofs', 'h&f')))
+
+
+    def test_salt_change_during_check(self):
+        token = self.token('horns&hoofs', 'h&f')
+        digest = self.authenticator.digest
+
+        def rotate_while_hashing(line):
+            # the reload runs after the check read the old salt and before it caches the token
+            self.conf.update(salt=self.salt + '-rotated')
+            return digest(line)
+
+        self.authenticator.digest = rotate_while_hashing
+        self.assertTrue(self.authenticator.check('horns&hoofs', 'h&f', token))
+        self.authenticator.digest = digest
+
+        self.assertEqual(0, len(self.authenticator.cache))
+        self.assertFalse(self.authenticator.check('horns&hoofs', 'h&f', token))
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
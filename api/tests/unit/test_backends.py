@@ -0,0 +1,145 @@
+import asyncio
+import os
+import time
+import unittest
+
+import redis
+
+import api
+from api.backends import AsyncMemoryBackend
+from api.backends import HashRing
+from api.backends import MemoryBackend
+from api.backends import RedisBackend
+from api.backends import ShardedRedisBackend
+from api.configurator import Conf
+from api.store import KVStore
+
+
+class TestHashRing(unittest.TestCase):
+    def test_keys_are_spread(self):
+        ring = HashRing(['a', 'b', 'c'])
+        counts = [0, 0, 0]
+        for i in range(3000):
+            counts[ring.node(f'i:{i}')] += 1
+        self.assertTrue(all(600 < count < 1400 for count in counts), counts)
+
+    def test_adding_a_node_moves_few_keys(self):
+        keys = [f'uid:{i}' for i in range(3000)]
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+        moved = sum(before.node(key) != after.node(key) for key in keys)
+        self.assertLess(moved, len(keys) * 0.4)
+
+    def test_group(self):
+        ring = HashRing(['a', 'b'])
+        keys = [f'i:{i}' for i in range(20)]
+        groups = ring.group(keys)
+        self.assertEqual(list(range(20)), sorted(i for indexes in groups.values() for i in indexes))
+        self.assertTrue(all(ring.node(keys[i]) == node for node, indexes in groups.items() for i in indexes))
+
+
+class TestMemoryBackend(unittest.TestCase):
+    def test_get_set(self):
+        backend = MemoryBackend()
+        backend.set('key', 1.5)
+        backend.set_many({'a': 'x', 'b': 2}, 100)
+        self.assertEqual('1.5', backend.get('key'))
+        self.assertEqual(['x', None, '2'], backend.mget(['a', 'missing', 'b']))
+        self.assertEqual(-1, backend.ttl('key'))
+        self.assertTrue(0 < backend.ttl('a') <= 100)
+        self.assertEqual(-2, backend.ttl('missing'))
+
+        backend.delete('key')
+        self.assertIsNone(backend.get('key'))
+
+    def test_expiration(self):
+        backend = MemoryBackend()
+        backend.set('key', 'value', 1)
+        backend._data['key'] = ('value', time.monotonic() - 1)
+        self.assertIsNone(backend.get('key'))
+
+    def test_invalid_expire(self):
+        with self.assertRaises(redis.exceptions.ResponseError):
+            MemoryBackend().set('key', 'value', 0)
+
+    def test_max_entries(self):
+        backend = MemoryBackend(max_entries=2)
+        backend.set_many({'a': 1, 'b': 2})
+        backend.set('c', 3)
+        self.assertEqual([None, '2', '3'], backend.mget(['a', 'b', 'c']))
+
+    def test_lock(self):
+        backend = MemoryBackend()
+        self.assertEqual([True, True], backend.lock(['lock:a', 'lock:b'], 'owner', 10))
+        self.assertEqual([False, True], backend.lock(['lock:a', 'lock:c'], 'other', 0.01))
+        # only the owner unlocks, an expired lock is taken again
+        backend.unlock(['lock:a', 'lock:b'], 'other')
+        self.assertEqual(['owner', 'owner'], backend.mget(['lock:a', 'lock:b']))
+        backend.unlock(['lock:a'], 'owner')
+        time.sleep(0.02)
+        self.assertEqual([True, False, True], backend.lock(['lock:a', 'lock:b', 'lock:c'], 'other', 10))
+
+    def test_take_tokens(self):
+        backend = MemoryBackend()
+        self.assertEqual([0, 0], [backend.take_tokens('rate:a', 10, 2) for _ in range(2)])
+        self.assertAlmostEqual(0.1, backend.take_tokens('rate:a', 10, 2), places=2)
+        self.assertEqual(0, backend.take_tokens('rate:b', 10, 2))
+
+    def test_async(self):
+        async def run():
+            backend = AsyncMemoryBackend()
+            await backend.set_many({'a': 1}, 10)
+            return await backend.mget(['a', 'b'])
+
+        self.assertEqual(['1', None], asyncio.run(run()))
+
+    def test_store(self):
+        store = KVStore(conf=Conf(), backend='memory')
+        store.set_many({'i:1': '["cars"]'}, 100)
+        self.assertEqual(['["cars"]', None], store.get_many(['i:1', 'i:2']))
+
+
+@unittest.skipIf(Conf().store_backend == 'memory', 'needs a redis server')
+class TestShardedRedisBackend(unittest.TestCase):
+    def setUp(self):
+        conf = Conf()
+        self.shards = [RedisBackend(decode_responses=True, **shard) for shard in conf.redis_shards]
+        self.backend = ShardedRedisBackend(self.shards)
+
+    def test_keys_are_spread_over_shards(self):
+        keys = [f'test_shard:{i}' for i in range(20)]
+        self.backend.set_many({key: i for i, key in enumerate(keys)}, 100)
+
+        self.assertEqual([str(i) for i in range(20)], self.backend.mget(keys))
+        for key in keys:
+            owner = self.backend.shard(key)
+            self.assertEqual([owner], [shard for shard in self.shards if shard.get(key) is not None])
+        self.assertTrue(all(shard.mget(keys).count(None) < len(keys) for shard in self.shards))
+
+    def test_lock(self):
+        keys = [f'test_shard:lock:{i}' for i in range(10)]
+        self.backend.delete(*keys)
+        self.assertEqual([True] * 10, self.backend.lock(keys, 'owner', 10))
+        self.assertEqual([False] * 10, self.backend.lock(keys, 'other', 10))
+        self.backend.unlock(keys, 'other')
+        self.assertEqual(['owner'] * 10, self.backend.mget(keys))
+        self.backend.unlock(keys, 'owner')
+        self.assertEqual([None] * 10, self.backend.mget(keys))
+
+    def test_take_tokens(self):
+        self.backend.delete('test_shard:rate:a')
+        self.assertEqual([0, 0], [self.backend.take_tokens('test_shard:rate:a', 10, 2) for _ in range(2)])
+        self.assertAlmostEqual(0.1, self.backend.take_tokens('test_shard:rate:a', 10, 2), places=2)
+        # the bucket lives on the shard of its key and expires once it would be full again
+        self.assertTrue(0 < self.backend.shard('test_shard:rate:a').client.pttl('test_shard:rate:a') <= 1200)
+
+    def test_store(self):
+        store = KVStore(conf=Conf(), backend='sharded')
+        store.set('test_shard:key', 'value', 100)
+        self.assertEqual('value', store.get('test_shard:key'))
+        self.assertEqual('value', store.backend.shard('test_shard:key').get('test_shard:key'))
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import signal
+import tempfile
+import urllib.request
+import unittest
+
+import api
+from api.benchmarks.load import LocalServer
+from api.benchmarks.load import run_load
+from api.benchmarks.micro import run_micro
+from api.benchmarks.report import compare_reports
+from api.benchmarks.report import make_report
+from api.benchmarks.report import percentile
+from api.benchmarks.startup import run_startup
+from api.benchmarks.workload import Workload
+from api.benchmarks.workload import parse_mix
+from api.configurator import Conf
+from api.metrics import metrics
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(100, percentile(values, 100))
+        self.assertEqual(0.0, percentile([], 50))
+
+    def test_compare_reports(self):
+        baseline = make_report('load', {'all': {'rps': 1000, 'p99_ms': 10}})
+        faster = make_report('load', {'all': {'rps': 1050, 'p99_ms': 9}})
+        slower = make_report('load', {'all': {'rps': 800, 'p99_ms': 10}})
+
+        self.assertFalse(compare_reports(baseline, faster, threshold=0.1)[1])
+        lines, regressed = compare_reports(baseline, slower, threshold=0.1)
+        self.assertTrue(regressed)
+        self.assertIn('REGRESSION', lines[0])
+
+    def test_workload_is_reproducible(self):
+        mix = parse_mix('online_score=0.5,clients_interests=0.5')
+        first = Workload(self.conf, mix, seed=1).stream(0, 20)
+        second = Workload(self.conf, mix, seed=1).stream(0, 20)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, Workload(self.conf, mix, seed=1).stream(1, 20))
+        self.assertEqual({'online_score', 'clients_interests'}, {method for method, _ in first})
+
+    def test_unknown_method_in_mix(self):
+        with self.assertRaises(ValueError):
+            parse_mix('online_score=0.5,unknown=0.5')
+
+    def test_micro(self):
+        results = run_micro(self.conf, number=10, repeat=1, selected='field.')
+        self.assertIn('field.BirthDayField', results)
+        self.assertTrue(all(item['ops_per_sec'] > 0 for item in results.values()))
+
+    def test_load_in_memory(self):
+        workload = Workload(self.conf, parse_mix('online_score=0.7,clients_interests=0.3'))
+        results, _ = run_load(self.conf, workload, store='memory', threads=2,
+                              concurrency=2, requests=20, warmup=0)
+
+        self.assertEqual(40, results['all']['requests'])
+        self.assertEqual(0, results['all']['errors'])
+        self.assertLessEqual(results['all']['p50_ms'], results['all']['p99_ms'])
+
+    def test_local_server(self):
+        handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+        with LocalServer(self.conf, threads=2, store='memory') as server:
+            with urllib.request.urlopen(server.url + '/metrics', timeout=5) as response:
+                body = response.read().decode('utf8')
+            store = server.server.store
+
+        # the store is opened by the server, with its health check and metrics
+        self.assertEqual('memory', store.backend_name)
+        self.assertIn('scoring_api_redis_up', body)
+        self.assertEqual(handlers, {signum: signal.getsignal(signum) for signum in handlers})
+        self.assertNotIn(store.collect_metrics, metrics._collectors)
+
+    def test_startup(self):
+        # the log of the started server goes nowhere
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+            f.write("log_file_path: ''\n")
+        self.addCleanup(os.unlink, f.name)
+
+        results = run_startup(('threaded',), config=f.name, repeat=1)['startup.threaded']
+        self.assertLessEqual(results['listening_ms'], results['ready_ms'])
+        # a start taking seconds means something heavy came back on the import path
+        self.assertLess(results['ready_ms'], 5000)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
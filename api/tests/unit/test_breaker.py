@@ -0,0 +1,73 @@
+import os
+import time
+import unittest
+
+import api
+from api.breaker import CircuitBreaker
+
+
+class TestSuite(unittest.TestCase):
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(1, breaker.rejected)
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        breaker.half_open()
+
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+        breaker.open()
+        breaker.half_open()
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertEqual(2, breaker.opened)
+
+    def test_released_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        breaker.half_open()
+        self.assertTrue(breaker.allow())
+
+        breaker.release()
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        self.assertTrue(breaker.allow())
+
+    def test_reset_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
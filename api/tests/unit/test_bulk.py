@@ -0,0 +1,114 @@
+import io
+import os
+import random
+import unittest
+
+import api
+from api.bulk.files import ResultWriter
+from api.bulk.files import read_chunks
+from api.bulk.scoring import BulkScorer
+from api.bulk.scoring import compute_scores
+from api.bulk.scoring import score_keys
+from api.configurator import Conf
+from api.method.scoring import SCORE_ARGUMENTS
+from api.method.scoring import ScoringModels
+from api.method.validators import OnlineScoreValidator
+from api.method.views import MethodView
+from api.store import KVStore
+
+
+def random_rows(number: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    values = {
+        'phone': [None, '', '79175002040', 79175002041],
+        'email': [None, '', 'stupnikov@otus.ru', 'otus@otus.ru'],
+        'birthday': [None, '', '01.01.2000', '01.01.1890'],
+        'gender': [None, 1, 2, 3, 7],
+        'first_name': [None, '', 'Ann', 'Bob'],
+        'last_name': [None, '', 'Lee'],
+    }
+    return [{name: rnd.choice(choices) for name, choices in values.items()} for _ in range(number)]
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+
+    def test_same_as_get_score(self):
+        rows = random_rows(500)
+        view = MethodView(self.conf, store=KVStore(self.conf, backend='memory'))
+        expected = []
+        for i, row in enumerate(rows):
+            if OnlineScoreValidator(conf=self.conf).validate(row).is_valid:
+                expected.append({'id': i, 'score': view.get_score(**row)})
+            else:
+                expected.append({'id': i, 'errors': list(OnlineScoreValidator(conf=self.conf).validate(row).errors)})
+
+        store = KVStore(self.conf, backend='memory')
+        scorer = BulkScorer(self.conf, store=store)
+        results = [result for start in range(0, len(rows), 64) for result in scorer.score(rows[start:start + 64])]
+
+        self.assertEqual(expected, results)
+        self.assertEqual([type(result.get('score')) for result in expected],
+                         [type(result.get('score')) for result in results])
+        self.assertEqual(sum('errors' in result for result in expected), scorer.invalid)
+        self.assertGreater(scorer.cached, 0)
+        keys = score_keys({name: [row[name] for row in rows] for name in SCORE_ARGUMENTS}, scorer.model)
+        self.assertEqual(view.store.get_many(keys), store.get_many(keys))
+
+    def test_without_numpy(self):
+        rows = random_rows(200, seed=1)
+        columns = {name: [row[name] for row in rows] for name in SCORE_ARGUMENTS}
+        model = ScoringModels(self.conf).get()
+        expected = [float(model.score(row)) for row in rows]
+
+        for use_numpy in (True, False):
+            scores = compute_scores(columns, model, use_numpy=use_numpy)
+            self.assertEqual(expected, scores)
+            self.assertTrue(all(type(score) is float for score in scores), scores)
+        self.assertEqual([model.key(row) for row in rows], score_keys(columns, model))
+
+    def test_empty_score_same_as_get_score(self):
+        # the only feature of the model is missing from the rows, every score is empty
+        self.conf.update(scoring_models={'v1': {'features': [{'arguments': ['first_name', 'last_name'], 'weight': 1}]}})
+        rows = [{'phone': '79175002040', 'email': 'stupnikov@otus.ru'}]
+        view = MethodView(self.conf, store=KVStore(self.conf, backend='memory'))
+        scorer = BulkScorer(self.conf, store=KVStore(self.conf, backend='memory'))
+
+        online = view.get_score(**rows[0])
+        self.assertEqual([{'id': 0, 'score': online}], scorer.score(rows))
+        self.assertIs(float, type(scorer.score(rows)[0]['score']))
+        self.assertIs(float, type(online))
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            BulkScorer(self.conf, store=KVStore(self.conf, backend='memory'), model='unknown')
+
+    def test_read_chunks(self):
+        csv_file = io.StringIO('id,phone,email,gender\n1,79175002040,a@b.ru,\n2,,,2\n3,,,\n')
+        chunks = list(read_chunks(csv_file, 'csv', chunk_size=2))
+        self.assertEqual([
+            [{'id': '1', 'phone': '79175002040', 'email': 'a@b.ru'}, {'id': '2', 'gender': 2}],
+            [{'id': '3'}],
+        ], chunks)
+
+        ndjson_file = io.StringIO('{"phone": 79175002040}\n\n{"gender": 1}\n')
+        self.assertEqual([[{'phone': 79175002040}, {'gender': 1}]], list(read_chunks(ndjson_file, 'ndjson')))
+
+        with self.assertRaises(ValueError):
+            list(read_chunks(io.StringIO(''), 'xml'))
+
+    def test_result_writer(self):
+        results = [{'id': 1, 'score': 3.0}, {'id': 2, 'errors': ['a', 'b']}]
+        output = io.StringIO()
+        ResultWriter(output, 'csv').write(results)
+        self.assertEqual('id,score,errors\r\n1,3.0,\r\n2,,a; b\r\n', output.getvalue())
+
+        output = io.StringIO()
+        ResultWriter(output, 'ndjson').write(results)
+        self.assertEqual('{"id": 1, "score": 3.0}\n{"id": 2, "errors": ["a", "b"]}\n', output.getvalue())
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+from api.cache import LocalCache
+from api.cache import MISSING
+
+
+class TestSuite(unittest.TestCase):
+    def test_get_set(self):
+        cache = LocalCache(max_entries=10, ttl=60)
+        self.assertIs(MISSING, cache.get('key'))
+        cache.set('key', 'value')
+        self.assertEqual('value', cache.get('key'))
+        self.assertEqual({'entries': 1, 'hits': 1, 'misses': 1, 'evictions': 0}, cache.stats())
+
+    def test_ttl(self):
+        cache = LocalCache(max_entries=10, ttl=0.05)
+        cache.set('key', 'value')
+        time.sleep(0.06)
+        self.assertIs(MISSING, cache.get('key'))
+        self.assertEqual(0, len(cache))
+
+    def test_ex_shortens_ttl(self):
+        cache = LocalCache(max_entries=10, ttl=60)
+        cache.set('key', 'value', ex=0.05)
+        time.sleep(0.06)
+        self.assertIs(MISSING, cache.get('key'))
+
+    def test_lru_eviction(self):
+        cache = LocalCache(max_entries=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(1, cache.get('a'))
+        self.assertIs(MISSING, cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(1, cache.stats()['evictions'])
+
+    def test_concurrent_access(self):
+        cache = LocalCache(max_entries=100, ttl=60)
+
+        def work(i):
+            cache.set(i % 150, i)
+            cache.get((i * 7) % 150)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(work, range(5000)))
+
+        self.assertLessEqual(len(cache), 100)
+        self.assertEqual(5000, cache.hits + cache.misses)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,214 @@
+import functools
+import gc
+import io
+import os
+import signal
+import tempfile
+import time
+import unittest
+
+import api
+from api.configurator import SETTINGS
+from api.configurator import Conf
+from api.server import install_config_reload
+
+
+def cases(cases_items):
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args):
+            for c in cases_items:
+                new_args = args + (c if isinstance(c, tuple) else (c,))
+                f(*new_args)
+
+        return wrapper
+
+    return decorator
+
+
+class Listener:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, snapshot, changed):
+        self.calls.append((snapshot, changed))
+
+    def method(self, snapshot, changed):
+        self.calls.append((snapshot, changed))
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+
+    def config_file(self, text):
+        f = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+        self.addCleanup(os.unlink, f.name)
+        f.write(text)
+        f.close()
+        return f.name
+
+    def rewrite(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+        # a distinct mtime even on coarse clocks
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 1))
+
+    def test_snapshot_is_read_only(self):
+        snapshot = self.conf.snapshot
+        with self.assertRaises(AttributeError):
+            snapshot.salt = 'changed'
+        with self.assertRaises(AttributeError):
+            snapshot.unknown = 1
+        with self.assertRaises(AttributeError):
+            self.conf.unknown
+
+        self.assertEqual(snapshot.salt, self.conf.salt)
+        self.assertFalse(hasattr(snapshot, '__dict__'))
+
+    def test_update_swaps_snapshot(self):
+        snapshot = self.conf.snapshot
+        changed = self.conf.update(salt='rotated', redis_port=snapshot.redis_port)
+
+        self.assertEqual(frozenset({'salt'}), changed)
+        self.assertEqual('rotated', self.conf.salt)
+        self.assertNotEqual('rotated', snapshot.salt)
+
+    @cases([
+        {'redis_port': 'none'},
+        {'redis_port': True},
+        {'redis_reconnect_try': 1},
+        {'server_threads': 1.5},
+        {'server_keepalive_timeout': '2.5'},
+        {'salt': None},
+        {'redis_replicas': {}},
+        {'store_backend': 'unknown'},
+        {'unknown': 1},
+    ])
+    def test_invalid_update(self, values):
+        snapshot = self.conf.snapshot
+        with self.assertRaises(ValueError):
+            self.conf.update(**values)
+        self.assertIs(snapshot, self.conf.snapshot)
+
+    def test_valid_types(self):
+        # an int is a float, null defaults take anything
+        self.conf.update(write_behind_flush_interval=1, scoring_models_file='models.yaml')
+        self.assertEqual(1, self.conf.write_behind_flush_interval)
+
+    def test_every_setting_is_checked(self):
+        self.assertEqual([], sorted(set(self.conf.snapshot.as_dict()) - set(SETTINGS)))
+
+    def test_lenient_values(self):
+        path = self.config_file(
+            "redis_reconnect_timeout: 0.5\n"
+            "server_keepalive_timeout: 2.5\n"
+            "redis_pool_timeout: 0.2\n"
+            "admission_rate_burst: 2.5\n"
+            "admin_salt: 's3cret'\n"
+            "log_file_path: null\n"
+            "redis_port: '6380'\n"
+            "server_threads: 8.0\n"
+        )
+        with open(path) as f:
+            conf = Conf(f)
+
+        self.assertEqual(0.5, conf.redis_reconnect_timeout)
+        self.assertEqual(2.5, conf.server_keepalive_timeout)
+        self.assertEqual(0.2, conf.redis_pool_timeout)
+        self.assertEqual(2.5, conf.admission_rate_burst)
+        self.assertEqual('s3cret', conf.admin_salt)
+        self.assertIsNone(conf.log_file_path)
+        # ports and counts are kept as ints
+        self.assertEqual(6380, conf.redis_port)
+        self.assertIs(int, type(conf.redis_port))
+        self.assertIs(int, type(conf.server_threads))
+
+    def test_listeners(self):
+        everything, salts = Listener(), Listener()
+        self.conf.subscribe(everything)
+        self.conf.subscribe(salts, ('salt', 'admin_salt'))
+
+        self.conf.update(redis_db=5)
+        self.conf.update(salt='rotated')
+        self.conf.update(salt='rotated')
+
+        self.assertEqual([frozenset({'redis_db'}), frozenset({'salt'})], [changed for _, changed in everything.calls])
+        self.assertEqual([(self.conf.snapshot, frozenset({'salt'}))], salts.calls)
+
+        self.conf.unsubscribe(salts)
+        self.conf.update(salt='rotated again')
+        self.assertEqual(1, len(salts.calls))
+
+    def test_failing_listener(self):
+        listener = Listener()
+        self.conf.subscribe(lambda snapshot, changed: 1 / 0)
+        self.conf.subscribe(listener)
+
+        self.conf.update(salt='rotated')
+        self.assertEqual('rotated', self.conf.salt)
+        self.assertEqual(1, len(listener.calls))
+
+    def test_methods_are_held_weakly(self):
+        listener = Listener()
+        self.conf.subscribe(listener.method)
+        del listener
+        gc.collect()
+
+        self.conf.update(salt='rotated')
+        self.assertEqual([], self.conf._listeners)
+
+    def test_reload(self):
+        path = self.config_file("salt: 'first'\n")
+        with open(path) as f:
+            conf = Conf(f)
+        self.assertEqual('first', conf.salt)
+
+        self.rewrite(path, "salt: 'second'\n")
+        self.assertTrue(conf.reload())
+        self.assertEqual('second', conf.salt)
+
+        # an invalid config keeps the current one
+        for text in ("redis_port: 'none'\n", "salt: [\n"):
+            self.rewrite(path, text)
+            self.assertFalse(conf.reload())
+            self.assertEqual('second', conf.salt)
+
+    def test_reload_keeps_stream_without_file(self):
+        conf = Conf(io.StringIO("salt: 'streamed'\n"))
+        self.assertTrue(conf.reload())
+        self.assertEqual('streamed', conf.salt)
+
+    def test_watch(self):
+        path = self.config_file("salt: 'first'\n")
+        with open(path) as f:
+            conf = Conf(f)
+        conf.watch(0.01)
+        self.addCleanup(conf.stop_watch)
+
+        self.rewrite(path, "salt: 'second'\n")
+        deadline = time.monotonic() + 5
+        while conf.salt != 'second' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual('second', conf.salt)
+
+    @unittest.skipIf(not hasattr(signal, 'SIGHUP'), 'no SIGHUP on this platform')
+    def test_sighup(self):
+        path = self.config_file("salt: 'first'\n")
+        with open(path) as f:
+            conf = Conf(f)
+        self.addCleanup(signal.signal, signal.SIGHUP, signal.getsignal(signal.SIGHUP))
+        install_config_reload(conf)
+
+        self.rewrite(path, "salt: 'second'\n")
+        os.kill(os.getpid(), signal.SIGHUP)
+        deadline = time.monotonic() + 5
+        while conf.salt != 'second' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual('second', conf.salt)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,81 @@
+import functools
+import os
+import unittest
+from datetime import date
+from datetime import datetime
+
+import api
+from api.base.dates import MAX_CACHED_DATE_LENGTH
+from api.base.dates import DaysAgo
+from api.base.dates import _parse_date_cached
+from api.base.dates import compile_date_format
+from api.base.dates import max_date_length
+from api.base.dates import parse_date
+
+
+def cases(cases_items):
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args):
+            for c in cases_items:
+                new_args = args + (c if isinstance(c, tuple) else (c,))
+                f(*new_args)
+
+        return wrapper
+
+    return decorator
+
+
+class TestSuite(unittest.TestCase):
+    @cases([
+        '01.02.1990', '1.2.1990', ' 1.02.1990', '31.12.2000', '29.02.2000',
+        '29.02.1999', '32.01.1990', '01.13.1990', '00.01.1990', '01.01.90', '01.01.19900',
+        '01-01-1990', '01.01.1990 ', '', 'text', '١٢.٠١.١٩٩٠',
+    ])
+    def test_same_as_strptime(self, data):
+        for date_format in ('%d.%m.%Y', '%Y-%m-%d', '%d.%m.%Y %H'):
+            try:
+                expected = datetime.strptime(data, date_format)
+            except ValueError:
+                expected = ValueError
+
+            try:
+                self.assertEqual(expected, parse_date(data, date_format), (data, date_format))
+            except ValueError:
+                self.assertIs(ValueError, expected, (data, date_format))
+
+    def test_compiled_formats(self):
+        self.assertIsNotNone(compile_date_format('%d.%m.%Y'))
+        self.assertIsNotNone(compile_date_format('%Y%m%d'))
+        self.assertIsNone(compile_date_format('%d %m %Y'))
+        self.assertIsNone(compile_date_format('%d.%m.%y'))
+        self.assertIsNone(compile_date_format('%d.%d.%Y'))
+
+    def test_long_strings_are_not_cached(self):
+        self.assertEqual(10, max_date_length('%d.%m.%Y'))
+        self.assertEqual(MAX_CACHED_DATE_LENGTH, max_date_length('%d.%m.%Y %H'))
+
+        _parse_date_cached.cache_clear()
+        parse_date('01.01.1990', '%d.%m.%Y')
+        for data in ('1' * 11, '01.01.1990' + ' ' * 1000):
+            with self.assertRaises(ValueError):
+                parse_date(data, '%d.%m.%Y')
+        self.assertEqual(1, _parse_date_cached.cache_info().currsize)
+
+    def test_not_a_string(self):
+        with self.assertRaises(TypeError):
+            parse_date(19900101, '%d.%m.%Y')
+
+    def test_days_ago(self):
+        now = [datetime(2020, 3, 1, 23, 59, 59).timestamp()]
+        days_ago = DaysAgo(clock=lambda: now[0])
+        self.assertEqual(date(2020, 2, 29), days_ago(1))
+        self.assertEqual(date(2019, 3, 2), days_ago(365))
+
+        now[0] += 1
+        self.assertEqual(date(2020, 3, 1), days_ago(1))
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,62 @@
+import functools
+import gzip
+import json
+import os
+import unittest
+
+import api
+from api.encoder import ENCODERS
+from api.encoder import accepts_gzip
+from api.encoder import compress
+
+
+def cases(cases_items):
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args):
+            for c in cases_items:
+                new_args = args + (c if isinstance(c, tuple) else (c,))
+                f(*new_args)
+
+        return wrapper
+
+    return decorator
+
+
+class TestSuite(unittest.TestCase):
+    @cases([
+        ('gzip', True),
+        ('deflate, GZIP;q=0.5', True),
+        ('br;q=1.0, *;q=0.1', True),
+        ('x-gzip', True),
+        (None, False),
+        ('', False),
+        ('deflate, br', False),
+        ('gzip;q=0', False),
+        ('gzip; q=0.000', False),
+        ('*;q=1, gzip;q=0', False),
+        ('gzip;q=bad', False),
+    ])
+    def test_accepts_gzip(self, accept_encoding, accepted):
+        self.assertEqual(accepted, accepts_gzip(accept_encoding), accept_encoding)
+
+    def test_encoders_agree(self):
+        response = {'code': 200, 'response': {1: ['cars'], 10 ** 30: ['pets']}}
+        for name, encode in ENCODERS.items():
+            self.assertEqual({'1': ['cars'], str(10 ** 30): ['pets']},
+                             json.loads(encode(response))['response'], name)
+
+    def test_compress(self):
+        payload = b'{"response": "' + b'x' * 100 + b'"}'
+        body, encoding = compress(payload, 'gzip', min_size=10)
+        self.assertEqual('gzip', encoding)
+        self.assertEqual(payload, gzip.decompress(body))
+
+        self.assertEqual((payload, None), compress(payload, 'gzip;q=0', min_size=10))
+        self.assertEqual((payload, None), compress(payload, 'gzip', min_size=1000))
+        self.assertEqual((payload, None), compress(payload, 'gzip', min_size=-1))
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,48 @@
+import logging
+import os
+import queue
+import unittest
+
+import api
+from api.logger import DroppingQueueHandler
+from api.logger import RateLimitFilter
+
+
+class TestSuite(unittest.TestCase):
+    @staticmethod
+    def record(name, msg, *args):
+        return logging.LogRecord(name, logging.INFO, __file__, 0, msg, args, None)
+
+    def test_rate_limit_per_template(self):
+        rate_limit = RateLimitFilter({'scoring_api.Field': 5})
+        passed = [rate_limit.filter(self.record('scoring_api.Field', 'field "%s"', i)) for i in range(20)]
+
+        self.assertEqual(5, sum(passed))
+        self.assertEqual(15, rate_limit.dropped)
+        self.assertTrue(rate_limit.filter(self.record('scoring_api.Field', 'other "%s"', 1)))
+
+    def test_rate_limit_ignores_other_loggers(self):
+        rate_limit = RateLimitFilter({'scoring_api.Field': 1})
+        self.assertTrue(all(rate_limit.filter(self.record('scoring_api.View', 'view')) for _ in range(10)))
+
+    def test_queue_handler_does_not_block(self):
+        log_queue = queue.Queue(2)
+        queue_handler = DroppingQueueHandler(log_queue)
+        for i in range(5):
+            queue_handler.handle(self.record('scoring_api', 'message %s', i))
+
+        self.assertEqual(2, log_queue.qsize())
+        self.assertEqual(3, queue_handler.dropped)
+
+    def test_queue_handler_defers_formatting(self):
+        log_queue = queue.Queue()
+        DroppingQueueHandler(log_queue).handle(self.record('scoring_api', 'message %s', 1))
+
+        record = log_queue.get_nowait()
+        self.assertEqual('message %s', record.msg)
+        self.assertEqual('message 1', record.getMessage())
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import threading
+import unittest
+
+import api
+from api.metrics import Metrics
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1.0))
+        self.metrics.describe('requests_total', 'counter', 'Requests')
+
+    def test_counter(self):
+        self.metrics.inc('requests_total', code='200')
+        self.metrics.inc('requests_total', 2, code='200')
+        self.metrics.inc('requests_total', code='404')
+
+        body = self.metrics.render()
+        self.assertIn('# HELP requests_total Requests\n# TYPE requests_total counter\n', body)
+        self.assertIn('requests_total{code="200"} 3\n', body)
+        self.assertIn('requests_total{code="404"} 1\n', body)
+
+    def test_histogram(self):
+        for value in (0.05, 0.1, 0.5, 5):
+            self.metrics.observe('latency_seconds', value)
+
+        body = self.metrics.render()
+        self.assertIn('# TYPE latency_seconds histogram\n', body)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2\n', body)
+        self.assertIn('latency_seconds_bucket{le="1"} 3\n', body)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4\n', body)
+        self.assertIn('latency_seconds_sum 5.65\n', body)
+        self.assertIn('latency_seconds_count 4\n', body)
+
+    def test_threads_are_merged(self):
+        def work():
+            for _ in range(1000):
+                self.metrics.inc('requests_total')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIn('requests_total 4000\n', self.metrics.render())
+
+    def test_collector(self):
+        def collector():
+            return [('cache_entries', 'gauge', 'Entries', [({'prefix': 'uid:'}, 3)])]
+
+        self.metrics.register_collector(collector)
+        self.assertIn('cache_entries{prefix="uid:"} 3\n', self.metrics.render())
+
+        self.metrics.unregister_collector(collector)
+        self.assertNotIn('cache_entries', self.metrics.render())
+
+    def test_label_escaping(self):
+        self.metrics.inc('requests_total', path='a"b\\c')
+        self.assertIn('requests_total{path="a\\"b\\\\c"} 1\n', self.metrics.render())
+
+    def test_reset(self):
+        self.metrics.inc('requests_total')
+        self.metrics.reset()
+        self.assertNotIn('requests_total ', self.metrics.render())
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
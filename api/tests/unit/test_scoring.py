@@ -0,0 +1,97 @@
+import functools
+import os
+import unittest
+
+import api
+from api.configurator import Conf
+from api.method.scoring import ScoringModel
+from api.method.scoring import ScoringModels
+
+FEATURES = [
+    {'arguments': ['phone'], 'weight': 1.5},
+    {'arguments': ['email'], 'weight': 1.5},
+    {'arguments': ['birthday', 'gender'], 'weight': 1.5},
+    {'arguments': ['first_name', 'last_name'], 'weight': 0.5},
+]
+
+
+def cases(cases_items):
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args):
+            for c in cases_items:
+                new_args = args + (c if isinstance(c, tuple) else (c,))
+                f(*new_args)
+
+        return wrapper
+
+    return decorator
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+
+    @cases([
+        ({}, 0),
+        ({'phone': '79175002040', 'email': 'stupnikov@otus.ru'}, 3.0),
+        ({'phone': 79175002040, 'email': '', 'gender': 1}, 1.5),
+        ({'gender': 1, 'birthday': '01.01.2000'}, 1.5),
+        ({'gender': 0, 'birthday': '01.01.2000'}, 0),
+        ({'first_name': 'a', 'last_name': 'b', 'phone': '7', 'email': 'e', 'gender': 2, 'birthday': '1'}, 5.0),
+    ])
+    def test_score(self, arguments, expected):
+        score = ScoringModel('v1', FEATURES).score(arguments)
+        self.assertEqual(expected, score, arguments)
+        self.assertIs(type(expected), type(score), arguments)
+
+    def test_table(self):
+        model = ScoringModel('v1', FEATURES)
+        self.assertEqual(('phone', 'email', 'birthday', 'gender', 'first_name', 'last_name'), model.arguments)
+        self.assertEqual(64, len(model.table))
+        self.assertEqual(1.5, model.table[0b001100])
+        self.assertEqual(0, model.table[0b000100])
+
+    def test_key(self):
+        arguments = {'phone': 79175002040, 'birthday': '01.01.2000', 'first_name': 'a', 'email': 'e'}
+        first, second = ScoringModel('v1', FEATURES), ScoringModel('v2', FEATURES)
+        self.assertTrue(first.key(arguments).startswith('uid:v1:'))
+        self.assertEqual(first.key(arguments)[7:], second.key(arguments)[7:])
+        # the email and the gender are not part of the key
+        self.assertEqual(first.key(arguments), first.key({**arguments, 'phone': '79175002040', 'email': None}))
+
+    @cases([
+        [{'arguments': ['unknown'], 'weight': 1}],
+        [{'arguments': [], 'weight': 1}],
+        [{'arguments': ['phone'], 'weight': '1'}],
+        [{'arguments': ['phone']}],
+    ])
+    def test_invalid_features(self, features):
+        with self.assertRaises(ValueError):
+            ScoringModel('v1', features)
+
+    def test_models(self):
+        self.conf.update(scoring_models={'v1': {'features': FEATURES}, 'v2': {'features': FEATURES[:1]}})
+
+        models = ScoringModels(self.conf)
+        self.assertEqual('v1', models.get().version)
+        self.assertEqual('v2', models.get('v2').version)
+        self.assertIsNone(models.get('v3'))
+
+        # a swapped in config is compiled at once
+        self.conf.update(scoring_default_model='v2')
+        self.assertEqual('v2', models.get().version)
+
+        # an invalid one keeps the models in use
+        self.conf.update(scoring_models={'v1': {'features': [{'arguments': ['unknown'], 'weight': 1}]}})
+        self.assertEqual('v2', models.get().version)
+
+    def test_invalid_default_model(self):
+        self.conf.update(scoring_default_model='unknown')
+        with self.assertRaises(ValueError):
+            ScoringModels(self.conf)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
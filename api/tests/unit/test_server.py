@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+import api
+from api.admission import Admission
+from api.auth import Authenticator
+from api.configurator import Conf
+from api.method.scoring import ScoringModels
+from api.server import ThreadPoolHTTPServer
+from api.store import KVStore
+from api.warmup import WarmUp
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    def __init__(self, *args, conf: Conf, store: KVStore, authenticator: Authenticator, models: ScoringModels,
+                 warmup: WarmUp, admission: Admission, **kwargs) -> None:
+        self.conf = conf
+        self.store = store
+        self.authenticator = authenticator
+        self.models = models
+        self.warmup = warmup
+        self.admission = admission
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self) -> None:
+        time.sleep(0.2)
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(threading.current_thread().name.encode('utf8'))
+
+    def log_message(self, *args) -> None:
+        ...
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+        self.server = ThreadPoolHTTPServer(('127.0.0.1', 0), SlowHandler, conf=self.conf, threads=4, queue_size=4)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def get(self, _=None):
+        with urllib.request.urlopen(self.url, timeout=5) as response:
+            return response.read().decode('utf8')
+
+    def test_requests_are_handled_concurrently(self):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            names = list(executor.map(self.get, range(4)))
+
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertTrue(all(name.startswith('scoring_api') for name in names), names)
+
+    def test_pool_is_bounded(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            names = set(executor.map(self.get, range(8)))
+
+        self.assertLessEqual(len(names), 4)
+
+    def test_full_queue_is_refused(self):
+        self.conf.update(admission_max_in_flight=1)
+        server = ThreadPoolHTTPServer(('127.0.0.1', 0), SlowHandler, conf=self.conf, threads=1, queue_size=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_address[1]}/'
+
+        def get(_):
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    return response.status, None
+            except urllib.error.HTTPError as e:
+                return e.code, e.headers['Retry-After']
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(get, range(3)))
+
+        self.assertIn((200, None), results)
+        self.assertIn((503, str(self.conf.admission_retry_after)), results)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+
+import api
+from api.configurator import Conf
+from api.singleflight import AsyncSingleFlight
+from api.singleflight import SingleFlight
+from api.store import LOCK_PREFIX
+from api.store import AsyncKVStore
+from api.store import KVStore
+
+
+class Loader:
+    def __init__(self) -> None:
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def load(self, keys):
+        self.calls.append(list(keys))
+        self.started.set()
+        self.release.wait()
+        return {key: f'value of {key}' for key in keys}
+
+    async def async_load(self, keys):
+        self.calls.append(list(keys))
+        await asyncio.sleep(0.01)
+        return {key: f'value of {key}' for key in keys}
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+
+    def test_concurrent_loads_are_shared(self):
+        loader = Loader()
+        loader.release.clear()
+        flights = SingleFlight()
+        results = []
+
+        def call(keys):
+            results.append(flights.do(keys, loader.load))
+
+        leader = threading.Thread(target=call, args=(['a', 'b'],))
+        leader.start()
+        loader.started.wait(5)
+        followers = [threading.Thread(target=call, args=(['b', 'c', 'c'],)) for _ in range(2)]
+        for thread in followers:
+            thread.start()
+        # the followers lead 'c' one after the other and wait for 'b'
+        deadline = time.monotonic() + 5
+        while flights.coalesced < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        loader.release.set()
+        for thread in (leader, *followers):
+            thread.join()
+
+        self.assertEqual(['a', 'b'], loader.calls[0])
+        self.assertEqual(1, sum(1 for keys in loader.calls if 'b' in keys))
+        self.assertEqual({'a', 'b'}, set(results[0]))
+        self.assertTrue(all(result['b'] == 'value of b' and set(result) == {'b', 'c'} for result in results[1:]))
+        self.assertEqual(0, len(flights))
+
+    def test_errors_are_shared(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def fail(keys):
+            started.set()
+            release.wait()
+            raise ValueError('load failed')
+
+        def call():
+            try:
+                flights.do(['a'], fail)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call)]
+        threads[0].start()
+        started.wait(5)
+        threads.append(threading.Thread(target=call))
+        threads[1].start()
+        deadline = time.monotonic() + 5
+        while flights.coalesced < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(2, len(errors))
+        self.assertEqual(0, len(flights))
+
+    def test_async_loads_are_shared(self):
+        loader = Loader()
+        flights = AsyncSingleFlight()
+
+        async def run():
+            return await asyncio.gather(*(flights.do(['a', 'b'], loader.async_load) for _ in range(5)))
+
+        results = asyncio.run(run())
+        self.assertEqual([['a', 'b']], loader.calls)
+        self.assertEqual(8, flights.coalesced)
+        self.assertTrue(all(result == {'a': 'value of a', 'b': 'value of b'} for result in results))
+        self.assertEqual(0, len(flights))
+
+    def test_async_leader_cancelled(self):
+        loader = Loader()
+        flights = AsyncSingleFlight()
+
+        async def run():
+            leader = asyncio.ensure_future(flights.do(['a'], loader.async_load))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.do(['a'], loader.async_load))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual({'a': 'value of a'}, asyncio.run(run()))
+        self.assertEqual(1, len(loader.calls))
+
+    def test_store_fills_once(self):
+        store = KVStore(conf=self.conf)
+        self.addCleanup(store.close)
+        store.backend.delete('test_flight')
+        computed = []
+        release = threading.Event()
+
+        def compute():
+            computed.append(1)
+            release.wait(5)
+            return 'computed'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(store.get_or_set('test_flight', compute, 60)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while store.flights.coalesced < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(computed))
+        self.assertEqual(['computed'] * 4, results)
+        self.assertEqual('computed', store.get('test_flight'))
+
+    def test_store_lock(self):
+        self.conf.update(single_flight_lock_timeout=0.2)
+        store = KVStore(conf=self.conf)
+        self.addCleanup(store.close)
+        store.backend.delete('test_locked', 'test_free', LOCK_PREFIX + 'test_free')
+
+        # another process holds the lock of one key, it fills it while this one waits
+        store.backend.lock([LOCK_PREFIX + 'test_locked'], 'other process', 5)
+        timer = threading.Timer(0.05, store.backend.set, ('test_locked', 'filled elsewhere', 60))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        values = store.get_or_set_many(['test_locked', 'test_free'], lambda keys: {key: 'filled here' for key in keys})
+        self.assertEqual(['filled elsewhere', 'filled here'], values)
+        # the lock of the filled key is released, the other one is still held
+        self.assertIsNone(store.backend.get(LOCK_PREFIX + 'test_free'))
+        self.assertEqual('other process', store.backend.get(LOCK_PREFIX + 'test_locked'))
+
+        # a holder that never fills the key is waited for no longer than the lock timeout
+        store.backend.delete('test_locked')
+        values = store.get_or_set_many(['test_locked'], lambda keys: {key: 'filled late' for key in keys})
+        self.assertEqual(['filled late'], values)
+
+    def test_async_store_fills_once(self):
+        computed = []
+
+        async def run():
+            store = AsyncKVStore(conf=self.conf)
+            await store.connect()
+            try:
+                await store.backend.delete('test_flight')
+
+                def compute():
+                    computed.append(1)
+                    return 'computed'
+
+                return await asyncio.gather(*(store.get_or_set('test_flight', compute, 60) for _ in range(4)))
+            finally:
+                await store.close()
+
+        self.assertEqual(['computed'] * 4, asyncio.run(run()))
+        self.assertEqual(1, len(computed))
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -1,12 +1,16 @@
 import functools
 import os
+import time
 import unittest
 
 import redis
 
 import api
+from api.cache import LocalCache
 from api.configurator import Conf
+from api.breaker import CircuitBreaker
 from api.store import KVStore
+from api.store import StoreUnavailable
 
 
 def cases(cases_items):
@@ -60,6 +64,163 @@ class TestSuite(unittest.TestCase):
         store.set(key, val, ex)
         self.assertEqual(val, store.get(key), arguments)
 
+    def test_get_many(self):
+        store = KVStore(conf=self.conf)
+        store.set('test_key_1', 'value_1')
+        store.set('test_key_2', 'value_2')
+        self.assertEqual(
+            ['value_1', None, 'value_2'],
+            store.get_many(['test_key_1', 'test_missing_key', 'test_key_2'])
+        )
+        self.assertEqual([], store.get_many([]))
+
+    def test_set_many(self):
+        store = KVStore(conf=self.conf)
+        store.set_many({'test_key_1': 'value_1', 'test_key_2': 2}, 100)
+        self.assertEqual(['value_1', '2'], store.get_many(['test_key_1', 'test_key_2']))
+        self.assertTrue(0 < store.backend.ttl('test_key_1') <= 100)
+
+    def test_local_cache(self):
+        store = KVStore(conf=self.conf)
+        store.local_caches = {'test_cached:': LocalCache(max_entries=10, ttl=60)}
+        store.set('test_cached:1', 1.5, 100)
+        store.backend.delete('test_cached:1')
+
+        self.assertEqual('1.5', store.get('test_cached:1'))
+        self.assertEqual(['1.5', None], store.get_many(['test_cached:1', 'test_cached:2']))
+        self.assertEqual(2, store.cache_stats()['test_cached:']['hits'])
+
+    def test_write_behind(self):
+        self.conf.update(write_behind_enabled=True)
+
+        store = KVStore(conf=self.conf)
+        store.backend.delete('test_key_1', 'test_key_2', 'test_key_3')
+        store.set('test_key_1', 'value_1', 100)
+        store.set_many({'test_key_2': 'value_2', 'test_key_3': 3}, 100)
+        store.close()
+
+        self.assertEqual(['value_1', 'value_2', '3'], store.backend.mget(['test_key_1', 'test_key_2', 'test_key_3']))
+        self.assertTrue(0 < store.backend.ttl('test_key_2') <= 100)
+
+    def test_write_behind_unavailable(self):
+        self.conf.update(write_behind_enabled=True)
+
+        store = KVStore(conf=self.conf)
+        store.breaker.open()
+        queue = store.write_behind
+        store.set_many({'test_key_1': 'value_1', 'test_key_2': 'value_2'}, 100)
+        store.close()
+
+        self.assertEqual(0, queue.flushed)
+        self.assertEqual(2, queue.failed)
+
+    @unittest.skipIf(Conf().store_backend != 'redis', 'replicas are a redis backend option')
+    def test_read_replicas(self):
+        replica = {'host': self.conf.redis_host, 'port': self.conf.redis_port, 'db': 3}
+        self.conf.update(redis_replicas=[replica])
+
+        store = KVStore(conf=self.conf)
+        store.backend.replicas[0].set('test_replicated', 'replica')
+        store.set('test_replicated', 'primary')
+        # reads go to the replica, writes to the primary
+        self.assertEqual('replica', store.get('test_replicated'))
+        self.assertEqual(['replica'], store.get_many(['test_replicated']))
+        self.assertEqual('primary', store.backend.primary.get('test_replicated'))
+
+    @unittest.skipIf(Conf().store_backend != 'redis', 'replicas are a redis backend option')
+    def test_read_replica_fallback(self):
+        self.conf.update(redis_replicas=[{'host': self.conf.redis_host, 'port': 1}])
+
+        store = KVStore(conf=self.conf)
+        store.set('test_key', 'test_value')
+        self.assertEqual('test_value', store.get('test_key'))
+        self.assertEqual(['test_value'], store.get_many(['test_key']))
+        # the replica is skipped after the first failure
+        self.assertEqual(1, store.backend.fallbacks)
+        self.assertEqual(CircuitBreaker.CLOSED, store.breaker.state)
+
+    def test_reconfigure(self):
+        store = KVStore(conf=self.conf)
+        self.addCleanup(store.close)
+        backend = store.backend
+
+        # settings the backend does not use leave it in place
+        self.conf.update(salt='rotated')
+        self.assertIs(backend, store.backend)
+
+        self.conf.update(redis_max_connections=self.conf.redis_max_connections + 1)
+        self.assertIsNot(backend, store.backend)
+        store.set('test_key', 'test_value')
+        self.assertEqual('test_value', store.get('test_key'))
+
+    @unittest.skipIf(Conf().store_backend != 'redis', 'the memory backend has no pool')
+    def test_warm_up(self):
+        store = KVStore(conf=self.conf)
+        self.addCleanup(store.close)
+
+        store.warm_up(3)
+        self.assertEqual(3, len(store.backend.pool._connections))
+        # the opened connections serve the next commands
+        store.set('test_key', 'test_value')
+        self.assertEqual(3, len(store.backend.pool._connections))
+
+    @unittest.skipIf(Conf().store_backend != 'redis', 'an unreachable port means nothing to this backend')
+    def test_reconfigure_unavailable(self):
+        store = KVStore(conf=self.conf)
+        self.addCleanup(store.close)
+
+        self.conf.update(redis_port=1)
+        self.assertEqual(CircuitBreaker.OPEN, store.breaker.state)
+        with self.assertRaises(StoreUnavailable):
+            store.get('test_key')
+
+    @unittest.skipIf(Conf().store_backend != 'redis', 'an unreachable port means nothing to this backend')
+    def test_unavailable(self):
+        self.conf.update(redis_port=1)
+
+        started = time.monotonic()
+        store = KVStore(conf=self.conf)
+        self.assertEqual(CircuitBreaker.OPEN, store.breaker.state)
+        self.assertFalse(store.healthy)
+
+        with self.assertRaises(StoreUnavailable):
+            store.get('test_key')
+        with self.assertRaises(StoreUnavailable):
+            store.get_many(['test_key'])
+        store.set('test_key', 'test_value')
+        store.set_many({'test_key': 'test_value'})
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_caller_error_during_trial(self):
+        store = KVStore(conf=self.conf)
+        self.addCleanup(store.close)
+        store.breaker.open()
+        store.breaker.half_open()
+
+        with self.assertRaises(TypeError):
+            with store._command('get'):
+                raise TypeError('not a Redis error')
+
+        # the trial was given back, the next call closes the circuit
+        self.assertEqual(CircuitBreaker.HALF_OPEN, store.breaker.state)
+        store.set('test_key', 'test_value')
+        self.assertEqual(CircuitBreaker.CLOSED, store.breaker.state)
+
+    def test_reconnect(self):
+        store = KVStore(conf=self.conf)
+        store.breaker.open()
+        self.assertRaises(StoreUnavailable, store.get, 'test_key')
+
+        store.start_health_check()
+        self.addCleanup(store.close)
+        deadline = time.monotonic() + self.conf.redis_reconnect_timeout + 2
+        while store.breaker.state is CircuitBreaker.OPEN and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(CircuitBreaker.HALF_OPEN, store.breaker.state)
+        store.set('test_key', 'test_value')
+        self.assertEqual(CircuitBreaker.CLOSED, store.breaker.state)
+
 
 if __name__ == "__main__":
     os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
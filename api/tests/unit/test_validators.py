@@ -0,0 +1,103 @@
+import functools
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+from api.base.fields import BirthDayField
+from api.base.fields import CharField
+from api.base.fields import PhoneField
+from api.base.validators import BaseValidators
+from api.configurator import Conf
+from api.method.validators import ClientsInterestsValidator
+from api.method.validators import MethodValidator
+from api.method.validators import OnlineScoreValidator
+
+
+def cases(cases_items):
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args):
+            for c in cases_items:
+                new_args = args + (c if isinstance(c, tuple) else (c,))
+                f(*new_args)
+
+        return wrapper
+
+    return decorator
+
+
+class TestSuite(unittest.TestCase):
+    def setUp(self):
+        self.conf = Conf()
+
+    def test_declared_fields_compiled_at_class_creation(self):
+        self.assertEqual(
+            ('account', 'arguments', 'login', 'method', 'model', 'token'),
+            tuple(name for name, _ in MethodValidator._declared_fields)
+        )
+
+    def test_declared_fields_are_inherited(self):
+        class ExtendedValidator(MethodValidator):
+            extra = CharField(required=True)
+
+        self.assertIn('extra', dict(ExtendedValidator._declared_fields))
+        self.assertNotIn('extra', dict(MethodValidator._declared_fields))
+
+    @cases([
+        (CharField, ('_validate_max_len', '_validate_type')),
+        (PhoneField, ('_validate_mask', '_validate_max_len', '_validate_type')),
+        (BirthDayField, ('_validate_not_older_year', '_validate_type')),
+    ])
+    def test_validate_handlers_compiled_per_class(self, field_class, names):
+        self.assertEqual(names, tuple(name for name, _ in field_class._validate_handlers))
+
+    def test_base_validators_have_no_fields(self):
+        self.assertEqual((), BaseValidators._declared_fields)
+
+    @cases([
+        ({"phone": "79175002040", "email": "stupnikov@otus.ru"}, True),
+        ({"phone": "89175002040", "email": "stupnikov@otus.ru"}, False),
+        ({"gender": 1, "birthday": "01.01.1890"}, False),
+    ])
+    def test_validate(self, data, is_valid):
+        status, errors = OnlineScoreValidator(conf=self.conf).validate(data)
+        self.assertEqual(is_valid, status, errors)
+
+    def test_client_ids_limit(self):
+        self.conf.update(admission_max_client_ids=3)
+        status, errors = ClientsInterestsValidator(conf=self.conf).validate({"client_ids": [1, 2, 3]})
+        self.assertTrue(status, errors)
+
+        status, errors = ClientsInterestsValidator(conf=self.conf).validate({"client_ids": [1, 2, 3, 4]})
+        self.assertFalse(status)
+        self.assertIn('too long', errors[0])
+
+    def test_fields_are_stateless(self):
+        for _, field in OnlineScoreValidator._declared_fields:
+            self.assertFalse(hasattr(field, '__dict__'), field)
+
+    def test_results_are_immutable(self):
+        status, errors = OnlineScoreValidator(conf=self.conf).validate({"phone": "89175002040"})
+        self.assertFalse(status)
+        self.assertIsInstance(errors, tuple)
+        self.assertTrue(all(isinstance(error, str) for error in errors), errors)
+
+    def test_concurrent_validation(self):
+        validator = OnlineScoreValidator(conf=self.conf)
+        requests = [
+            {"phone": "79175002040", "email": "stupnikov@otus.ru"},
+            {"phone": "89175002040", "email": "stupnikov@otus.ru"},
+        ] * 200
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(validator.validate, requests))
+
+        for request, (status, errors) in zip(requests, results):
+            self.assertEqual(request["phone"].startswith('7'), status, errors)
+            self.assertEqual(0 if status else 1, len(errors), errors)
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import threading
+import unittest
+
+import api
+from api.writebehind import AsyncWriteBehind
+from api.writebehind import WriteBehind
+
+
+class Recorder:
+    def __init__(self, succeed=True) -> None:
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+        self.succeed = succeed
+
+    def write(self, mapping, ex) -> bool:
+        self.release.wait()
+        self.batches.append((dict(mapping), ex))
+        return self.succeed
+
+    async def async_write(self, mapping, ex) -> bool:
+        self.batches.append((dict(mapping), ex))
+        return self.succeed
+
+    def written(self) -> dict:
+        return {key: val for mapping, _ in self.batches for key, val in mapping.items()}
+
+
+class TestSuite(unittest.TestCase):
+    def test_batches(self):
+        recorder = Recorder()
+        queue = WriteBehind(recorder.write, batch_size=3, interval=10)
+        for i in range(7):
+            self.assertTrue(queue.put(f'key_{i}', i, 60))
+        queue.close()
+
+        self.assertEqual({f'key_{i}': i for i in range(7)}, recorder.written())
+        self.assertTrue(all(len(mapping) <= 3 and ex == 60 for mapping, ex in recorder.batches))
+        self.assertEqual(7, queue.flushed)
+
+    def test_groups_by_expiration(self):
+        recorder = Recorder()
+        queue = WriteBehind(recorder.write, interval=10)
+        queue.put('a', 1, 60)
+        queue.put_many({'b': 2, 'c': 3}, None)
+        queue.close()
+
+        self.assertEqual([({'a': 1}, 60), ({'b': 2, 'c': 3}, None)], recorder.batches)
+        self.assertFalse(queue.put('d', 4))
+
+    def test_drop_policy(self):
+        for policy, kept in (('new', ['a', 'b']), ('oldest', ['b', 'c'])):
+            recorder = Recorder()
+            recorder.release.clear()
+            queue = WriteBehind(recorder.write, max_size=2, interval=10, drop_policy=policy)
+            # the worker waits for the batch to fill, the queue is not drained meanwhile
+            queue.put('a', 1)
+            queue.put('b', 2)
+            queue.put('c', 3)
+            # a queued key is replaced, nothing is dropped
+            queue.put(kept[0], 0)
+            recorder.release.set()
+            queue.close()
+
+            self.assertEqual(kept, sorted(recorder.written()), policy)
+            self.assertEqual(1, queue.dropped, policy)
+
+    def test_failed_writes(self):
+        def fail(mapping, ex):
+            raise RuntimeError('write failed')
+
+        for write in (Recorder(succeed=False).write, fail):
+            queue = WriteBehind(write, interval=10)
+            queue.put_many({'a': 1, 'b': 2}, 60)
+            queue.close()
+
+            self.assertEqual(0, queue.flushed)
+            self.assertEqual(2, queue.failed)
+
+    def test_unknown_drop_policy(self):
+        with self.assertRaises(ValueError):
+            WriteBehind(Recorder().write, drop_policy='random')
+
+    def test_async(self):
+        recorder = Recorder()
+
+        async def run():
+            queue = AsyncWriteBehind(recorder.async_write, batch_size=2, interval=10)
+            queue.put_many({'a': 1, 'b': 2, 'c': 3}, 60)
+            await queue.close()
+            return queue
+
+        queue = asyncio.run(run())
+        self.assertEqual({'a': 1, 'b': 2, 'c': 3}, recorder.written())
+        self.assertEqual(3, queue.flushed)
+
+        recorder.succeed = False
+        queue = asyncio.run(run())
+        self.assertEqual((0, 3), (queue.flushed, queue.failed))
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(api.__file__), os.path.pardir, os.path.pardir))
+    unittest.main()
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Union
+
+from api.configurator import Conf
+from api.encoder import get_encoder
+from api.method.scoring import ScoringModels
+from api.method.validators import BatchValidator
+from api.method.validators import ClientsInterestsValidator
+from api.method.validators import MethodValidator
+from api.method.validators import OnlineScoreValidator
+from api.method.validators import StreamInterestsValidator
+from api.metrics import Family
+from api.store import AsyncKVStore
+from api.store import KVStore
+
+# valid requests of every method, checking them fills the per-format and per-day caches of the fields
+SAMPLE_SCORE = {'phone': '79175002040', 'email': 'stupnikov@otus.ru', 'first_name': 'a', 'last_name': 'b',
+                'birthday': '01.01.1990', 'gender': 1}
+SAMPLE_INTERESTS = {'client_ids': [1, 2], 'date': '20.07.2017'}
+SAMPLE_REQUEST = {'account': 'horns&hoofs', 'login': 'h&f', 'token': '', 'method': 'online_score',
+                  'arguments': SAMPLE_SCORE}
+
+
+class WarmUp:
+    """
+    Readiness of a server process.
+
+    `run` prepares the process for its first requests: it opens `connections`
+    connections of the store pools, checks sample requests with every validator
+    so that the date formats are compiled and the birthday cutoff is cached, and
+    encodes a sample response. `ready` is set when it is done, even when the store
+    could not be reached, since requests are then served degraded.
+    """
+
+    def __init__(self, conf: Conf, connections: int = 1) -> None:
+        self.conf = conf
+        self.connections = connections
+        self.ready = threading.Event()
+        self.logger = logging.getLogger('scoring_api.WarmUp')
+        # seconds every stage took
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = time.perf_counter() - started
+
+    def run(self, store: KVStore, models: ScoringModels) -> None:
+        with self._stage('store'):
+            store.warm_up(self.connections)
+        self._prime(models)
+        self._done()
+
+    async def run_async(self, store: AsyncKVStore, models: ScoringModels) -> None:
+        with self._stage('store'):
+            await store.warm_up(self.connections)
+        self._prime(models)
+        self._done()
+
+    def _prime(self, models: ScoringModels) -> None:
+        with self._stage('validators'):
+            MethodValidator(conf=self.conf).validate(SAMPLE_REQUEST)
+            OnlineScoreValidator(conf=self.conf).validate(SAMPLE_SCORE)
+            ClientsInterestsValidator(conf=self.conf).validate(SAMPLE_INTERESTS)
+            StreamInterestsValidator(conf=self.conf).validate(SAMPLE_INTERESTS)
+            BatchValidator(conf=self.conf).validate({'calls': [SAMPLE_REQUEST]})
+
+        with self._stage('models'):
+            model = models.get()
+            model.key(SAMPLE_SCORE)
+            get_encoder(self.conf.response_encoder)({'score': model.score(SAMPLE_SCORE)})
+
+    def _done(self) -> None:
+        self.ready.set()
+        self.logger.info('ready, warm-up took %.3f seconds (%s)', sum(self.stages.values()),
+                         ', '.join(f'{name} {seconds:.3f}' for name, seconds in self.stages.items()))
+
+    @property
+    def is_ready(self) -> bool:
+        return self.ready.is_set()
+
+    def wait(self, timeout: Union[float, None] = None) -> bool:
+        return self.ready.wait(timeout)
+
+    def collect_metrics(self) -> List[Family]:
+        """
+        Collector for `api.metrics`, reports the readiness and the warm-up stages.
+        """
+        return [
+            ('scoring_api_ready', 'gauge', 'Whether the warm-up of the process is over',
+             [({}, int(self.is_ready))]),
+            ('scoring_api_warmup_seconds', 'gauge', 'Time spent in every warm-up stage',
+             [({'stage': name}, seconds) for name, seconds in self.stages.items()]),
+        ]
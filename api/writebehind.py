@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import threading
+from itertools import islice
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+
+Batch = List[Tuple[str, Any, Union[int, None]]]
+
+DROP_NEW = 'new'
+DROP_OLDEST = 'oldest'
+
+
+class BaseWriteBehind:
+    """
+    Bounded queue of pending writes, a later write of a queued key replaces it.
+
+    When `max_size` keys are pending a new key is dropped (`drop_policy` 'new')
+    or the oldest pending key is dropped to make room ('oldest'); the writes are
+    cache fills, losing one costs a recomputation.
+    """
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 500, interval: float = 0.05,
+                 drop_policy: str = DROP_NEW) -> None:
+        if drop_policy not in (DROP_NEW, DROP_OLDEST):
+            raise ValueError(f'Unknown drop policy "{drop_policy}", available: {DROP_NEW}, {DROP_OLDEST}')
+
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.drop_policy = drop_policy
+        self.logger = logging.getLogger('scoring_api.WriteBehind')
+
+        self.queued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+        self._pending: Dict[str, Tuple[Any, Union[int, None]]] = {}
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _put(self, key: str, val: Any, ex: Union[int, None]) -> bool:
+        if key in self._pending:
+            del self._pending[key]
+        elif len(self._pending) >= self.max_size:
+            self.dropped += 1
+            if self.drop_policy == DROP_NEW:
+                return False
+            del self._pending[next(iter(self._pending))]
+
+        self._pending[key] = (val, ex)
+        self.queued += 1
+        return True
+
+    def _take(self) -> Batch:
+        batch = []
+        for key in list(islice(self._pending, self.batch_size)):
+            val, ex = self._pending.pop(key)
+            batch.append((key, val, ex))
+        return batch
+
+    def _count(self, written: bool, keys: int) -> None:
+        if written:
+            self.flushed += keys
+        else:
+            self.failed += keys
+
+    @staticmethod
+    def _group(batch: Batch) -> Dict[Union[int, None], Dict[str, Any]]:
+        """
+        Splits a batch by expiration, every group is written with one pipeline.
+        """
+        groups: Dict[Union[int, None], Dict[str, Any]] = {}
+        for key, val, ex in batch:
+            groups.setdefault(ex, {})[key] = val
+        return groups
+
+
+class WriteBehind(BaseWriteBehind):
+    """
+    Hands writes to a background thread that passes them to `write(mapping, ex)`
+    in batches of up to `batch_size` keys, waiting up to `interval` seconds for
+    a batch to fill. `close` writes out what is still pending. The keys of a
+    `write` returning False or raising are counted as `failed`, not `flushed`.
+    """
+
+    def __init__(self, write: Callable[[Dict[str, Any], Union[int, None]], bool], *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.write = write
+
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='scoring_api-write-behind', daemon=True)
+        self._thread.start()
+
+    def put(self, key: str, val: Any, ex: Union[int, None] = None) -> bool:
+        """
+        Queues one write without waiting, returns False when it was dropped.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            idle = not self._pending
+            queued = self._put(key, val, ex)
+            if idle or len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return queued
+
+    def put_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> int:
+        with self._cond:
+            if self._closed:
+                return 0
+            idle = not self._pending
+            queued = sum(self._put(key, val, ex) for key, val in mapping.items())
+            if idle or len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return queued
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if len(self._pending) < self.batch_size and not self._closed:
+                    # lets a burst of fills gather into one pipeline
+                    self._cond.wait(self.interval)
+                batch = self._take()
+                done = self._closed and not self._pending
+
+            for ex, mapping in self._group(batch).items():
+                try:
+                    written = self.write(mapping, ex)
+                except Exception:
+                    self.logger.exception('failed to write %d keys', len(mapping))
+                    written = False
+                self._count(written, len(mapping))
+            if done:
+                return
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+class AsyncWriteBehind(BaseWriteBehind):
+    """
+    `WriteBehind` for the asyncio engine, the batches are written by a task of the running loop.
+    """
+
+    def __init__(self, write: Callable[[Dict[str, Any], Union[int, None]], Awaitable[bool]], *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.write = write
+
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, key: str, val: Any, ex: Union[int, None] = None) -> bool:
+        if self._closed:
+            return False
+        queued = self._put(key, val, ex)
+        self._notify()
+        return queued
+
+    def put_many(self, mapping: Dict[str, Any], ex: Union[int, None] = None) -> int:
+        if self._closed:
+            return 0
+        queued = sum(self._put(key, val, ex) for key, val in mapping.items())
+        self._notify()
+        return queued
+
+    def _notify(self) -> None:
+        self._wake.set()
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if len(self._pending) < self.batch_size and not self._closed:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            while self._pending:
+                for ex, mapping in self._group(self._take()).items():
+                    try:
+                        written = await self.write(mapping, ex)
+                    except Exception:
+                        self.logger.exception('failed to write %d keys', len(mapping))
+                        written = False
+                    self._count(written, len(mapping))
+            if self._closed:
+                return
+
+    async def close(self) -> None:
+        self._closed = True
+        self._wake.set()
+        self._full.set()
+        await self._task
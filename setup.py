@@ -15,6 +15,10 @@ setup(
         'argcomplete',
         'redis'
     ],
+    extras_require={
+        # vectorized bulk scoring
+        'bulk': ['numpy'],
+    },
     entry_points={
         'console_scripts': [
             'scoring_api = api.entrypoint:run',